@@ -1,6 +1,10 @@
 # awsflow package filename template
 PKG_WHEEL_FNAME = "awsflow-{version}-py3-none-any.whl"
 
+# awsflow wheelhouse filename template: tarball of the wheelhouse directory, containing the awsflow package
+# and the wheels of all its dependencies
+PKG_WHEELHOUSE_FNAME = "awsflow-{version}-wheelhouse.tar.gz"
+
 # AWS role used for Lambda functions
 AWS_LAMBDA_ROLE = None
 
@@ -22,6 +26,17 @@ AWS_S3_BASE = "s3://{bucket}/{prefix}".format(bucket=AWS_S3_BUCKET, prefix=AWS_S
 # URI of awsflow package
 AWS_S3_PKG = "{aws_s3base}/{pkg_wheel_fname}".format(aws_s3base=AWS_S3_BASE, pkg_wheel_fname=PKG_WHEEL_FNAME)
 
+# URI of awsflow wheelhouse
+AWS_S3_WHEELHOUSE = "{aws_s3base}/{fname}".format(aws_s3base=AWS_S3_BASE, fname=PKG_WHEELHOUSE_FNAME)
+
+# AWS S3 prefix used to stage large lambda archives, and settings of their concurrent multipart upload
+AWS_S3_LAMBDA_PREFIX = "awsflow/lambda"
+AWS_S3_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+AWS_S3_UPLOAD_CONCURRENCY = 8
+
+# Custom AWS S3 endpoint URL, e.g. a local S3 stand-in for testing. Set it to None to use AWS S3.
+AWS_S3_ENDPOINT_URL = None
+
 # URI used to store logs
 AWS_S3_LOG_URI = "s3n://{}/awsflow/logs/emr/".format(AWS_S3_BUCKET)
 
@@ -37,6 +52,15 @@ AWS_LAMBDA_MEMORYSIZE = 512
 # Runtime environment to execute lambda functions
 AWS_LAMBDA_RUNTIME = "python3.6"
 
+# Name of the lambda layer shipping the dependencies of lambda functions, when deployed with --layer
+AWS_LAMBDA_LAYER_NAME = "awsflow-deps"
+
+# Max number of lambda functions uploaded concurrently by the deploy-all task
+AWS_LAMBDA_DEPLOY_WORKERS = 8
+
+# pip executable matching AWS_LAMBDA_RUNTIME, used to install the dependencies of lambda functions
+AWS_LAMBDA_PIP = "pip-3.6"
+
 # EMR security groups. Set them to None to disable them.
 AWS_EMR_MANAGED_MASTER_SECURITY_GROUP = None
 AWS_EMR_MANAGED_SLAVE_SECURITY_GROUP = None
@@ -51,3 +75,109 @@ LOG_LEVEL = "INFO"
 SLACK_CHANNEL = None
 SLACK_BOTNAME = "awsflow"
 SLACK_API_TOKEN = None
+
+# Slack Web API endpoint posting messages, e.g. a local stand-in for testing
+SLACK_API_URL = "https://slack.com/api/chat.postMessage"
+
+# Slack messages are posted in background: max number of queued messages, seconds within which messages
+# to the same channel are posted together, max retries of failed or rate limited requests,
+# and max seconds spent at exit posting queued messages
+SLACK_QUEUE_SIZE = 1000
+SLACK_COALESCE_SECONDS = 0.5
+SLACK_MAX_RETRIES = 3
+SLACK_FLUSH_TIMEOUT = 10
+
+# Seconds left to lambda functions after posting queued messages, before their invocation deadline
+SLACK_LAMBDA_MARGIN_SECONDS = 1
+
+# EMR cluster state waiting. Modes: "fixed" (poll every EMR_WAIT_FIXED_SECONDS), "adaptive" (poll every
+# EMR_WAIT_MIN_SECONDS when a state transition is due, up to every EMR_WAIT_FIXED_SECONDS otherwise),
+# "waiter" (boto3 waiters), "events" (EMR state-change events from SQS).
+EMR_WAIT_MODE = "adaptive"
+EMR_WAIT_MIN_SECONDS = 2
+EMR_WAIT_FIXED_SECONDS = 10
+
+# Max number of concurrent describe_cluster calls when watching many clusters
+EMR_WATCH_WORKERS = 8
+
+# Max number of steps submitted with a single add_job_flow_steps call (API limit)
+EMR_MAX_STEPS_PER_CALL = 256
+
+# Max number of regions queried concurrently when listing active clusters
+EMR_REGIONS_WORKERS = 16
+
+# Max number of log objects read concurrently from the S3 LogUri of clusters, and max number of lines each of them
+# buffers ahead of the log object being printed
+EMR_LOGS_WORKERS = 16
+EMR_LOGS_BUFFER_LINES = 10000
+
+# Seconds between listings of the S3 LogUri when following logs of clusters
+EMR_LOGS_FOLLOW_SECONDS = 15
+
+# SQS queue receiving "EMR Cluster State Change" events from an EventBridge rule, used by the "events" wait mode.
+EMR_EVENTS_QUEUE_URL = None
+
+# Events of other clusters are left in the queue for their watchers, and deleted once received this many times
+# (e.g., nobody is waiting for them)
+EMR_EVENTS_MAX_RECEIVES = 10
+
+# AWS profile used to create boto3 sessions. Set it to None to use the default credentials chain.
+AWS_PROFILE_NAME = None
+
+# botocore settings shared by all AWS clients
+AWS_CLIENT_MAX_ATTEMPTS = 8
+AWS_CLIENT_MAX_POOL_CONNECTIONS = 32
+AWS_CLIENT_CONNECT_TIMEOUT = 10
+AWS_CLIENT_READ_TIMEOUT = 60
+
+# Jupyter packages installed with pip by awsflow.add.jupyter, unless a prebuilt environment is used
+JUPYTER_PACKAGES = ['jupyterlab==0.35.4', 's3contents==0.1.12', 'toolz==0.9.0', 'dask==1.1.1']
+
+# Directory of the prebuilt Jupyter environment, both where it is built by `fab jupyter_env` and unpacked
+JUPYTER_ENV_DIR = '/home/hadoop/jupyter-env'
+
+# URI of the prebuilt Jupyter environment archive
+AWS_S3_JUPYTER_ENV = "{aws_s3base}/jupyter-env.tar.gz".format(aws_s3base=AWS_S3_BASE)
+
+# Jupyter TCP port, max seconds the Jupyter step waits for an installation started during bootstrap,
+# and max seconds it waits for Jupyter to accept connections once started
+JUPYTER_PORT = 8888
+JUPYTER_INSTALL_TIMEOUT = 900
+JUPYTER_START_TIMEOUT = 120
+
+# Metrics (spans, AWS API call counters, poll latencies) exported at exit: list of exporters among 'jsonl',
+# 'prometheus' (textfile collector format) and 'emf' (CloudWatch Embedded Metric Format, printed to stdout)
+METRICS_EXPORTERS = []
+METRICS_JSONL_PATHNAME = '~/.cache/awsflow/metrics.jsonl'
+METRICS_PROMETHEUS_PATHNAME = '~/.cache/awsflow/awsflow.prom'
+METRICS_EMF_NAMESPACE = 'awsflow'
+
+# Max number of spans kept by long running processes, e.g. watching clusters: older spans are dropped.
+# Span durations are also aggregated by path in the span_seconds histogram, which is never truncated.
+METRICS_MAX_SPANS = 10000
+
+# Local cache directory
+CACHE_DIR = '~/.cache/awsflow'
+
+# Seconds after which cached cluster metadata (master DNS name, applications) is refreshed. Cached entries are
+# also dropped when ssh fails to connect to the master node, e.g. of a cluster terminated outside awsflow.
+# Set CLUSTER_CACHE_DISK to False to keep the cache only in memory.
+CLUSTER_CACHE_TTL = 6 * 3600
+CLUSTER_CACHE_DISK = True
+
+# Seconds SSH master connections stay open after their last session: following ssh commands to the same
+# host reuse them, without a new handshake
+SSH_CONTROL_PERSIST = 600
+
+# Max number of concurrent ssh commands when running commands on many nodes
+SSH_WORKERS = 16
+
+# Local SOCKS port of the SSH tunnel to the master node, max seconds between reconnections,
+# and seconds between health checks
+SSH_TUNNEL_PORT = 8157
+SSH_TUNNEL_MAX_BACKOFF = 30
+SSH_TUNNEL_HEALTH_SECONDS = 10
+
+# Directories of team templates, each with emr, step and bootstrap subdirectories of Python modules
+# defining templates as CONFIG_* attributes. Templates are indexed in CACHE_DIR and built only when used.
+TEMPLATES_DIRS = []
@@ -0,0 +1,119 @@
+import base64
+import hashlib
+import os
+import zipfile
+
+# Timestamp assigned to all ZIP entries, so that archives built from the same contents are identical
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Files and directories never included in archives
+EXCLUDED_NAMES = {'__pycache__', '.pytest_cache'}
+EXCLUDED_SUFFIXES = ('.pyc', '.pyo')
+
+
+def list_tree(root, prefix='', exclude=()):
+    """
+    List files under directory, in sorted order
+    :param root: directory to visit
+    :param prefix: prefix prepended to archive names
+    :param exclude: top-level names (relative to `root`) to skip
+    :return: list of (pathname, archive name) tuples
+    """
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root)
+        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_NAMES and not (rel_dir == '.' and d in exclude)]
+        for filename in filenames:
+            if filename.endswith(EXCLUDED_SUFFIXES) or (rel_dir == '.' and filename in exclude):
+                continue
+            arcname = os.path.normpath(os.path.join(prefix, rel_dir, filename))
+            entries.append((os.path.join(dirpath, filename), arcname))
+    return sorted(entries, key=lambda entry: entry[1])
+
+
+def hash_entries(entries, extra=()):
+    """
+    Compute digest of file contents and names
+    :param entries: list of (pathname, archive name) tuples
+    :param extra: additional strings to include in the digest, e.g. runtime name
+    :return: hex digest
+    """
+    h = hashlib.sha256()
+    for s in extra:
+        h.update(s.encode('utf-8') + b'\0')
+    for pathname, arcname in entries:
+        h.update(arcname.encode('utf-8') + b'\0')
+        with open(pathname, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
+
+
+def code_sha256(pathname):
+    """
+    Compute SHA-256 digest of archive in the format used by AWS Lambda for CodeSha256, reading it in chunks
+    :param pathname: archive pathname
+    :return: base64-encoded digest
+    """
+    h = hashlib.sha256()
+    with open(pathname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return base64.b64encode(h.digest()).decode('ascii')
+
+
+def write_entries(zf, entries):
+    """
+    Add files to ZIP archive with fixed timestamps and permissions, in the given order
+    :param zf: zipfile.ZipFile opened for writing or appending
+    :param entries: list of (pathname, archive name) tuples
+    :return:
+    """
+    for pathname, arcname in entries:
+        info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = (0o100755 if os.access(pathname, os.X_OK) else 0o100644) << 16
+        with open(pathname, 'rb') as f:
+            zf.writestr(info, f.read())
+
+
+def write_archive(pathname, entries, base=None):
+    """
+    Build reproducible ZIP archive: same entries always produce the same bytes.
+    Entries of an existing `base` archive are reused as they are, without recompressing them.
+    :param pathname: pathname of the archive to create, replaced atomically
+    :param entries: list of (pathname, archive name) tuples
+    :param base: pathname of archive to extend, None to start from an empty archive
+    :return:
+    """
+    tmp_pathname = pathname + '.tmp'
+
+    if base:
+        with open(base, 'rb') as src, open(tmp_pathname, 'wb') as dst:
+            for chunk in iter(lambda: src.read(1 << 20), b''):
+                dst.write(chunk)
+        mode = 'a'
+    else:
+        mode = 'w'
+
+    with zipfile.ZipFile(tmp_pathname, mode) as zf:
+        write_entries(zf, entries)
+
+    os.replace(tmp_pathname, pathname)
+
+
+def prefix_archive(src, dst, prefix):
+    """
+    Copy ZIP archive prepending a prefix to the names of all entries, e.g. 'python/' for lambda layers
+    :param src: pathname of the source archive
+    :param dst: pathname of the archive to create, replaced atomically
+    :param prefix: prefix of entry names
+    :return:
+    """
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst + '.tmp', 'w') as zout:
+        for info in zin.infolist():
+            prefixed = zipfile.ZipInfo(prefix + info.filename, date_time=ZIP_DATE_TIME)
+            prefixed.compress_type = zipfile.ZIP_DEFLATED
+            prefixed.external_attr = info.external_attr
+            zout.writestr(prefixed, zin.read(info))
+
+    os.replace(dst + '.tmp', dst)
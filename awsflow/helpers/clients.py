@@ -0,0 +1,98 @@
+import threading
+
+from awsflow.config import AWS_PROFILE_NAME, AWS_CLIENT_MAX_ATTEMPTS, AWS_CLIENT_MAX_POOL_CONNECTIONS, \
+    AWS_CLIENT_CONNECT_TIMEOUT, AWS_CLIENT_READ_TIMEOUT
+from awsflow.helpers import metrics
+
+# Registry of boto3 sessions and clients, shared by all tools (and by warm Lambda invocations).
+# Clients are thread-safe and can be shared among threads, sessions are used only while holding the lock.
+# boto3 and botocore are imported on first use: tools that never call AWS do not pay for them.
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_config = None
+
+
+def get_client_config():
+    """
+    Get botocore configuration shared by all clients, creating it on first use
+    :return: botocore.config.Config
+    """
+    global _config
+    if _config is None:
+        from botocore.config import Config
+        _config = Config(retries={'max_attempts': AWS_CLIENT_MAX_ATTEMPTS},
+                         max_pool_connections=AWS_CLIENT_MAX_POOL_CONNECTIONS,
+                         connect_timeout=AWS_CLIENT_CONNECT_TIMEOUT,
+                         read_timeout=AWS_CLIENT_READ_TIMEOUT)
+    return _config
+
+
+def _get_session(profile_name):
+    """
+    Get boto3 session for profile, creating it if needed. Must be called while holding the lock.
+    :param profile_name: AWS profile name, None for default credentials chain
+    :return: boto3 session
+    """
+    if profile_name not in _sessions:
+        import boto3
+        _sessions[profile_name] = boto3.session.Session(profile_name=profile_name)
+    return _sessions[profile_name]
+
+
+def get_client(service, region_name=None, profile_name=AWS_PROFILE_NAME, endpoint_url=None):
+    """
+    Get boto3 client, created once per (service, region, profile, endpoint) and reused afterwards.
+    Credentials resolution and endpoint/model loading happen only on first use.
+    :param service: service name, e.g. 'emr'
+    :param region_name: region name, None for the default region of the profile
+    :param profile_name: AWS profile name, None for default credentials chain
+    :param endpoint_url: custom endpoint URL, e.g. of a local stand-in, None for the AWS endpoint
+    :return: boto3 client
+    """
+    key = (service, region_name, profile_name, endpoint_url)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _get_session(profile_name).client(service, region_name=region_name,
+                                                           endpoint_url=endpoint_url, config=get_client_config())
+                client.meta.events.register('after-call', metrics.count_api_call)
+                _clients[key] = client
+    return client
+
+
+def set_client(service, client, region_name=None, profile_name=AWS_PROFILE_NAME, endpoint_url=None):
+    """
+    Register client to be returned by get_client, e.g. a stub in tests
+    :param service: service name, e.g. 'emr'
+    :param client: client object
+    :param region_name: region name
+    :param profile_name: AWS profile name
+    :param endpoint_url: custom endpoint URL
+    :return:
+    """
+    with _lock:
+        _clients[(service, region_name, profile_name, endpoint_url)] = client
+
+
+def clear_clients():
+    """
+    Drop all cached sessions and clients
+    :return:
+    """
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+
+
+def get_available_regions(service, profile_name=AWS_PROFILE_NAME):
+    """
+    List regions where service is available
+    :param service: service name, e.g. 'emr'
+    :param profile_name: AWS profile name
+    :return: list of region names
+    """
+    with _lock:
+        return _get_session(profile_name).get_available_regions(service)
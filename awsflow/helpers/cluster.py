@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+
+from awsflow.config import CACHE_DIR, CLUSTER_CACHE_TTL, CLUSTER_CACHE_DISK
+from awsflow.helpers.clients import get_client
+
+# Fields of describe_cluster that do not change during the lifetime of a cluster, once it is ready
+STABLE_FIELDS = ['Id', 'Name', 'MasterPublicDnsName', 'Applications', 'Ec2InstanceAttributes', 'LogUri',
+                 'ReleaseLabel', 'InstanceCollectionType']
+
+# In-memory cache {(region_name, cluster_id): metadata}, backed by json files in CACHE_DIR/clusters
+_lock = threading.Lock()
+_cache = {}
+
+
+def _plain(obj):
+    """
+    Convert API response to plain json types (e.g., datetimes to strings), same in memory and on disk
+    """
+    return json.loads(json.dumps(obj, default=str))
+
+
+def _cache_pathname(region_name, cluster_id):
+    return os.path.join(os.path.expanduser(CACHE_DIR), 'clusters', '{}_{}.json'.format(region_name, cluster_id))
+
+
+def _load(region_name, cluster_id):
+    """
+    Get unexpired metadata from memory or disk
+    :return: metadata dict, None if missing or expired
+    """
+    metadata = _cache.get((region_name, cluster_id))
+
+    if metadata is None and CLUSTER_CACHE_DISK:
+        try:
+            with open(_cache_pathname(region_name, cluster_id), 'r') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    if metadata is None or time.time() - metadata['CachedAt'] > CLUSTER_CACHE_TTL:
+        return None
+
+    _cache[(region_name, cluster_id)] = metadata
+    return metadata
+
+
+def _store(region_name, cluster_id, metadata):
+    """
+    Save metadata in memory and, if possible, on disk
+    """
+    _cache[(region_name, cluster_id)] = metadata
+
+    if CLUSTER_CACHE_DISK:
+        pathname = _cache_pathname(region_name, cluster_id)
+        try:
+            os.makedirs(os.path.dirname(pathname), exist_ok=True)
+            with open(pathname + '.tmp', 'w') as f:
+                json.dump(metadata, f)
+            os.replace(pathname + '.tmp', pathname)
+        except OSError:
+            # e.g., read-only home directory in Lambda functions, keep memory cache only
+            pass
+
+
+def get_cluster(region_name, cluster_id):
+    """
+    Get stable metadata of cluster, calling describe_cluster only if not cached.
+    Clusters are cached only once ready, i.e. when the master DNS name is known.
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :return: dict with STABLE_FIELDS of describe_cluster
+    """
+    with _lock:
+        metadata = _load(region_name, cluster_id)
+        if metadata is not None:
+            return metadata
+
+    desc = get_client('emr', region_name=region_name).describe_cluster(ClusterId=cluster_id)['Cluster']
+    metadata = _plain({field: desc[field] for field in STABLE_FIELDS if field in desc})
+    metadata['CachedAt'] = time.time()
+
+    if metadata.get('MasterPublicDnsName'):
+        with _lock:
+            _store(region_name, cluster_id, metadata)
+
+    return metadata
+
+
+def get_public_master_dns_name(region_name, cluster_id):
+    """
+    Given region name and cluster id, returns the public dns name for the master node
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :return: dns name, None if the cluster is not ready yet
+    """
+    return get_cluster(region_name, cluster_id).get('MasterPublicDnsName')
+
+
+def get_applications(region_name, cluster_id):
+    """
+    Given region name and cluster id, returns the applications installed on the cluster
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :return: list of dicts, as returned by describe_cluster
+    """
+    return get_cluster(region_name, cluster_id).get('Applications', [])
+
+
+def get_instance_fleets(region_name, cluster_id):
+    """
+    Given region name and cluster id, returns its instance fleets. Not cached: fleets change with resizes.
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :return: list of dicts, as returned by list_instance_fleets
+    """
+    client = get_client('emr', region_name=region_name)
+    fleets = []
+    for page in client.get_paginator('list_instance_fleets').paginate(ClusterId=cluster_id):
+        fleets += page['InstanceFleets']
+    return fleets
+
+
+def get_instances(region_name, cluster_id, instance_states=('RUNNING',)):
+    """
+    Given region name and cluster id, returns its instances. Not cached: instances change with resizes.
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :param instance_states: states of instances to consider, filtered server side
+    :return: list of dicts, as returned by list_instances
+    """
+    client = get_client('emr', region_name=region_name)
+    instances = []
+    paginator = client.get_paginator('list_instances')
+    for page in paginator.paginate(ClusterId=cluster_id, InstanceStates=list(instance_states)):
+        instances += page['Instances']
+    return instances
+
+
+def invalidate(region_name, cluster_id):
+    """
+    Drop cached metadata of cluster, e.g. once terminated
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :return:
+    """
+    with _lock:
+        _cache.pop((region_name, cluster_id), None)
+        try:
+            os.remove(_cache_pathname(region_name, cluster_id))
+        except OSError:
+            pass
@@ -0,0 +1,177 @@
+import importlib
+import importlib.util
+import json
+import os
+from glob import glob
+
+from awsflow.config import CACHE_DIR
+from awsflow.helpers.log import logger
+from awsflow.helpers.templates import Templates
+from awsflow.version import __version__
+
+logging = logger.setup()
+
+# Entry point group of templates provided by other packages, e.g. in setup.py:
+# entry_points={'awsflow.templates.emr': ['big = mypkg.templates:CONFIG_EMR_BIG']}
+ENTRY_POINT_GROUP = 'awsflow.templates.{kind}'
+
+# Prefix of module attributes defining templates, in modules of templates directories
+TEMPLATE_ATTR_PREFIX = 'CONFIG_'
+
+# Modules of templates directories loaded so far {pathname: module}
+_file_modules = {}
+
+
+def entry_point_refs(kind):
+    """
+    List templates declared by installed packages as entry points, without importing them
+    :param kind: kind of templates, e.g. 'emr'
+    :return: list of 'module:attribute' references
+    """
+    group = ENTRY_POINT_GROUP.format(kind=kind)
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python < 3.8
+        import pkg_resources
+        return ['{}:{}'.format(ep.module_name, '.'.join(ep.attrs)) for ep in pkg_resources.iter_entry_points(group)]
+
+    eps = entry_points()
+    eps = eps.select(group=group) if hasattr(eps, 'select') else eps.get(group, [])
+    return [ep.value for ep in eps]
+
+
+def dir_units(templates_dir, kind):
+    """
+    List modules defining templates in directory: each module in `templates_dir`/`kind` defines any number of
+    templates as module attributes whose name starts with TEMPLATE_ATTR_PREFIX
+    :param templates_dir: templates directory
+    :param kind: kind of templates, e.g. 'emr'
+    :return: sorted list of module pathnames
+    """
+    pathnames = glob(os.path.join(os.path.expanduser(templates_dir), kind, '*.py'))
+    return sorted(pathname for pathname in pathnames if not os.path.basename(pathname).startswith('_'))
+
+
+def load_unit(unit):
+    """
+    Import module defining templates
+    :param unit: module name, or pathname of module in a templates directory
+    :return: module
+    """
+    if not unit.endswith('.py'):
+        return importlib.import_module(unit)
+
+    if unit not in _file_modules:
+        name = 'awsflow_templates_dir.{}'.format(os.path.splitext(os.path.basename(unit))[0])
+        spec = importlib.util.spec_from_file_location(name, unit)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _file_modules[unit] = module
+    return _file_modules[unit]
+
+
+def load_template(unit, attr):
+    """
+    Build template, calling the module attribute without arguments if it is a callable
+    :param unit: module name, or pathname of module in a templates directory
+    :param attr: name of module attribute defining the template
+    :return: template
+    """
+    template = getattr(load_unit(unit), attr)
+    return template() if callable(template) else template
+
+
+def fingerprint(unit):
+    """
+    Identify version of module defining templates without importing it
+    :param unit: module name, or pathname of module in a templates directory
+    :return: list [awsflow version, pathname, modification time, size], None if the module is not found
+    """
+    try:
+        pathname = unit if unit.endswith('.py') else importlib.util.find_spec(unit).origin
+        st = os.stat(pathname)
+    except (ImportError, AttributeError, OSError):
+        return None
+    return [__version__, pathname, st.st_mtime_ns, st.st_size]
+
+
+def index_unit(unit, attrs=None):
+    """
+    Index metadata of templates defined in module, importing it
+    :param unit: module name, or pathname of module in a templates directory
+    :param attrs: names of module attributes defining templates, None for all those starting with TEMPLATE_ATTR_PREFIX
+    :return: dict {attribute: {'name': template name, 'params': list of required parameters}}
+    """
+    if attrs is None:
+        attrs = sorted(attr for attr in vars(load_unit(unit)) if attr.startswith(TEMPLATE_ATTR_PREFIX))
+
+    index = {}
+    for attr in attrs:
+        template = load_template(unit, attr)
+        index[attr] = {'name': template['Name'],
+                       'params': sorted(Templates.placeholders(Templates.compile(template)))}
+    return index
+
+
+def _index_pathname(kind):
+    return os.path.join(os.path.expanduser(CACHE_DIR), 'templates', '{}.json'.format(kind))
+
+
+def index_templates(kind, refs=(), templates_dirs=()):
+    """
+    Index metadata of templates from references, entry points and templates directories.
+    The index is cached on disk: modules are imported only if they changed since they were last indexed.
+    The cached index is dropped when sources change, e.g. entry points of packages installed or removed.
+    :param kind: kind of templates, e.g. 'emr'
+    :param refs: list of 'module:attribute' references, e.g. of built-in templates
+    :param templates_dirs: list of templates directories
+    :return: list of (name, loader, params) tuples, as expected by Templates.add_source
+    """
+
+    # units (modules) to index, with their attributes defining templates (None: discover them)
+    units = {}
+    refs = list(refs) + entry_point_refs(kind)
+    for ref in refs:
+        unit, attr = ref.split(':', 1)
+        units.setdefault(unit, []).append(attr)
+    for templates_dir in templates_dirs:
+        for unit in dir_units(templates_dir, kind):
+            units[unit] = None
+    sources = {'refs': refs, 'templates_dirs': [os.path.abspath(os.path.expanduser(d)) for d in templates_dirs]}
+
+    pathname = _index_pathname(kind)
+    try:
+        with open(pathname, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    cached = cached.get('units', {}) if cached.get('sources') == sources else {}
+
+    index = {}
+    for unit, attrs in units.items():
+        entry = cached.get(unit)
+        current = fingerprint(unit)
+        if entry is None or current is None or entry['fingerprint'] != current or \
+                (attrs is not None and not set(attrs) <= set(entry['templates'])):
+            logging.debug("Indexing templates of {}".format(unit))
+            entry = {'fingerprint': current, 'templates': index_unit(unit, attrs)}
+        index[unit] = entry
+
+    if index != cached:
+        try:
+            os.makedirs(os.path.dirname(pathname), exist_ok=True)
+            with open(pathname + '.tmp', 'w') as f:
+                json.dump({'sources': sources, 'units': index}, f)
+            os.replace(pathname + '.tmp', pathname)
+        except OSError:
+            # e.g., read-only home directory in Lambda functions, index again next time
+            pass
+
+    templates = []
+    for unit, attrs in units.items():
+        entry = index[unit]['templates']
+        for attr in (attrs if attrs is not None else sorted(entry)):
+            templates.append((entry[attr]['name'], lambda unit=unit, attr=attr: load_template(unit, attr),
+                              entry[attr]['params']))
+    return templates
@@ -0,0 +1,129 @@
+import codecs
+import gzip
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from awsflow.config import EMR_LOGS_WORKERS, EMR_LOGS_BUFFER_LINES
+
+# Schemes of S3 URIs used as LogUri of clusters
+S3_SCHEMES = ['s3://', 's3n://', 's3a://']
+
+
+def log_location(log_uri, cluster_id):
+    """
+    Locate logs of cluster: EMR writes them under LogUri/`cluster_id`/
+    :param log_uri: LogUri of cluster, e.g. 's3n://bucket/awsflow/logs/emr/'
+    :param cluster_id: EMR cluster id
+    :return: (bucket, key prefix)
+    """
+    scheme = next((scheme for scheme in S3_SCHEMES if log_uri.startswith(scheme)), None)
+    if scheme is None:
+        raise ValueError("Not an S3 URI: {}".format(log_uri))
+
+    bucket, _, prefix = log_uri[len(scheme):].partition('/')
+    prefix = prefix.rstrip('/')
+    return bucket, '{}/{}/'.format(prefix, cluster_id) if prefix else '{}/'.format(cluster_id)
+
+
+def list_logs(s3, bucket, prefix):
+    """
+    List log objects, lazily page by page
+    :param s3: boto3 S3 client
+    :param bucket: bucket name
+    :param prefix: key prefix
+    :return: generator of dicts, as returned by list_objects_v2
+    """
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def read_log(s3, bucket, key):
+    """
+    Read log object as a stream of text lines, decompressing gzipped objects on the fly without temporary files
+    :param s3: boto3 S3 client
+    :param bucket: bucket name
+    :param key: object key, gzipped if ending with .gz
+    :return: generator of lines
+    """
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    stream = gzip.GzipFile(fileobj=body, mode='rb') if key.endswith('.gz') else body
+    try:
+        yield from codecs.getreader('utf-8')(stream, errors='replace')
+    finally:
+        body.close()
+
+
+def is_stderr(key):
+    """
+    Whether log object holds the standard error of a step, container or bootstrap action
+    :param key: object key
+    :return:
+    """
+    return os.path.basename(key).startswith('stderr')
+
+
+def read_logs(s3, bucket, keys, pattern=None, workers=EMR_LOGS_WORKERS, buffer_lines=EMR_LOGS_BUFFER_LINES):
+    """
+    Read many log objects concurrently, sharing the connection pool of the S3 client. Objects are streamed and
+    filtered while downloaded, and at most `workers` objects are read ahead of the one being consumed, each of them
+    buffering at most `buffer_lines` matching lines: memory stays bounded, whatever the size of logs.
+    :param s3: boto3 S3 client
+    :param bucket: bucket name
+    :param keys: list of object keys
+    :param pattern: regular expression selecting lines, None for all lines
+    :param workers: max number of objects read concurrently
+    :param buffer_lines: max number of lines buffered for each object read ahead
+    :return: generator of (key, generator of lines) tuples, in the order of keys. Lines are yielded as soon as
+    they are read, lines not consumed before moving to the next object are dropped.
+    """
+    regex = re.compile(pattern) if pattern else None
+    closed = threading.Event()
+
+    def put(lines, item):
+        # gives up when the consumer is gone, e.g. stopped by an exception
+        while not closed.is_set():
+            try:
+                lines.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(key, lines):
+        try:
+            for line in read_log(s3, bucket, key):
+                if (regex is None or regex.search(line)) and not put(lines, line):
+                    return
+        except Exception as e:
+            put(lines, e)
+        else:
+            put(lines, None)
+
+    def drain(lines):
+        while True:
+            item = lines.get()
+            if item is None:
+                return
+            elif isinstance(item, Exception):
+                raise item
+            yield item
+
+    keys = list(keys)
+    buffers = []
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for i, key in enumerate(keys):
+            while len(buffers) < min(len(keys), i + workers):
+                buffers.append(queue.Queue(maxsize=buffer_lines))
+                pool.submit(read, keys[len(buffers) - 1], buffers[-1])
+            lines = drain(buffers[i])
+            yield key, lines
+            for _ in lines:
+                pass
+            buffers[i] = None
+    finally:
+        closed.set()
+        pool.shutdown(wait=True)
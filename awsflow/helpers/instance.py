@@ -1,6 +1,66 @@
 import json
+import os
+import threading
+from collections import namedtuple
 
-import boto3
+from awsflow.helpers import cluster
+
+# Directory of the metadata files written by EMR on each node, can be overridden (e.g., in tests)
+METADATA_ROOT = '/mnt/var/lib/info'
+
+# Metadata of the EMR node running this process, from instance.json and extraInstanceData.json
+InstanceContext = namedtuple('InstanceContext', ['is_master', 'instance_role', 'instance_group_id', 'cluster_id',
+                                                 'region_name', 'master_private_dns_name', 'instance', 'extra'])
+
+# Contexts read so far {metadata root: InstanceContext}: metadata files do not change during the life of a node
+_lock = threading.Lock()
+_contexts = {}
+
+
+def load_context(root):
+    """
+    Read metadata files of EMR node
+    :param root: directory containing instance.json and extraInstanceData.json
+    :return: InstanceContext
+    """
+    with open(os.path.join(root, 'instance.json'), 'r') as f:
+        instance = json.load(f)
+    with open(os.path.join(root, 'extraInstanceData.json'), 'r') as f:
+        extra = json.load(f)
+
+    return InstanceContext(is_master=bool(instance['isMaster']),
+                           instance_role=instance.get('instanceRole', extra.get('instanceRole')),
+                           instance_group_id=instance.get('instanceGroupId'),
+                           cluster_id=extra['jobFlowId'],
+                           region_name=extra['region'],
+                           master_private_dns_name=extra.get('masterPrivateDnsName'),
+                           instance=instance,
+                           extra=extra)
+
+
+def get_context(root=None):
+    """
+    Get metadata of the EMR node running this process, reading metadata files only once per process
+    :param root: directory of metadata files, None for METADATA_ROOT
+    :return: InstanceContext
+    """
+    root = root or METADATA_ROOT
+    context = _contexts.get(root)
+    if context is None:
+        with _lock:
+            context = _contexts.get(root)
+            if context is None:
+                context = _contexts[root] = load_context(root)
+    return context
+
+
+def clear_context():
+    """
+    Drop cached contexts, forcing metadata files to be read again
+    :return:
+    """
+    with _lock:
+        _contexts.clear()
 
 
 def is_master():
@@ -8,9 +68,7 @@ def is_master():
     Returns true if executed on the AWS EMR master node
     :return:
     """
-    with open('/mnt/var/lib/info/instance.json', 'r') as f:
-        data = f.read()
-        return json.loads(data)['isMaster']
+    return get_context().is_master
 
 
 def get_extraInstanceData():
@@ -20,9 +78,7 @@ def get_extraInstanceData():
 
     :return: dict with all EMR cluster properties
     """
-    with open('/mnt/var/lib/info/extraInstanceData.json', 'r') as f:
-        data = f.read()
-        return json.loads(data)
+    return get_context().extra
 
 
 def get_region_name():
@@ -30,7 +86,7 @@ def get_region_name():
     Return EMR cluster region as string
     :return:
     """
-    return get_extraInstanceData()['region']
+    return get_context().region_name
 
 
 def get_cluster_id():
@@ -38,7 +94,7 @@ def get_cluster_id():
     Return EMR cluster id as string
     :return:
     """
-    return get_extraInstanceData()['jobFlowId']
+    return get_context().cluster_id
 
 
 def get_public_master_dns_name():
@@ -46,9 +102,5 @@ def get_public_master_dns_name():
     Return the EMR public master dns name
     :return:
     """
-    region_name = get_region_name()
-    cluster_id = get_cluster_id()
-
-    client = boto3.client('emr', region_name=region_name)
-    desc = client.describe_cluster(ClusterId=cluster_id)
-    return desc['Cluster']['MasterPublicDnsName']
+    context = get_context()
+    return cluster.get_public_master_dns_name(context.region_name, context.cluster_id)
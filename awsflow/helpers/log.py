@@ -4,11 +4,12 @@ import time
 from functools import wraps
 
 from awsflow.config import LOG_LEVEL
+from awsflow.helpers import metrics
 
 
 def log_duration(f):
     """
-    Log duration opf `f` exection
+    Log duration opf `f` exection, recording it also as a span
     :param f: function to be executed
     :return:
     """
@@ -16,7 +17,8 @@ def log_duration(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         start = time.perf_counter()
-        result = f(*args, **kwargs)
+        with metrics.span(f.__name__):
+            result = f(*args, **kwargs)
         end = time.perf_counter()
         duration = end - start
         logging.info('Execution of {} took {} seconds'.format(f.__name__, duration))
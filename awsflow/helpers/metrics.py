@@ -0,0 +1,257 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from awsflow.config import METRICS_EXPORTERS, METRICS_JSONL_PATHNAME, METRICS_PROMETHEUS_PATHNAME, \
+    METRICS_EMF_NAMESPACE, METRICS_MAX_SPANS
+
+# Upper bounds (in seconds) of histogram buckets, the last bucket is unbounded
+HISTOGRAM_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900]
+
+
+class Metrics:
+    """
+    Collector of nested spans, counters and histograms. Spans nest per thread: a span opened while another one
+    is open in the same thread becomes its child. Only the last `max_spans` spans are kept, their durations are
+    aggregated by path in the span_seconds histogram.
+    """
+
+    def __init__(self, max_spans=METRICS_MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def record_span(self, name, start, end, **attrs):
+        """
+        Record completed span with known start and end times, e.g. a cluster state, as child of the current span
+        :param name: span name
+        :param start: start time, seconds since epoch
+        :param end: end time, seconds since epoch
+        :param attrs: span attributes, e.g. cluster_id
+        :return: span dict
+        """
+        stack = self._stack()
+        span = {'name': name, 'path': '/'.join([s['name'] for s in stack] + [name]), 'start': start, 'end': end,
+                'duration': end - start, 'attrs': attrs}
+        with self._lock:
+            self.spans.append(span)
+        self.observe('span_seconds', span['duration'], path=span['path'])
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Measure duration of block as a span, child of the current span
+        :param name: span name
+        :param attrs: span attributes, e.g. cluster_id. More can be added to the yielded dict.
+        :return: context manager yielding the span attributes
+        """
+        stack = self._stack()
+        start, perf_start = time.time(), time.perf_counter()
+        current = {'name': name}
+        stack.append(current)
+        try:
+            yield attrs
+        finally:
+            stack.pop()
+            self.record_span(name, start, start + time.perf_counter() - perf_start, **attrs)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increment counter
+        :param name: counter name
+        :param value: increment
+        :param labels: counter labels, e.g. operation
+        :return:
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Add observation to histogram
+        :param name: histogram name
+        :param value: observed value, in seconds
+        :param labels: histogram labels, e.g. state
+        :return:
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.histograms.setdefault(key, {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(HISTOGRAM_BUCKETS) + 1)})
+            h['count'] += 1
+            h['sum'] += value
+            h['buckets'][next((i for i, bound in enumerate(HISTOGRAM_BUCKETS) if value <= bound),
+                              len(HISTOGRAM_BUCKETS))] += 1
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.histograms.clear()
+
+
+def _labels(labels, extra=()):
+    """
+    Format labels in Prometheus text format, e.g. '{operation="DescribeCluster"}'
+    """
+    items = list(labels) + list(extra)
+    return '{' + ','.join('{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in items) + '}' if items else ''
+
+
+def _write(pathname, lines):
+    """
+    Write lines to file atomically, e.g. for the Prometheus node exporter
+    """
+    pathname = os.path.expanduser(pathname)
+    os.makedirs(os.path.dirname(os.path.abspath(pathname)), exist_ok=True)
+    with open(pathname + '.tmp', 'w') as f:
+        f.writelines(line + '\n' for line in lines)
+    os.replace(pathname + '.tmp', pathname)
+
+
+def export_jsonl(m, pathname=METRICS_JSONL_PATHNAME):
+    """
+    Append spans, counters and histograms to file as JSON lines, one object per line
+    :param m: Metrics
+    :param pathname: pathname of file
+    :return:
+    """
+    pathname = os.path.expanduser(pathname)
+    os.makedirs(os.path.dirname(os.path.abspath(pathname)), exist_ok=True)
+    with open(pathname, 'a') as f:
+        for span in m.spans:
+            f.write(json.dumps(dict(span, type='span'), default=str) + '\n')
+        for (name, labels), value in sorted(m.counters.items()):
+            f.write(json.dumps({'type': 'counter', 'name': name, 'labels': dict(labels), 'value': value}) + '\n')
+        for (name, labels), h in sorted(m.histograms.items()):
+            record = {'type': 'histogram', 'name': name, 'labels': dict(labels), 'count': h['count'], 'sum': h['sum'],
+                      'buckets': dict(zip([str(bound) for bound in HISTOGRAM_BUCKETS] + ['+Inf'], h['buckets']))}
+            f.write(json.dumps(record) + '\n')
+
+
+def export_prometheus(m, pathname=METRICS_PROMETHEUS_PATHNAME):
+    """
+    Write counters and histograms in the Prometheus text format, e.g. for the node exporter textfile collector.
+    Span durations are exported by the span_seconds histogram, one series per span path.
+    The file is replaced atomically.
+    :param m: Metrics
+    :param pathname: pathname of file, usually ending with .prom
+    :return:
+    """
+    lines = []
+    for name in sorted(set(name for name, labels in m.counters)):
+        lines.append('# TYPE awsflow_{} counter'.format(name))
+        lines += ['awsflow_{}{} {}'.format(name, _labels(labels), value)
+                  for (n, labels), value in sorted(m.counters.items()) if n == name]
+
+    for name in sorted(set(name for name, labels in m.histograms)):
+        lines.append('# TYPE awsflow_{} histogram'.format(name))
+        for (n, labels), h in sorted(m.histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS + ['+Inf'], h['buckets']):
+                cumulative += count
+                lines.append('awsflow_{}_bucket{} {}'.format(name, _labels(labels, [('le', bound)]), cumulative))
+            lines.append('awsflow_{}_sum{} {}'.format(name, _labels(labels), h['sum']))
+            lines.append('awsflow_{}_count{} {}'.format(name, _labels(labels), h['count']))
+
+    _write(pathname, lines)
+
+
+def export_emf(m, namespace=METRICS_EMF_NAMESPACE, out=None):
+    """
+    Print spans and counters in the CloudWatch Embedded Metric Format: printed to stdout by lambda functions,
+    they become CloudWatch metrics without any API call
+    :param m: Metrics
+    :param namespace: CloudWatch namespace
+    :param out: file object receiving the output, None for stdout
+    :return:
+    """
+    out = out or sys.stdout
+    timestamp = int(time.time() * 1000)
+
+    for span in m.spans:
+        out.write(json.dumps({
+            '_aws': {'Timestamp': timestamp, 'CloudWatchMetrics': [
+                {'Namespace': namespace, 'Dimensions': [['Span']], 'Metrics': [{'Name': 'Duration', 'Unit': 'Seconds'}]}]},
+            'Span': span['path'], 'Duration': span['duration']}) + '\n')
+
+    for (name, labels), value in sorted(m.counters.items()):
+        record = dict(labels)
+        record['_aws'] = {'Timestamp': timestamp, 'CloudWatchMetrics': [
+            {'Namespace': namespace, 'Dimensions': [sorted(dict(labels))], 'Metrics': [{'Name': name, 'Unit': 'Count'}]}]}
+        record[name] = value
+        out.write(json.dumps(record) + '\n')
+
+
+# Registered exporters, new ones can be added here
+EXPORTERS = {
+    'jsonl': export_jsonl,
+    'prometheus': export_prometheus,
+    'emf': export_emf,
+}
+
+# Metrics collected by the process, exported at exit with METRICS_EXPORTERS
+metrics = Metrics()
+
+
+def export(exporters=METRICS_EXPORTERS):
+    """
+    Export metrics collected by the process
+    :param exporters: list of exporter names, keys of EXPORTERS
+    :return:
+    """
+    for name in exporters:
+        EXPORTERS[name](metrics)
+
+
+def flush(exporters=METRICS_EXPORTERS):
+    """
+    Export and drop metrics collected so far. Call it at the end of lambda functions: frozen lambda
+    containers do not run exit handlers, and warm ones would export metrics of previous invocations again.
+    :param exporters: list of exporter names, keys of EXPORTERS
+    :return:
+    """
+    export(exporters)
+    metrics.clear()
+
+
+def span(name, **attrs):
+    return metrics.span(name, **attrs)
+
+
+def record_span(name, start, end, **attrs):
+    return metrics.record_span(name, start, end, **attrs)
+
+
+def inc(name, value=1, **labels):
+    metrics.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    metrics.observe(name, value, **labels)
+
+
+def count_api_call(model, **kwargs):
+    """
+    botocore 'after-call' event handler, counting AWS API calls by service and operation
+    """
+    inc('aws_api_calls_total', service=model.service_model.service_name, operation=model.name)
+
+
+if METRICS_EXPORTERS:
+    atexit.register(export)
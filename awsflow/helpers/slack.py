@@ -1,25 +1,190 @@
-from slackclient import SlackClient
+import atexit
+import threading
+import time
+from collections import deque
 
-from awsflow.config import SLACK_API_TOKEN, SLACK_BOTNAME, SLACK_CHANNEL
+from awsflow.config import SLACK_API_TOKEN, SLACK_BOTNAME, SLACK_CHANNEL, SLACK_API_URL, SLACK_QUEUE_SIZE, \
+    SLACK_COALESCE_SECONDS, SLACK_MAX_RETRIES, SLACK_FLUSH_TIMEOUT, SLACK_LAMBDA_MARGIN_SECONDS
+from awsflow.helpers.log import logger
+
+logging = logger.setup()
+
+
+class Notifier:
+    """
+    Background Slack notifier: messages are queued and posted by a worker thread reusing one HTTP connection.
+    Messages to the same channel queued within SLACK_COALESCE_SECONDS are posted together, and rate limited
+    requests are retried after the delay requested by Slack.
+    """
+
+    def __init__(self, api_url=SLACK_API_URL, queue_size=SLACK_QUEUE_SIZE, coalesce_seconds=SLACK_COALESCE_SECONDS,
+                 max_retries=SLACK_MAX_RETRIES):
+        self.api_url = api_url
+        self.queue_size = queue_size
+        self.coalesce_seconds = coalesce_seconds
+        self.max_retries = max_retries
+        self.requests = 0
+
+        # queue of (api_token, channel, message) tuples, and number of messages not posted yet
+        self._queue = deque()
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._session = None
+        self._thread = None
+
+    def post(self, message, api_token, channel):
+        """
+        Queue message, without waiting for it to be posted. If the queue is full, the message is dropped.
+        :param message: message to post
+        :param api_token: slack api token
+        :param channel: channel to post to
+        :return: True if queued
+        """
+        with self._cond:
+            if len(self._queue) >= self.queue_size:
+                logging.warning('Slack queue full, dropping message: {}'.format(message))
+                return False
+            self._queue.append((api_token, channel, message))
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='slack-notifier', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return True
+
+    def flush(self, timeout=SLACK_FLUSH_TIMEOUT):
+        """
+        Wait until all queued messages are posted
+        :param timeout: max seconds to wait
+        :return: True if all messages were posted
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logging.warning('{} Slack messages not posted before timeout'.format(self._pending))
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _next_batch(self):
+        """
+        Wait for messages and take those to the same channel, queued within the coalescing window
+        :return: (api_token, channel, list of messages)
+        """
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+
+        # leave time to following messages to be queued
+        time.sleep(self.coalesce_seconds)
+
+        with self._cond:
+            api_token, channel, message = self._queue.popleft()
+            messages = [message]
+            while self._queue and self._queue[0][:2] == (api_token, channel):
+                messages.append(self._queue.popleft()[2])
+        return api_token, channel, messages
+
+    def _send(self, api_token, channel, text):
+        """
+        Post message with chat.postMessage, retrying rate limited and failed requests. Rejected requests
+        (e.g., invalid token or channel) are not retried.
+        :return: True if posted
+        """
+        import requests
+
+        if self._session is None:
+            self._session = requests.Session()
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.requests += 1
+                res = self._session.post(self.api_url, headers={'Authorization': 'Bearer {}'.format(api_token)},
+                                         json={'channel': channel, 'text': text, 'username': SLACK_BOTNAME}, timeout=10)
+            except requests.RequestException as e:
+                logging.warning('Slack request failed: {}'.format(e))
+                delay = 2 ** attempt
+            else:
+                if res.status_code == 429:
+                    delay = float(res.headers.get('Retry-After', 2 ** attempt))
+                elif res.status_code >= 500:
+                    delay = 2 ** attempt
+                elif res.status_code >= 400:
+                    logging.warning('Slack message rejected with status {}: {}'.format(res.status_code, res.text))
+                    return False
+                else:
+                    try:
+                        ok = res.json().get('ok', False)
+                    except ValueError:
+                        ok = False
+                    if not ok:
+                        logging.warning('Slack message not posted: {}'.format(res.text))
+                    return ok
+            time.sleep(delay)
+
+        logging.warning('Slack message not posted after {} retries'.format(self.max_retries))
+        return False
+
+    def _run(self):
+        while True:
+            api_token, channel, messages = self._next_batch()
+            try:
+                self._send(api_token, channel, '\n'.join(messages))
+            except Exception as e:
+                logging.warning('Slack message not posted: {}'.format(e))
+            with self._cond:
+                self._pending -= len(messages)
+                self._cond.notify_all()
+
+
+# Notifier shared by the process, created on first use and flushed at exit
+_lock = threading.Lock()
+_notifier = None
+
+
+def get_notifier():
+    """
+    Get notifier shared by the process, creating it if needed
+    :return: Notifier
+    """
+    global _notifier
+    with _lock:
+        if _notifier is None:
+            _notifier = Notifier()
+            atexit.register(_notifier.flush)
+        return _notifier
 
 
 def post(message, api_token=SLACK_API_TOKEN, channel=SLACK_CHANNEL):
     """
-    Post slack message
+    Post slack message in background, without waiting for it to be posted
     :param message: message to post
     :param api_token: slack api token
     :param channel: channel to post to
     :return:
     """
 
-    if not SLACK_CHANNEL:
+    if not channel:
         return
 
-    sc = SlackClient(api_token)
-    sc.api_call(
-        "chat.postMessage",
-        as_user=True,
-        channel=channel,
-        text=message,
-        user=SLACK_BOTNAME
-    )
+    get_notifier().post(message, api_token, channel)
+
+
+def flush(timeout=SLACK_FLUSH_TIMEOUT, context=None):
+    """
+    Wait until queued messages are posted. Call it at the end of lambda functions: frozen lambda
+    containers do not run exit handlers.
+    :param timeout: max seconds to wait
+    :param context: AWS lambda function context, to wait at most until SLACK_LAMBDA_MARGIN_SECONDS seconds
+    before the invocation deadline
+    :return: True if all messages were posted
+    """
+    if _notifier is None:
+        return True
+
+    if context is not None:
+        timeout = min(timeout, context.get_remaining_time_in_millis() / 1000 - SLACK_LAMBDA_MARGIN_SECONDS)
+
+    return _notifier.flush(max(0, timeout))
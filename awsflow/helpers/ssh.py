@@ -0,0 +1,173 @@
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from awsflow.config import AWS_SSH_KEY_PATHNAME, CACHE_DIR, SSH_CONTROL_PERSIST, SSH_WORKERS, SSH_TUNNEL_PORT, \
+    SSH_TUNNEL_MAX_BACKOFF, SSH_TUNNEL_HEALTH_SECONDS
+from awsflow.helpers.log import logger
+
+logging = logger.setup()
+
+# User of EMR nodes
+SSH_USER = 'hadoop'
+
+# Exit code of ssh when it fails to connect, instead of the exit code of the remote command
+SSH_ERROR = 255
+
+# Serializes lines printed by concurrent commands
+_print_lock = threading.Lock()
+
+
+def ssh_options(multiplex=True, proxy_host=None):
+    """
+    Options of ssh commands. With `multiplex`, the first connection to a host becomes a master connection
+    kept open for SSH_CONTROL_PERSIST seconds: following commands, also of later runs, reuse its session
+    without a new TCP connection and handshake.
+    :param multiplex: share connections with ControlMaster
+    :param proxy_host: reach hosts jumping through this host (e.g., the master node), None to connect directly
+    :return: list of ssh arguments
+    """
+    options = ['-F', '/dev/null',
+               '-i', os.path.expanduser(AWS_SSH_KEY_PATHNAME),
+               '-o', 'ConnectTimeout=5',
+               '-o', 'UserKnownHostsFile=/dev/null',
+               '-o', 'StrictHostKeyChecking=no',
+               '-o', 'LogLevel=ERROR',
+               '-o', 'ServerAliveInterval=15',
+               '-o', 'ServerAliveCountMax=3']
+
+    if multiplex:
+        control_dir = os.path.join(os.path.expanduser(CACHE_DIR), 'ssh')
+        os.makedirs(control_dir, mode=0o700, exist_ok=True)
+        options += ['-o', 'ControlMaster=auto',
+                    '-o', 'ControlPath={}'.format(os.path.join(control_dir, '%C')),
+                    '-o', 'ControlPersist={}'.format(SSH_CONTROL_PERSIST)]
+
+    if proxy_host:
+        # '%' escaped as '%%': tokens are expanded by the inner ssh, for the proxy host
+        proxy_args = ' '.join(shlex.quote(arg) for arg in ssh_options(multiplex=multiplex)).replace('%', '%%')
+        options += ['-o', 'ProxyCommand=ssh {} -W %h:%p {}@{}'.format(proxy_args, SSH_USER, proxy_host)]
+
+    return options
+
+
+def ssh_command(host, cmd=None, options=None):
+    """
+    Build ssh command line
+    :param host: host name
+    :param cmd: remote command, None for an interactive shell
+    :param options: ssh options, as returned by ssh_options
+    :return: list of arguments
+    """
+    args = ['ssh'] + (options if options is not None else ssh_options()) + ['{}@{}'.format(SSH_USER, host)]
+    return args + [cmd] if cmd else args
+
+
+def run(host, cmd=None, options=None):
+    """
+    Run command on host, with inherited stdin/stdout/stderr
+    :param host: host name
+    :param cmd: remote command, None for an interactive shell
+    :param options: ssh options, as returned by ssh_options
+    :return: exit code
+    """
+    return subprocess.call(ssh_command(host, cmd, options))
+
+
+def run_prefixed(host, cmd, prefix, options=None, out=None):
+    """
+    Run command on host, streaming its output line by line with a prefix
+    :param host: host name
+    :param cmd: remote command
+    :param prefix: prefix of output lines, e.g. the host name
+    :param options: ssh options, as returned by ssh_options
+    :param out: file object receiving the output, None for stdout
+    :return: exit code
+    """
+    out = out or sys.stdout
+    proc = subprocess.Popen(ssh_command(host, cmd, options), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, universal_newlines=True)
+    for line in proc.stdout:
+        with _print_lock:
+            out.write('{} | {}'.format(prefix, line if line.endswith('\n') else line + '\n'))
+            out.flush()
+    return proc.wait()
+
+
+def run_many(hosts, cmd, workers=SSH_WORKERS, proxy_host=None, out=None):
+    """
+    Run command on many hosts concurrently, streaming output lines prefixed by host name
+    :param hosts: list of host names
+    :param cmd: remote command
+    :param workers: max number of concurrent commands
+    :param proxy_host: reach hosts other than this one jumping through it (e.g., the master node),
+    None to connect directly to all hosts
+    :param out: file object receiving the output, None for stdout
+    :return: dict {host: exit code}
+    """
+    width = max([len(host) for host in hosts] or [0])
+    direct_options = ssh_options()
+    proxy_options = ssh_options(proxy_host=proxy_host) if proxy_host else direct_options
+
+    def run_host(host):
+        options = direct_options if host == proxy_host else proxy_options
+        return run_prefixed(host, cmd, host.ljust(width), options, out)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(hosts, pool.map(run_host, hosts)))
+
+
+def port_open(port, host='127.0.0.1', timeout=1):
+    """
+    Check whether a TCP port accepts connections
+    :param port: TCP port
+    :param host: host name
+    :param timeout: seconds to wait for the connection
+    :return: True if the connection succeeds
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def tunnel(get_host, port=SSH_TUNNEL_PORT, max_backoff=SSH_TUNNEL_MAX_BACKOFF,
+           health_seconds=SSH_TUNNEL_HEALTH_SECONDS, sleep=time.sleep):
+    """
+    Keep SOCKS tunnel to host open forever, reconnecting with exponential backoff when ssh exits
+    or the local port stops accepting connections
+    :param get_host: function returning the host name, called on each reconnection
+    :param port: local SOCKS port
+    :param max_backoff: max seconds between reconnections
+    :param health_seconds: seconds between health checks of the local port
+    :param sleep: function sleeping for the given seconds
+    :return:
+    """
+    backoff = 1
+    while True:
+        host = get_host()
+        options = ssh_options(multiplex=False) + ['-o', 'ExitOnForwardFailure=yes', '-ND', '0.0.0.0:{}'.format(port)]
+        args = ssh_command(host, options=options)
+        logging.info('Opening SSH tunnel to {} on port {} ...'.format(host, port))
+        proc = subprocess.Popen(args)
+        started = time.time()
+
+        while proc.poll() is None:
+            sleep(health_seconds)
+            if proc.poll() is None and not port_open(port):
+                logging.warning('SSH tunnel not accepting connections, restarting it')
+                proc.terminate()
+                proc.wait()
+
+        # a tunnel that stayed up for a while was healthy: start again from the shortest backoff
+        if time.time() - started > max_backoff:
+            backoff = 1
+        logging.warning('SSH tunnel closed (exit code {}), reconnecting in {}s'.format(proc.returncode, backoff))
+        sleep(backoff)
+        backoff = min(max_backoff, backoff * 2)
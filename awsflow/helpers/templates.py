@@ -1,4 +1,6 @@
 import copy
+import re
+from string import Formatter
 
 from awsflow.helpers.log import fatal, logger
 
@@ -11,23 +13,141 @@ class Templates:
     """
 
     def __init__(self):
-        self.templates = {}
+        self._templates = {}
+        self._plans = {}
+        self._params = {}
+        self._loaders = {}
+        self._sources = []
 
     def register(self, template):
         """
-        Register new template
+        Register new template, compiling its rendering plan and indexing its required parameters
         :param template: dict defining a complete template
         :return:
         """
-        assert template['Name'] not in self.templates
-        self.templates[template['Name']] = template
+        assert template['Name'] not in self._templates
+        self._loaders.pop(template['Name'], None)
+        self._templates[template['Name']] = template
+        self._plans[template['Name']] = Templates.compile(template)
+        self._params[template['Name']] = Templates.placeholders(self._plans[template['Name']])
+
+    def register_loader(self, name, loader, params):
+        """
+        Register template known only by its indexed metadata: the template is built by `loader` on first use.
+        :param name: name of template
+        :param loader: function without arguments returning the template
+        :param params: list of parameter names required by the template
+        :return:
+        """
+        self._loaders[name] = loader
+        self._params[name] = set(params)
+
+    def add_source(self, source):
+        """
+        Add source of templates, called once on first access to the registry
+        :param source: function without arguments returning a list of (name, loader, params) tuples
+        :return:
+        """
+        self._sources.append(source)
+
+    def discover(self):
+        """
+        Register metadata of templates provided by sources, if not done yet. Templates already registered
+        with the same name take precedence.
+        :return:
+        """
+        while self._sources:
+            for name, loader, params in self._sources.pop(0)():
+                if name in self._params:
+                    logging.warning("Template '{}' already registered, skipping it".format(name))
+                    continue
+                self.register_loader(name, loader, params)
+
+    def load(self, name=None):
+        """
+        Build templates registered by loader
+        :param name: name of template to build, None to build all of them
+        :return:
+        """
+        self.discover()
+        for loader_name in ([name] if name is not None else list(self._loaders)):
+            loader = self._loaders.pop(loader_name, None)
+            if loader is not None:
+                self.register(loader())
+
+    @property
+    def templates(self):
+        self.load()
+        return self._templates
+
+    @property
+    def plans(self):
+        self.load()
+        return self._plans
+
+    @property
+    def params(self):
+        self.discover()
+        return self._params
 
     def get_names(self):
         """
-        Get list of template names
+        Get list of template names, without building the templates
         :return: list of template names
         """
-        return [t['Name'] for t in self.templates.values()]
+        return list(self.params)
+
+    def get_params(self, name):
+        """
+        Get parameters required by template. Parameters used only by callables are not included.
+        :param name: name of template
+        :return: sorted list of parameter names
+        """
+        return sorted(self.params[name])
+
+    def validate(self, name, params):
+        """
+        Check that all parameters required by template are provided, without rendering it
+        :param name: name of template
+        :param params: dictionary { 'param_name' : 'param_value'}
+        :return: sorted list of missing parameter names, empty if none
+        """
+        return sorted(self.params[name].difference(params))
+
+    @classmethod
+    def placeholders(cls, plan):
+        """
+        Find names of parameters referenced by placeholders in the strings of a plan.
+        E.g., '{s3prefix}/{date.year}' references 's3prefix' and 'date'.
+        :param plan: plan of template, as returned by compile
+        :return: set of parameter names
+        """
+
+        if type(plan) is dict:
+            return set().union(*[cls.placeholders(p) for p in plan.values()])
+        elif type(plan) is str:
+            fields = [field for _, field, _, _ in Formatter().parse(plan) if field]
+            return {re.split(r'[.\[]', field, 1)[0] for field in fields}
+        else:
+            return set()
+
+    @classmethod
+    def parse_params(cls, params):
+        """
+        Parse list of strings 'name=value' into a dictionary, parsing integers
+        :param params: list of strings 'name=value'
+        :return: dictionary { 'param_name' : 'param_value'}
+        """
+
+        dict_params = {}
+        for param in params or []:
+            key, value = param.split('=', 1)
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+            dict_params[key] = value
+        return dict_params
 
     @classmethod
     def assign_params(cls, t, params):
@@ -63,6 +183,70 @@ class Templates:
         elif callable(t):
             f(t)
 
+    @classmethod
+    def compile(cls, t):
+        """
+        Compile rendering plan of template, visiting recursively dicts and lists.
+        The plan lists only the paths leading to strings with placeholders and to callables:
+        it is a dict {key or index: plan} for dicts and lists, the string or callable itself for leaves.
+        :param t: template
+        :return: plan, None if the template does not depend on parameters
+        """
+
+        if type(t) in [dict, list]:
+            plan = {}
+            for k in (t if type(t) is dict else range(len(t))):
+                p = cls.compile(t[k])
+                if p is not None:
+                    plan[k] = p
+            return plan or None
+        elif callable(t):
+            return t
+        elif type(t) is str and ('{' in t or '}' in t):
+            return t
+        else:
+            return None
+
+    @classmethod
+    def copy_containers(cls, t):
+        """
+        Copy dicts and lists of template, visiting them recursively. Leaves are shared: strings and numbers
+        are immutable, and cheaper to share than to copy as copy.deepcopy would do.
+        :param t: template
+        :return: copy of template
+        """
+
+        if type(t) is dict:
+            return {k: cls.copy_containers(v) for k, v in t.items()}
+        elif type(t) is list:
+            return [cls.copy_containers(v) for v in t]
+        else:
+            return t
+
+    @classmethod
+    def render(cls, t, plan, params):
+        """
+        Render template following its plan: only strings with placeholders and callables on the plan are
+        evaluated. Dicts and lists are always copied, the rendered template can be modified without affecting
+        the registered one.
+        :param t: template
+        :param plan: plan of template, as returned by compile
+        :param params: dictionary { 'param_name' : 'param_value'}
+        :return: rendered template
+        """
+
+        if plan is None:
+            return cls.copy_containers(t)
+        elif type(plan) is dict:
+            r = copy.copy(t)
+            for k in (t if type(t) is dict else range(len(t))):
+                r[k] = cls.render(t[k], plan[k], params) if k in plan else cls.copy_containers(t[k])
+            return r
+        elif type(plan) is str:
+            return plan.format(**params)
+        else:
+            return plan(**params)
+
     def get(self, name, params=[]):
         """
         Get template, applying params and func
@@ -70,31 +254,25 @@ class Templates:
         An attempt is made to parse intergers, this is done so that formatting
         parameters for zero passing can be used in the templates. Useful for
         dealing with inconsistent date formatting.
+
         :param name: name of template to retrieve
         :param params: list of strings 'name:value' applied to all strings in template
         :return: dict of selected template
         """
 
-        if name not in self.templates:
+        if name not in self.params:
             fatal("Template '{}' not found".format(name))
+        self.load(name)
 
-        t = copy.deepcopy(self.templates[name])
-
-        dict_params = {}
-        if params:
-            for param in params:
-                key, value = param.split('=')
-                try:
-                    value = int(value)
-                except ValueError:
-                    pass
-                dict_params[key] = value
-
+        dict_params = Templates.parse_params(params)
+        if dict_params:
             logging.info('Template parameters: {}'.format(dict_params))
 
+        missing = self.validate(name, dict_params)
+        if missing:
+            fatal("Missing template parameters for '{}': {}".format(name, ', '.join(missing)))
+
         try:
-            Templates.assign_params(t, dict_params)
+            return Templates.render(self._templates[name], self._plans[name], dict_params)
         except KeyError as keyError:
             fatal("Missing template parameter: {}".format(keyError))
-
-        return t
@@ -0,0 +1,154 @@
+import csv
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from awsflow.config import EMR_LOGS_WORKERS
+from awsflow.helpers.emrlogs import log_location, list_logs, read_log
+
+# Columns of timeline rows
+TIMELINE_FIELDS = ['cluster_id', 'phase', 'name', 'node', 'start', 'end', 'seconds']
+
+# Controller logs of bootstrap actions, written by EMR on each node
+BOOTSTRAP_LOG_RE = re.compile(r'node/(?P<node>[^/]+)/bootstrap-actions/(?P<index>\d+)/controller(\.gz)?$')
+
+# Timestamp at the beginning of controller log lines, e.g. '2019-04-02T15:00:48.647Z INFO ...'
+LOG_TIMESTAMP_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})')
+
+
+def _row(cluster_id, phase, name, start, end, node=None):
+    return {'cluster_id': cluster_id, 'phase': phase, 'name': name, 'node': node, 'start': start, 'end': end,
+            'seconds': (end - start).total_seconds() if start and end else None}
+
+
+def error_row(cluster_id, error):
+    """
+    Row in place of the timeline of a cluster that could not be reconstructed, e.g. not found
+    :param cluster_id: EMR cluster id
+    :param error: exception raised reconstructing the timeline
+    :return: timeline row
+    """
+    return {'cluster_id': cluster_id, 'phase': 'error', 'name': str(error), 'node': None, 'start': None, 'end': None,
+            'seconds': None}
+
+
+def _paginate(client, operation, key, **kwargs):
+    items = []
+    for page in client.get_paginator(operation).paginate(**kwargs):
+        items += page[key]
+    return items
+
+
+def bootstrap_times(s3, bucket, key):
+    """
+    Find when a bootstrap action ran on a node, from the first and last timestamps of its controller log
+    :param s3: boto3 S3 client
+    :param bucket: bucket name
+    :param key: key of controller log
+    :return: (start, end) datetimes, None if not found
+    """
+    timestamps = []
+    for line in read_log(s3, bucket, key):
+        match = LOG_TIMESTAMP_RE.match(line)
+        if match:
+            timestamps.append(datetime.strptime(' '.join(match.groups()), '%Y-%m-%d %H:%M:%S').replace(
+                tzinfo=timezone.utc))
+    return (min(timestamps), max(timestamps)) if timestamps else (None, None)
+
+
+def bootstrap_rows(s3, cluster_id, log_uri, action_names, workers=EMR_LOGS_WORKERS):
+    """
+    Reconstruct bootstrap action phases of each node from the controller logs in the LogUri of the cluster
+    :param s3: boto3 S3 client
+    :param cluster_id: EMR cluster id
+    :param log_uri: LogUri of cluster
+    :param action_names: names of bootstrap actions, in order
+    :param workers: max number of logs read concurrently
+    :return: list of timeline rows
+    """
+    bucket, prefix = log_location(log_uri, cluster_id)
+    logs = []
+    for obj in list_logs(s3, bucket, prefix + 'node/'):
+        match = BOOTSTRAP_LOG_RE.search(obj['Key'])
+        if match:
+            logs.append((obj['Key'], match.group('node'), int(match.group('index'))))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        times = list(pool.map(lambda log: bootstrap_times(s3, bucket, log[0]), logs))
+
+    rows = []
+    for (key, node, index), (start, end) in zip(logs, times):
+        name = action_names[index - 1] if 0 < index <= len(action_names) else str(index)
+        rows.append(_row(cluster_id, 'bootstrap', name, start, end, node=node))
+    return rows
+
+
+def cluster_timeline(emr, s3, cluster_id, workers=EMR_LOGS_WORKERS):
+    """
+    Reconstruct provisioning phases of cluster from its timeline, instance fleets (or groups), steps and,
+    when present in the LogUri, bootstrap action logs. With bootstrap logs, the startup of the cluster is split in
+    the STARTING phase (until the first bootstrap action starts) and the BOOTSTRAPPING phase.
+    :param emr: boto3 EMR client
+    :param s3: boto3 S3 client, None to ignore bootstrap logs
+    :param cluster_id: EMR cluster id
+    :param workers: max number of bootstrap logs read concurrently
+    :return: list of timeline rows, dicts with TIMELINE_FIELDS keys
+    """
+    cluster = emr.describe_cluster(ClusterId=cluster_id)['Cluster']
+    timeline = cluster['Status'].get('Timeline', {})
+    created, ready, ended = [timeline.get(field) for field in ['CreationDateTime', 'ReadyDateTime', 'EndDateTime']]
+
+    rows = [_row(cluster_id, 'cluster', 'startup', created, ready)]
+
+    if cluster.get('InstanceCollectionType') == 'INSTANCE_FLEET':
+        for fleet in _paginate(emr, 'list_instance_fleets', 'InstanceFleets', ClusterId=cluster_id):
+            fleet_timeline = fleet['Status'].get('Timeline', {})
+            rows.append(_row(cluster_id, 'fleet', fleet.get('Name', fleet['Id']),
+                             fleet_timeline.get('CreationDateTime'), fleet_timeline.get('ReadyDateTime')))
+    else:
+        for group in _paginate(emr, 'list_instance_groups', 'InstanceGroups', ClusterId=cluster_id):
+            group_timeline = group['Status'].get('Timeline', {})
+            rows.append(_row(cluster_id, 'group', group.get('Name', group['Id']),
+                             group_timeline.get('CreationDateTime'), group_timeline.get('ReadyDateTime')))
+
+    if s3 is not None and cluster.get('LogUri'):
+        actions = _paginate(emr, 'list_bootstrap_actions', 'BootstrapActions', ClusterId=cluster_id)
+        bootstrap = bootstrap_rows(s3, cluster_id, cluster['LogUri'], [action['Name'] for action in actions],
+                                   workers=workers)
+        starts = [row['start'] for row in bootstrap if row['start']]
+        if starts:
+            rows += [_row(cluster_id, 'cluster', 'STARTING', created, min(starts)),
+                     _row(cluster_id, 'cluster', 'BOOTSTRAPPING', min(starts), ready)]
+        rows += bootstrap
+
+    # steps are listed newest first
+    for step in reversed(_paginate(emr, 'list_steps', 'Steps', ClusterId=cluster_id)):
+        step_timeline = step['Status'].get('Timeline', {})
+        rows.append(_row(cluster_id, 'step', step['Name'], step_timeline.get('StartDateTime'),
+                         step_timeline.get('EndDateTime')))
+
+    rows.append(_row(cluster_id, 'cluster', 'running', ready, ended))
+    return rows
+
+
+def write_timeline(rows, f, output_format='csv'):
+    """
+    Write timeline rows, with datetimes in ISO format
+    :param rows: list of timeline rows
+    :param f: file object
+    :param output_format: 'csv' or 'json'
+    :return:
+    """
+    rows = [{field: value.isoformat() if isinstance(value, datetime) else value for field, value in row.items()}
+            for row in rows]
+
+    if output_format == 'json':
+        json.dump(rows, f, indent=2)
+        f.write('\n')
+    elif output_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=TIMELINE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        raise ValueError("Unknown timeline format: {}".format(output_format))
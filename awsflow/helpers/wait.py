@@ -0,0 +1,440 @@
+import json
+import math
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from awsflow.config import EMR_WAIT_MODE, EMR_WAIT_MIN_SECONDS, EMR_WAIT_FIXED_SECONDS, \
+    EMR_EVENTS_QUEUE_URL, EMR_EVENTS_MAX_RECEIVES, EMR_WATCH_WORKERS
+from awsflow.helpers import metrics
+from awsflow.helpers.clients import get_client
+from awsflow.helpers.log import fatal
+from awsflow.helpers.log import logger
+
+logging = logger.setup()
+
+# States from which an EMR cluster never comes back
+TERMINAL_STATES = ['TERMINATED', 'TERMINATED_WITH_ERRORS']
+
+# States of clusters that are still alive, used to filter list_clusters server side
+ACTIVE_STATES = ['STARTING', 'BOOTSTRAPPING', 'RUNNING', 'WAITING', 'TERMINATING']
+
+# States from which an EMR step never comes back
+STEP_TERMINAL_STATES = ['COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED']
+
+# States of steps that are not done yet, used to filter list_steps server side
+STEP_ACTIVE_STATES = ['PENDING', 'CANCEL_PENDING', 'RUNNING']
+
+# Typical time (in seconds) spent by an EMR cluster in each state before moving to the next one.
+# The adaptive schedule polls rarely while a transition is unlikely, and often when it is due.
+STATE_DURATIONS = {
+    'STARTING': 300,
+    'BOOTSTRAPPING': 120,
+    'TERMINATING': 60,
+}
+
+# Outcome of a wait: final state, list of (state, timestamp) transitions observed, number of API calls
+WaitResult = namedtuple('WaitResult', ['state', 'transitions', 'api_calls'])
+
+
+class WaitTimeoutError(Exception):
+    """
+    Raised when the deadline expires before the cluster reaches one of the expected states
+    """
+
+    def __init__(self, cluster_id, state, transitions):
+        super().__init__('EMR Cluster {} did not reach expected states before deadline (last state: {})'.format(
+            cluster_id, state))
+        self.cluster_id = cluster_id
+        self.state = state
+        self.transitions = transitions
+
+
+def fixed_delay(state, elapsed):
+    """
+    Constant polling interval, independent of state
+    :param state: current cluster state
+    :param elapsed: seconds spent so far in `state`
+    :return: seconds to sleep before next poll
+    """
+    return EMR_WAIT_FIXED_SECONDS
+
+
+def due_delay(expected, elapsed):
+    """
+    Polling interval shrinking while a transition approaches its expected time, shortest when it is due.
+    Most transitions happen late: once overdue, the interval grows back slowly, never beyond EMR_WAIT_FIXED_SECONDS.
+    :param expected: expected seconds before the transition, None if unknown
+    :param elapsed: seconds elapsed so far
+    :return: seconds to sleep before next poll
+    """
+    if expected is None:
+        return EMR_WAIT_FIXED_SECONDS
+    distance = (expected - elapsed) / 2 if elapsed < expected else (elapsed - expected) / 10
+    return max(EMR_WAIT_MIN_SECONDS, min(EMR_WAIT_FIXED_SECONDS, distance))
+
+
+def adaptive_delay(state, elapsed):
+    """
+    Polling interval based on the typical transition time of `state`, see due_delay
+    :param state: current cluster state
+    :param elapsed: seconds spent so far in `state`
+    :return: seconds to sleep before next poll
+    """
+    return due_delay(STATE_DURATIONS.get(state), elapsed)
+
+
+def poll_states(client, cluster_id, expected_states, deadline=None, schedule=adaptive_delay, clock=time.time,
+                sleep=time.sleep):
+    """
+    Wait polling describe_cluster, sleeping between polls as suggested by `schedule`
+    :param client: boto3 EMR client
+    :param cluster_id: EMR cluster id
+    :param expected_states: wait until one of the states is reached
+    :param deadline: absolute time (as returned by `clock`) after which WaitTimeoutError is raised, None to wait forever
+    :param schedule: function (state, elapsed) returning the seconds to sleep before the next poll
+    :param clock: function returning current time in seconds
+    :param sleep: function sleeping for the given seconds
+    :return: WaitResult
+    """
+    transitions = []
+    api_calls = 0
+    state, since = None, None
+
+    while True:
+        poll_start = time.perf_counter()
+        desc = client.describe_cluster(ClusterId=cluster_id)
+        metrics.observe('emr_poll_seconds', time.perf_counter() - poll_start, operation='DescribeCluster')
+        api_calls += 1
+        now = clock()
+
+        if desc['Cluster']['Status']['State'] != state:
+            state, since = desc['Cluster']['Status']['State'], now
+            transitions.append((state, now))
+            logging.info("EMR Cluster {} state: {}".format(cluster_id, state))
+
+        if state in expected_states or state in TERMINAL_STATES:
+            return WaitResult(state, transitions, api_calls)
+
+        delay = schedule(state, now - since)
+        if deadline is not None:
+            if now >= deadline:
+                raise WaitTimeoutError(cluster_id, state, transitions)
+            delay = min(delay, deadline - now)
+        sleep(delay)
+
+
+def wait_fixed(client, cluster_id, expected_states, deadline=None, clock=time.time, sleep=time.sleep):
+    """
+    Wait polling every EMR_WAIT_FIXED_SECONDS seconds
+    """
+    return poll_states(client, cluster_id, expected_states, deadline, fixed_delay, clock, sleep)
+
+
+def wait_adaptive(client, cluster_id, expected_states, deadline=None, clock=time.time, sleep=time.sleep):
+    """
+    Wait polling with the adaptive schedule based on STATE_DURATIONS
+    """
+    return poll_states(client, cluster_id, expected_states, deadline, adaptive_delay, clock, sleep)
+
+
+def wait_waiter(client, cluster_id, expected_states, deadline=None, clock=time.time, sleep=time.sleep):
+    """
+    Wait using the boto3 EMR waiters. Only the start and end of the wait are timestamped, since
+    waiters do not report intermediate states. Falls back to the adaptive mode if no waiter matches.
+    """
+
+    if set(expected_states) <= {'WAITING', 'RUNNING'}:
+        waiter_name = 'cluster_running'
+    elif set(expected_states) <= set(TERMINAL_STATES):
+        waiter_name = 'cluster_terminated'
+    else:
+        return wait_adaptive(client, cluster_id, expected_states, deadline, clock, sleep)
+
+    from botocore.exceptions import WaiterError
+
+    waiter_config = {'Delay': EMR_WAIT_FIXED_SECONDS}
+    if deadline is not None:
+        waiter_config['MaxAttempts'] = max(1, math.ceil((deadline - clock()) / EMR_WAIT_FIXED_SECONDS))
+
+    transitions = [(None, clock())]
+    try:
+        client.get_waiter(waiter_name).wait(ClusterId=cluster_id, WaiterConfig=waiter_config)
+    except WaiterError as e:
+        if 'Max attempts exceeded' in str(e):
+            raise WaitTimeoutError(cluster_id, None, transitions)
+        # the cluster reached a failure state, e.g. it terminated while we waited for it to run
+
+    state = client.describe_cluster(ClusterId=cluster_id)['Cluster']['Status']['State']
+    transitions.append((state, clock()))
+    logging.info("EMR Cluster {} state: {}".format(cluster_id, state))
+
+    # api calls done by the waiter are not visible from here, count only the final describe_cluster
+    return WaitResult(state, transitions, 1)
+
+
+def wait_events(client, cluster_id, expected_states, deadline=None, clock=time.time, sleep=time.sleep):
+    """
+    Wait consuming "EMR Cluster State Change" events delivered to the EMR_EVENTS_QUEUE_URL SQS queue
+    by an EventBridge rule. State changes are detected as soon as they are published, without any
+    describe_cluster polling. Falls back to the adaptive mode if no queue is configured.
+    """
+
+    if not EMR_EVENTS_QUEUE_URL:
+        logging.warning("EMR_EVENTS_QUEUE_URL not set, falling back to adaptive polling")
+        return wait_adaptive(client, cluster_id, expected_states, deadline, clock, sleep)
+
+    sqs = get_client('sqs', region_name=client.meta.region_name)
+
+    # events report only changes: read current state once, in case we missed them
+    state = client.describe_cluster(ClusterId=cluster_id)['Cluster']['Status']['State']
+    transitions = [(state, clock())]
+    api_calls = 1
+    logging.info("EMR Cluster {} state: {}".format(cluster_id, state))
+
+    while state not in expected_states and state not in TERMINAL_STATES:
+        wait_seconds = 20
+        if deadline is not None:
+            if clock() >= deadline:
+                raise WaitTimeoutError(cluster_id, state, transitions)
+            wait_seconds = max(0, min(wait_seconds, int(deadline - clock())))
+
+        res = sqs.receive_message(QueueUrl=EMR_EVENTS_QUEUE_URL, WaitTimeSeconds=wait_seconds,
+                                  MaxNumberOfMessages=10, AttributeNames=['ApproximateReceiveCount'])
+        api_calls += 1
+
+        for msg in res.get('Messages', []):
+            detail = json.loads(msg['Body']).get('detail', {})
+            if detail.get('clusterId') != cluster_id:
+                # event of another cluster: leave it in the queue for its watcher, it is received again after
+                # its visibility timeout. Delete it once received too many times, nobody is waiting for it.
+                if int(msg.get('Attributes', {}).get('ApproximateReceiveCount', 1)) >= EMR_EVENTS_MAX_RECEIVES:
+                    sqs.delete_message(QueueUrl=EMR_EVENTS_QUEUE_URL, ReceiptHandle=msg['ReceiptHandle'])
+                    api_calls += 1
+                continue
+            sqs.delete_message(QueueUrl=EMR_EVENTS_QUEUE_URL, ReceiptHandle=msg['ReceiptHandle'])
+            api_calls += 1
+            if detail.get('state') and detail['state'] != state:
+                state = detail['state']
+                transitions.append((state, clock()))
+                logging.info("EMR Cluster {} state: {}".format(cluster_id, state))
+
+    return WaitResult(state, transitions, api_calls)
+
+
+# Registered wait modes, new ones can be added here
+WAIT_MODES = {
+    'fixed': wait_fixed,
+    'adaptive': wait_adaptive,
+    'waiter': wait_waiter,
+    'events': wait_events,
+}
+
+
+def wait_cluster_states(client, cluster_id, expected_states, mode=EMR_WAIT_MODE, deadline=None, clock=time.time,
+                        sleep=time.sleep):
+    """
+    Wait until EMR cluster reaches one of the desired states or terminates
+    :param client: boto3 EMR client
+    :param cluster_id: EMR cluster id
+    :param expected_states: wait until one of the states is reached
+    :param mode: wait mode, one of WAIT_MODES
+    :param deadline: absolute time (as returned by `clock`) after which WaitTimeoutError is raised, None to wait forever
+    :param clock: function returning current time in seconds
+    :param sleep: function sleeping for the given seconds
+    :return: WaitResult
+    """
+    if mode not in WAIT_MODES:
+        raise ValueError("Wait mode '{}' not recognized".format(mode))
+    return WAIT_MODES[mode](client, cluster_id, expected_states, deadline, clock, sleep)
+
+
+def list_cluster_states(client, cluster_states=ACTIVE_STATES):
+    """
+    List states of all clusters in one of `cluster_states`, filtering server side and following pagination
+    :param client: boto3 EMR client
+    :param cluster_states: states to consider
+    :return: dict {cluster_id: state}, number of pages (API calls)
+    """
+    states = {}
+    pages = 0
+    for page in client.get_paginator('list_clusters').paginate(ClusterStates=cluster_states):
+        pages += 1
+        for cluster in page['Clusters']:
+            states[cluster['Id']] = cluster['Status']['State']
+    return states, pages
+
+
+def describe_cluster_states(client, cluster_ids, workers=EMR_WATCH_WORKERS):
+    """
+    Get states of clusters with concurrent describe_cluster calls. Exits if a cluster is not found.
+    :param client: boto3 EMR client
+    :param cluster_ids: list of EMR cluster ids
+    :param workers: max number of concurrent calls
+    :return: dict {cluster_id: state}
+    """
+    from botocore.exceptions import ClientError
+
+    def describe(cluster_id):
+        try:
+            return client.describe_cluster(ClusterId=cluster_id)
+        except ClientError as e:
+            fatal("Cluster '{}' not found: {}".format(cluster_id, e))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        descs = list(pool.map(describe, cluster_ids))
+    return {desc['Cluster']['Id']: desc['Cluster']['Status']['State'] for desc in descs}
+
+
+def watch_clusters(client, cluster_ids, expected_states, deadline=None, schedule=adaptive_delay, clock=time.time,
+                   sleep=time.sleep):
+    """
+    Follow many clusters at once, yielding their state changes as they happen.
+    Each tick costs one paginated list_clusters call, independently of the number of clusters watched.
+    Clusters missing from the listing (i.e., terminated) are described once, concurrently.
+    :param client: boto3 EMR client
+    :param cluster_ids: list of EMR cluster ids
+    :param expected_states: stop following a cluster once it reaches one of these states
+    :param deadline: absolute time (as returned by `clock`) after which WaitTimeoutError is raised, None to wait forever
+    :param schedule: function (state, elapsed) returning the seconds to sleep before the next poll
+    :param clock: function returning current time in seconds
+    :param sleep: function sleeping for the given seconds
+    :return: generator of (cluster_id, state, timestamp) tuples
+    """
+
+    pending = set(cluster_ids)
+    states, since = {}, {}
+
+    while pending:
+        poll_start = time.perf_counter()
+        listed, _ = list_cluster_states(client)
+        metrics.observe('emr_poll_seconds', time.perf_counter() - poll_start, operation='ListClusters')
+        current = {cluster_id: listed[cluster_id] for cluster_id in pending if cluster_id in listed}
+        missing = [cluster_id for cluster_id in pending if cluster_id not in listed]
+        if missing:
+            current.update(describe_cluster_states(client, missing))
+        now = clock()
+
+        for cluster_id in sorted(current):
+            if current[cluster_id] != states.get(cluster_id):
+                states[cluster_id], since[cluster_id] = current[cluster_id], now
+                yield cluster_id, current[cluster_id], now
+            if current[cluster_id] in expected_states or current[cluster_id] in TERMINAL_STATES:
+                pending.discard(cluster_id)
+
+        if not pending:
+            return
+
+        delay = min(schedule(states[cluster_id], now - since[cluster_id]) for cluster_id in pending)
+        if deadline is not None:
+            if now >= deadline:
+                raise WaitTimeoutError(','.join(sorted(pending)), None, [])
+            delay = min(delay, deadline - now)
+        sleep(delay)
+
+
+def list_active_steps(client, cluster_id):
+    """
+    List all steps of a cluster that are not done yet, filtering server side and following pagination
+    :param client: boto3 EMR client
+    :param cluster_id: EMR cluster id
+    :return: dict {step_id: step summary}, number of pages (API calls)
+    """
+    steps = {}
+    pages = 0
+    for page in client.get_paginator('list_steps').paginate(ClusterId=cluster_id, StepStates=STEP_ACTIVE_STATES):
+        pages += 1
+        for step in page['Steps']:
+            steps[step['Id']] = step
+    return steps, pages
+
+
+def list_step_states(client, cluster_id, step_ids):
+    """
+    Get summaries of steps. Steps are listed newest first, and pagination stops as soon as all steps are found:
+    recently added steps cost a single list_steps call.
+    :param client: boto3 EMR client
+    :param cluster_id: EMR cluster id
+    :param step_ids: list of step ids
+    :return: dict {step_id: step summary}, number of pages (API calls)
+    """
+    missing = set(step_ids)
+    steps = {}
+    pages = 0
+    for page in client.get_paginator('list_steps').paginate(ClusterId=cluster_id):
+        pages += 1
+        for step in page['Steps']:
+            if step['Id'] in missing:
+                steps[step['Id']] = step
+                missing.discard(step['Id'])
+        if not missing:
+            break
+    return steps, pages
+
+
+def step_timeline(step):
+    """
+    Start and end time of a step, as recorded by EMR in its timeline: unlike the times at which state changes
+    are observed, they are exact for steps already running when watching starts, or done between two polls
+    :param step: step summary, as returned by list_steps
+    :return: (start, end) timestamps in seconds, None if the step did not start or end yet
+    """
+    timeline = step['Status'].get('Timeline', {})
+    start, end = timeline.get('StartDateTime'), timeline.get('EndDateTime')
+    return start.timestamp() if start else None, end.timestamp() if end else None
+
+
+def watch_steps(client, cluster_id, step_ids=None, deadline=None, schedule=due_delay, clock=time.time,
+                sleep=time.sleep):
+    """
+    Follow steps of a cluster, yielding their state changes as they happen, until all of them are done.
+    Each tick costs one list_steps call filtered by STEP_ACTIVE_STATES, independently of the number of steps.
+    Steps missing from the listing (i.e., done) are listed once more to get their final state.
+    Durations of running and done steps are taken from their timeline, `clock` is expected to return epoch times.
+    :param client: boto3 EMR client
+    :param cluster_id: EMR cluster id
+    :param step_ids: list of step ids, None to follow all steps not done yet
+    :param deadline: absolute time (as returned by `clock`) after which WaitTimeoutError is raised, None to wait forever
+    :param schedule: function (expected, elapsed) returning the seconds to sleep before the next poll
+    :param clock: function returning current time in seconds
+    :param sleep: function sleeping for the given seconds
+    :return: generator of (step summary, timestamp) tuples
+    """
+
+    pending = set(step_ids) if step_ids is not None else None
+    states, since = {}, {}
+    durations = []
+
+    while pending is None or pending:
+        current, _ = list_active_steps(client, cluster_id)
+        if pending is None:
+            pending = set(current)
+        current = {step_id: step for step_id, step in current.items() if step_id in pending}
+        missing = [step_id for step_id in pending if step_id not in current]
+        if missing:
+            current.update(list_step_states(client, cluster_id, missing)[0])
+        now = clock()
+
+        for step_id in sorted(current):
+            step = current[step_id]
+            state = step['Status']['State']
+            if state != states.get(step_id):
+                start, end = step_timeline(step)
+                if state in STEP_TERMINAL_STATES and start is not None:
+                    durations.append((end or now) - start)
+                states[step_id], since[step_id] = state, start if start is not None else now
+                yield step, now
+            if state in STEP_TERMINAL_STATES:
+                pending.discard(step_id)
+
+        if not pending:
+            return
+
+        expected = sum(durations) / len(durations) if durations else None
+        running = [step_id for step_id in pending if states.get(step_id) == 'RUNNING']
+        delay = min([schedule(expected, now - since[step_id]) for step_id in running] or [EMR_WAIT_FIXED_SECONDS])
+        if deadline is not None:
+            if now >= deadline:
+                raise WaitTimeoutError(cluster_id, None, [])
+            delay = min(delay, deadline - now)
+        sleep(delay)
@@ -1,8 +1,9 @@
 from datetime import datetime
 
 from awsflow.config import AWS_DEFAULT_REGION
+from awsflow.helpers import metrics
 from awsflow.helpers.log import logger
-from awsflow.helpers.slack import post as slack_post
+from awsflow.helpers.slack import post as slack_post, flush as slack_flush
 from awsflow.tools.emr import task_create
 from awsflow.version import __version__
 
@@ -33,6 +34,8 @@ def start_emr(event, context):
 
     logging.info(msg)
     slack_post(msg)
+    slack_flush(context=context)
+    metrics.flush()
 
     return {
         'request_time': str(request_time),
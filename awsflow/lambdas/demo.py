@@ -1,6 +1,8 @@
-from awsflow.tools.emr import logging
+from awsflow.helpers.log import logger
 from awsflow.version import __version__
 
+logging = logger.setup()
+
 
 def hello_world(event, context):
     """
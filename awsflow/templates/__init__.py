@@ -1,28 +1,55 @@
-# EMR bootstrap templates
+from awsflow.config import TEMPLATES_DIRS
 from awsflow.helpers.templates import Templates
-from awsflow.templates.bootstrap.add_awsflow import CONFIG_BOOTSTRAP_AWSFLOW
 
-# EMR cluster templates
-from awsflow.templates.emr.sushi import CONFIG_EMR_SUSHI
-from awsflow.templates.emr.cheap import CONFIG_EMR_CHEAP
+# Built-in templates, as 'module:attribute' references. Templates of other packages are declared as
+# entry points in the awsflow.templates.{emr,step,bootstrap} groups, team templates are found in TEMPLATES_DIRS.
+# All of them are indexed on first access to their registry, and built only when used.
+BUILTIN_TEMPLATES = {
+    'emr': [
+        'awsflow.templates.emr.sushi:CONFIG_EMR_SUSHI',
+        'awsflow.templates.emr.cheap:CONFIG_EMR_CHEAP',
+    ],
+    'step': [
+        'awsflow.templates.step.add_jupyter:CONFIG_STEP_JUPYTER',
+        'awsflow.templates.step.add_jupyter:CONFIG_STEP_JUPYTER_LOCAL',
+        'awsflow.templates.step.add_jupyter:CONFIG_STEP_JUPYTER_ENV',
+        'awsflow.templates.step.slack:CONFIG_STEP_SLACK',
+        'awsflow.templates.step.update_awsflow:CONFIG_STEP_UPDATE_AWSFLOW',
+    ],
+    'bootstrap': [
+        'awsflow.templates.bootstrap.add_awsflow:CONFIG_BOOTSTRAP_AWSFLOW',
+        'awsflow.templates.bootstrap.add_awsflow:CONFIG_BOOTSTRAP_AWSFLOW_WHEELHOUSE',
+        'awsflow.templates.bootstrap.add_jupyter:CONFIG_BOOTSTRAP_JUPYTER',
+        'awsflow.templates.bootstrap.add_jupyter:CONFIG_BOOTSTRAP_JUPYTER_ENV',
+    ],
+}
+
+# Templates directories, more can be added before the registries are first accessed
+templates_dirs = list(TEMPLATES_DIRS)
+
+
+def source(kind):
+    """
+    Source of templates of a kind, for Templates.add_source
+    :param kind: kind of templates, e.g. 'emr'
+    :return: function returning list of (name, loader, params) tuples
+    """
+
+    def discover():
+        from awsflow.helpers.discovery import index_templates
+        return index_templates(kind, BUILTIN_TEMPLATES[kind], templates_dirs)
+
+    return discover
 
-# EMR step templates
-from awsflow.templates.step.add_jupyter import CONFIG_STEP_JUPYTER, CONFIG_STEP_JUPYTER_LOCAL
-from awsflow.templates.step.slack import CONFIG_STEP_SLACK
-from awsflow.templates.step.update_awsflow import CONFIG_STEP_UPDATE_AWSFLOW
 
 # Register EMR cluster templates in global registry:
 clusterTemplates = Templates()
-clusterTemplates.register(CONFIG_EMR_SUSHI)
-clusterTemplates.register(CONFIG_EMR_CHEAP)
+clusterTemplates.add_source(source('emr'))
 
 # Register EMR step templates in global registry:
 stepTemplates = Templates()
-stepTemplates.register(CONFIG_STEP_JUPYTER)
-stepTemplates.register(CONFIG_STEP_JUPYTER_LOCAL)
-stepTemplates.register(CONFIG_STEP_SLACK())
-stepTemplates.register(CONFIG_STEP_UPDATE_AWSFLOW)
+stepTemplates.add_source(source('step'))
 
 # Register EMR bootstrap templates in global registry:
 bootstrapTemplates = Templates()
-bootstrapTemplates.register(CONFIG_BOOTSTRAP_AWSFLOW)
+bootstrapTemplates.add_source(source('bootstrap'))
@@ -1,4 +1,4 @@
-from awsflow.config import AWS_S3_PKG, PKG_WHEEL_FNAME
+from awsflow.config import AWS_S3_PKG, PKG_WHEEL_FNAME, AWS_S3_WHEELHOUSE, PKG_WHEELHOUSE_FNAME
 from awsflow.templates.bootstrap import config_bootstrap_bash
 from awsflow.version import __version__
 
@@ -7,3 +7,13 @@ COMMANDS = ["aws s3 cp {pkg} /tmp".format(pkg=AWS_S3_PKG.format(version=__versio
                 pkg_wheel_fname=PKG_WHEEL_FNAME.format(version=__version__))]
 
 CONFIG_BOOTSTRAP_AWSFLOW = config_bootstrap_bash('install-pkg-awsflow', COMMANDS)
+
+# Install from the wheelhouse built by `fab pkg_deploy_wheelhouse`: a single object downloaded with
+# concurrent ranged requests, and no dependency resolution nor download from PyPI
+COMMANDS_WHEELHOUSE = ["aws s3 cp {wheelhouse} /tmp".format(wheelhouse=AWS_S3_WHEELHOUSE.format(version=__version__)),
+                       "tar -xzf /tmp/{pkg_wheelhouse_fname} -C /tmp".format(
+                           pkg_wheelhouse_fname=PKG_WHEELHOUSE_FNAME.format(version=__version__)),
+                       "sudo pip-3.6 install --no-index --find-links /tmp/wheelhouse awsflow=={version}".format(
+                           version=__version__)]
+
+CONFIG_BOOTSTRAP_AWSFLOW_WHEELHOUSE = config_bootstrap_bash('install-pkg-awsflow-wheelhouse', COMMANDS_WHEELHOUSE)
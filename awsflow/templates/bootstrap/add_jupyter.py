@@ -0,0 +1,10 @@
+from awsflow.templates.bootstrap import config_bootstrap_bash
+
+# Install Jupyter with pip in background on the master node: the Jupyter step only configures and starts it.
+# Requires awsflow installed by a previous bootstrap action.
+CONFIG_BOOTSTRAP_JUPYTER = config_bootstrap_bash('install-jupyter-background', [
+    'nohup /usr/local/bin/awsflow.add.jupyter --install-only > /tmp/jupyter-install.log 2>&1 &'])
+
+# Same, unpacking the prebuilt environment archive built by `fab jupyter_env` and deployed to AWS_S3_JUPYTER_ENV
+CONFIG_BOOTSTRAP_JUPYTER_ENV = config_bootstrap_bash('install-jupyter-env-background', [
+    'nohup /usr/local/bin/awsflow.add.jupyter --install-only --env-s3 > /tmp/jupyter-install.log 2>&1 &'])
@@ -6,3 +6,7 @@ CONFIG_STEP_JUPYTER = config_step_task(name='install-jupyter-s3', task_name='aws
 
 # add Jupyter without S3 notebook persistence
 CONFIG_STEP_JUPYTER_LOCAL = config_step_task(name='install-jupyter-local', task_name='awsflow.add.jupyter')
+
+# add Jupyter from prebuilt environment archive deployed to AWS_S3_JUPYTER_ENV, without S3 notebook persistence
+CONFIG_STEP_JUPYTER_ENV = config_step_task(name='install-jupyter-env', task_name='awsflow.add.jupyter',
+                                           task_params=['--env-s3'])
@@ -0,0 +1,116 @@
+import hashlib
+import io
+
+import pytest
+
+from awsflow.helpers import clients
+
+
+class FakeClock:
+    """
+    Simulated time, advanced only by sleep()
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class StubPaginated:
+    """
+    Client stub serving paginators from a dict {operation: (result key, list of items)}, two items per page.
+    Items with a key are filtered by prefix, as S3 objects.
+    """
+
+    def __init__(self, listings):
+        self.listings = listings
+
+    def get_paginator(self, operation):
+        key, items = self.listings[operation]
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                listed = [item for item in items if item.get('Key', '').startswith(kwargs.get('Prefix', ''))]
+                for i in range(0, max(1, len(listed)), 2):
+                    yield {key: listed[i:i + 2]}
+
+        return Paginator()
+
+
+class StubS3Logs(StubPaginated):
+    """
+    S3 client stub of log objects {key: content}, which tests can add or replace, as EMR does uploading logs
+    periodically: listings reflect the current objects, with their ETags
+    """
+
+    def __init__(self, objects):
+        super().__init__({})
+        self.objects = objects
+
+    def get_paginator(self, operation):
+        self.listings['list_objects_v2'] = ('Contents', [
+            {'Key': key, 'ETag': hashlib.md5(self.objects[key]).hexdigest()} for key in sorted(self.objects)])
+        return super().get_paginator(operation)
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+@pytest.fixture(autouse=True)
+def home(tmpdir, monkeypatch):
+    """
+    Temporary home directory for each test: caches under CACHE_DIR (e.g., the index of templates) are written there,
+    not in the home directory of the user running the tests
+    """
+    home = tmpdir.join('home')
+    home.ensure(dir=True)
+    monkeypatch.setenv('HOME', str(home))
+    return home
+
+
+@pytest.fixture(autouse=True)
+def client_registry():
+    """
+    Empty registry of AWS clients for each test: stub clients set by a test never leak into the following ones,
+    even when the test fails
+    """
+    clients.clear_clients()
+    try:
+        yield clients
+    finally:
+        clients.clear_clients()
+
+
+@pytest.fixture
+def clock():
+    """
+    Simulated time starting at 0, see FakeClock: pass clock.time and clock.sleep to waiters
+    """
+    return FakeClock()
+
+
+@pytest.fixture
+def paginated():
+    """
+    Stub clients serving paginators, see StubPaginated
+    """
+    return StubPaginated
+
+
+@pytest.fixture
+def s3_logs(client_registry):
+    """
+    Stub S3 clients of log objects, registered as S3 client of a region, see StubS3Logs
+    """
+
+    def make(objects, region_name='eu-west-1'):
+        s3 = StubS3Logs(objects)
+        client_registry.set_client('s3', s3, region_name=region_name)
+        return s3
+
+    return make
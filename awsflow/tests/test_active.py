@@ -0,0 +1,38 @@
+import time
+
+from awsflow.tools import emr
+
+
+class StubEMRRegion:
+    """
+    EMR client stub listing two pages of active clusters, each page taking `latency` seconds
+    """
+
+    def __init__(self, region_name, latency):
+        self.region_name = region_name
+        self.latency = latency
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, ClusterStates):
+        for page in range(2):
+            time.sleep(self.latency)
+            yield {'Clusters': [{'Id': 'j-{}-{}'.format(self.region_name, page), 'Name': 'cheap',
+                                 'Status': {'State': ClusterStates[0]}}]}
+
+
+def test_list_active_regions(client_registry):
+    latencies = {'eu-central-1': 0.2, 'eu-west-1': 0.1, 'us-east-1': 0.1, 'us-west-2': 0.05}
+    for region_name, latency in latencies.items():
+        client_registry.set_client('emr', StubEMRRegion(region_name, latency), region_name=region_name)
+
+    start = time.perf_counter()
+    rows = emr.task_list_active(','.join(latencies))
+    duration = time.perf_counter() - start
+
+    assert len(rows) == 2 * len(latencies)
+    assert [name for name, cluster in rows] == sorted(name for name in latencies for page in range(2))
+
+    # regions are queried concurrently: latency of the slowest region, not the sum
+    assert duration < sum(2 * latency for latency in latencies.values())
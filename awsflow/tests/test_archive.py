@@ -0,0 +1,86 @@
+import importlib
+import os
+import shlex
+
+import fabric.api
+
+from awsflow.helpers.archive import list_tree, hash_entries, write_archive
+
+lambda_tool = importlib.import_module('awsflow.tools.lambda')
+
+
+def make_tree(root, files):
+    for name, data in files.items():
+        pathname = os.path.join(root, name)
+        os.makedirs(os.path.dirname(pathname), exist_ok=True)
+        with open(pathname, 'w') as f:
+            f.write(data)
+
+
+def read(pathname):
+    with open(pathname, 'rb') as f:
+        return f.read()
+
+
+def test_archive_reproducible(tmpdir):
+    files = {'pkg/b.py': 'b = 1\n', 'pkg/a.py': 'a = 1\n', 'pkg/__pycache__/a.cpython-36.pyc': 'x', 'mod.py': 'm'}
+    make_tree(str(tmpdir.join('src1')), files)
+    make_tree(str(tmpdir.join('src2')), files)
+    for name in files:
+        os.utime(str(tmpdir.join('src2', name)), (1e9, 1e9))
+
+    base = str(tmpdir.join('base.zip'))
+    write_archive(base, [(str(tmpdir.join('src1', 'mod.py')), 'mod.py')])
+
+    archives = []
+    for src in ['src1', 'src2']:
+        entries = list_tree(str(tmpdir.join(src, 'pkg')), prefix='pkg')
+        assert [arcname for pathname, arcname in entries] == ['pkg/a.py', 'pkg/b.py']
+        pathname = str(tmpdir.join(src + '.zip'))
+        write_archive(pathname, entries, base=base)
+        archives.append(read(pathname))
+
+    # different mtimes, same bytes
+    assert archives[0] == archives[1]
+    assert hash_entries(list_tree(str(tmpdir.join('src1')))) == hash_entries(list_tree(str(tmpdir.join('src2'))))
+
+
+def test_archive_cached(tmpdir, monkeypatch):
+    basedir = str(tmpdir.join('awsflow-src'))
+    make_tree(basedir, {'requirements.txt': 'requests\n', 'setup.py': 'setup()\n', 'awsflow/__init__.py': ''})
+    monkeypatch.setattr(lambda_tool, 'AWSFLOW_BASEDIR', basedir)
+    monkeypatch.setattr(lambda_tool, 'CACHE_DIR', str(tmpdir.join('cache')))
+
+    commands = []
+
+    def local(cmd):
+        # pip installs a single dependency in the --target directory
+        commands.append(cmd)
+        args = shlex.split(cmd)
+        if 'install' in args:
+            make_tree(args[args.index('--target') + 1], {'requests/__init__.py': ''})
+
+    monkeypatch.setattr(fabric.api, 'local', local)
+
+    first = lambda_tool.build_archive('demo')
+    pips = len([cmd for cmd in commands if 'install' in cmd])
+    assert pips == 1
+
+    # same requirements, setup.py and runtime: cached dependencies and archive reused, pip not run
+    assert lambda_tool.build_archive('demo') == first
+    assert len([cmd for cmd in commands if 'install' in cmd]) == pips
+
+    # archives of other modules sharing the prefix are not pruned
+    cache_dir = lambda_tool.get_cache_dir()
+    other = os.path.join(cache_dir, 'demo-extra-0123456789abcdef.zip')
+    write_archive(other, [])
+
+    # changed requirements: dependencies installed again, superseded archives pruned
+    make_tree(basedir, {'requirements.txt': 'requests\nslackclient\n'})
+    second = lambda_tool.build_archive('demo')
+    assert second != first
+    assert len([cmd for cmd in commands if 'install' in cmd]) == pips + 1
+    names = os.listdir(cache_dir)
+    assert os.path.basename(second) in names and os.path.basename(first) not in names
+    assert os.path.basename(other) in names
+    assert len([name for name in names if name.startswith('deps-')]) == 1
@@ -0,0 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from awsflow.helpers import clients
+
+
+def test_get_client_cached():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        created = list(pool.map(lambda i: clients.get_client('emr', region_name='eu-central-1'), range(32)))
+
+    assert all(client is created[0] for client in created)
+    assert clients.get_client('emr', region_name='eu-west-1') is not created[0]
+    assert created[0].meta.config.max_pool_connections == clients.get_client_config().max_pool_connections
+
+    stub = object()
+    clients.set_client('emr', stub, region_name='eu-central-1')
+    assert clients.get_client('emr', region_name='eu-central-1') is stub
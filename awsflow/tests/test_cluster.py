@@ -0,0 +1,52 @@
+from awsflow.helpers import cluster
+
+
+class StubEMRDescribe:
+    def __init__(self):
+        self.calls = 0
+
+    def describe_cluster(self, ClusterId):
+        self.calls += 1
+        return {'Cluster': {'Id': ClusterId, 'Name': 'cheap', 'Status': {'State': 'WAITING'},
+                            'MasterPublicDnsName': 'ec2-1-2-3-4.compute.amazonaws.com'}}
+
+
+def test_cluster_cache(tmpdir, monkeypatch, client_registry):
+    monkeypatch.setattr(cluster, 'CACHE_DIR', str(tmpdir))
+    stub = StubEMRDescribe()
+    client_registry.set_client('emr', stub, region_name='eu-central-1')
+
+    for i in range(3):
+        assert cluster.get_public_master_dns_name('eu-central-1', 'j-TEST') == 'ec2-1-2-3-4.compute.amazonaws.com'
+    assert stub.calls == 1
+
+    # new process: memory cache empty, disk copy still valid
+    cluster._cache.clear()
+    assert cluster.get_cluster('eu-central-1', 'j-TEST')['Name'] == 'cheap'
+    assert stub.calls == 1
+
+    cluster.invalidate('eu-central-1', 'j-TEST')
+    cluster.get_cluster('eu-central-1', 'j-TEST')
+    assert stub.calls == 2
+
+    cluster.invalidate('eu-central-1', 'j-TEST')
+
+
+class StubEMRFleets(StubEMRDescribe):
+    def get_paginator(self, name):
+        assert name == 'list_instance_fleets'
+        return self
+
+    def paginate(self, ClusterId):
+        self.calls += 1
+        yield {'InstanceFleets': [{'Id': 'if-1', 'ProvisionedOnDemandCapacity': self.calls}]}
+
+
+def test_instance_fleets_not_cached(tmpdir, monkeypatch, client_registry):
+    monkeypatch.setattr(cluster, 'CACHE_DIR', str(tmpdir))
+    stub = StubEMRFleets()
+    client_registry.set_client('emr', stub, region_name='eu-central-1')
+
+    # fleets change with resizes: listed each time
+    assert cluster.get_instance_fleets('eu-central-1', 'j-TEST')[0]['ProvisionedOnDemandCapacity'] == 1
+    assert cluster.get_instance_fleets('eu-central-1', 'j-TEST')[0]['ProvisionedOnDemandCapacity'] == 2
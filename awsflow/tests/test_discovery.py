@@ -0,0 +1,73 @@
+import os
+
+from awsflow.helpers import discovery
+from awsflow.helpers.templates import Templates
+
+TEAM_TEMPLATES = """
+CONFIG_STEP_{n}_A = {{'Name': 'team-{n}-a', 'Args': ['{{s3bucket}}', '{{date.year}}']}}
+CONFIG_STEP_{n}_B = {{'Name': 'team-{n}-b', 'Args': ['run']}}
+"""
+
+
+def test_templates_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(discovery, 'CACHE_DIR', str(tmpdir.join('cache')))
+    os.makedirs(str(tmpdir.join('templates', 'step')))
+    for n in range(100):
+        tmpdir.join('templates', 'step', 'team{}.py'.format(n)).write(TEAM_TEMPLATES.format(n=n))
+    templates_dir = str(tmpdir.join('templates'))
+
+    index = discovery.index_templates('step', templates_dirs=[templates_dir])
+    assert len(index) == 200
+    assert len(discovery._file_modules) == 100
+
+    # new process: templates are listed from the cached index, without importing any module
+    discovery._file_modules.clear()
+    registry = Templates()
+    registry.add_source(lambda: discovery.index_templates('step', templates_dirs=[templates_dir]))
+    assert 'team-7-a' in registry.get_names()
+    assert registry.get_params('team-7-a') == ['date', 's3bucket']
+    assert registry.validate('team-7-a', {'s3bucket': 'b'}) == ['date']
+    assert len(discovery._file_modules) == 0
+
+    # only the module of the template used is imported
+    assert registry.get('team-7-b') == {'Name': 'team-7-b', 'Args': ['run']}
+    assert list(discovery._file_modules) == [str(tmpdir.join('templates', 'step', 'team7.py'))]
+
+    # modified modules are indexed again
+    tmpdir.join('templates', 'step', 'team3.py').write("CONFIG_STEP_C = {'Name': 'team-3-c', 'Args': []}\n")
+    names = [name for name, loader, params in discovery.index_templates('step', templates_dirs=[templates_dir])]
+    assert 'team-3-c' in names and 'team-3-a' not in names
+    discovery._file_modules.clear()
+
+
+def test_index_sources(tmpdir, monkeypatch):
+    monkeypatch.setattr(discovery, 'CACHE_DIR', str(tmpdir.join('cache')))
+    for team in ['a', 'b']:
+        os.makedirs(str(tmpdir.join(team, 'step')))
+        tmpdir.join(team, 'step', 'team.py').write(TEAM_TEMPLATES.format(n=team))
+    indexed = []
+    index_unit = discovery.index_unit
+    monkeypatch.setattr(discovery, 'index_unit', lambda unit, attrs=None: indexed.append(unit) or index_unit(unit, attrs))
+
+    discovery.index_templates('step', templates_dirs=[str(tmpdir.join('a'))])
+    discovery.index_templates('step', templates_dirs=[str(tmpdir.join('a'))])
+    assert len(indexed) == 1
+
+    # different templates directories or entry points: the cached index is dropped
+    discovery.index_templates('step', templates_dirs=[str(tmpdir.join('a')), str(tmpdir.join('b'))])
+    assert len(indexed) == 3
+    monkeypatch.setattr(discovery, 'entry_point_refs', lambda kind: ['awsflow.templates.step.slack:CONFIG_STEP_SLACK'])
+    discovery.index_templates('step', templates_dirs=[str(tmpdir.join('a')), str(tmpdir.join('b'))])
+    assert len(indexed) == 6
+    discovery._file_modules.clear()
+
+
+def test_builtin_templates(tmpdir, monkeypatch):
+    monkeypatch.setattr(discovery, 'CACHE_DIR', str(tmpdir))
+    refs = ['awsflow.templates.step.update_awsflow:CONFIG_STEP_UPDATE_AWSFLOW',
+            'awsflow.templates.step.slack:CONFIG_STEP_SLACK']
+
+    index = discovery.index_templates('step', refs)
+    assert [(name, params) for name, loader, params in index] == [('update-awsflow', ['version']),
+                                                                  ('slack-message', [])]
+    assert index[1][1]()['Name'] == 'slack-message'
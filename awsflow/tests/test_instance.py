@@ -0,0 +1,40 @@
+import json
+
+from awsflow.helpers import cluster, instance
+
+
+class StubEMRDescribe:
+    def __init__(self):
+        self.calls = 0
+
+    def describe_cluster(self, ClusterId):
+        self.calls += 1
+        return {'Cluster': {'Id': ClusterId, 'MasterPublicDnsName': 'ec2-master'}}
+
+
+def test_instance_context(tmpdir, monkeypatch, client_registry):
+    tmpdir.join('instance.json').write(json.dumps({'isMaster': True, 'instanceGroupId': 'ig-MASTER',
+                                                   'instanceRole': 'Master'}))
+    tmpdir.join('extraInstanceData.json').write(json.dumps({'jobFlowId': 'j-TEST', 'region': 'eu-west-1',
+                                                            'masterPrivateDnsName': 'ip-master'}))
+    monkeypatch.setattr(instance, 'METADATA_ROOT', str(tmpdir))
+    monkeypatch.setattr(cluster, 'CACHE_DIR', str(tmpdir))
+    stub = StubEMRDescribe()
+    client_registry.set_client('emr', stub, region_name='eu-west-1')
+    instance.clear_context()
+
+    context = instance.get_context()
+    assert context.is_master and context.instance_group_id == 'ig-MASTER'
+    assert context.master_private_dns_name == 'ip-master'
+
+    # metadata files are read once per process
+    tmpdir.join('instance.json').remove()
+    tmpdir.join('extraInstanceData.json').remove()
+    assert instance.is_master()
+    assert (instance.get_region_name(), instance.get_cluster_id()) == ('eu-west-1', 'j-TEST')
+    for i in range(3):
+        assert instance.get_public_master_dns_name() == 'ec2-master'
+    assert stub.calls == 1
+
+    cluster.invalidate('eu-west-1', 'j-TEST')
+    instance.clear_context()
@@ -0,0 +1,192 @@
+import importlib
+import json
+import os
+import time
+import zipfile
+
+from botocore.stub import Stubber
+
+from awsflow.helpers.archive import code_sha256
+
+lambda_tool = importlib.import_module('awsflow.tools.lambda')
+
+
+class StubLambda:
+    """
+    Lambda client stub, each upload takes `latency` seconds
+    """
+
+    class exceptions:
+        class ResourceNotFoundException(Exception):
+            pass
+
+    class meta:
+        region_name = 'eu-central-1'
+
+    waiter_names = []
+
+    def __init__(self, functions, latency):
+        self.functions = functions
+        self.latency = latency
+
+    def get_function_configuration(self, FunctionName):
+        if FunctionName not in self.functions:
+            raise self.exceptions.ResourceNotFoundException(FunctionName)
+        return {'CodeSha256': self.functions[FunctionName]}
+
+    def create_function(self, FunctionName, Code, **kwargs):
+        time.sleep(self.latency)
+        return {'FunctionArn': 'arn:' + FunctionName}
+
+    def update_function_code(self, FunctionName, ZipFile):
+        time.sleep(self.latency)
+        return {'FunctionArn': 'arn:' + FunctionName}
+
+
+def test_deploy_all(tmpdir, monkeypatch, client_registry):
+    archive_pathname = str(tmpdir.join('mod.zip'))
+    with zipfile.ZipFile(archive_pathname, 'w') as zf:
+        zf.writestr('mod.py', 'def handler(event, context): pass\n')
+    monkeypatch.setattr(lambda_tool, 'build_archive', lambda mod, cache, layer: archive_pathname)
+
+    manifest = str(tmpdir.join('manifest.json'))
+    funcs = ['f{}'.format(i) for i in range(6)]
+    with open(manifest, 'w') as f:
+        json.dump([{'mod': 'mod', 'func': func} for func in funcs], f)
+
+    stub = StubLambda({'f0': code_sha256(archive_pathname), 'f1': 'outdated'}, latency=0.2)
+    client_registry.set_client('lambda', stub, region_name='eu-central-1')
+
+    start = time.perf_counter()
+    summary = lambda_tool.task_deploy_all(None, 'eu-central-1', manifest=manifest)
+    duration = time.perf_counter() - start
+
+    statuses = {func: status for func, status, seconds in summary}
+    assert statuses == {'f0': 'unchanged', 'f1': 'updated', 'f2': 'created', 'f3': 'created', 'f4': 'created',
+                        'f5': 'created'}
+
+    # uploads are concurrent: close to the slowest upload, not to the sum
+    assert duration < 5 * 0.2
+
+
+def test_stage_archive(tmpdir, monkeypatch, client_registry):
+    archive_pathname = str(tmpdir.join('mod-0123.zip'))
+    with open(archive_pathname, 'wb') as f:
+        f.write(b'0' * (12 * 1024 * 1024))
+    monkeypatch.setattr(lambda_tool, 'AWS_S3_UPLOAD_PART_SIZE', 5 * 1024 * 1024)
+    monkeypatch.setattr(lambda_tool, 'AWS_S3_UPLOAD_CONCURRENCY', 1)
+    monkeypatch.setattr(lambda_tool, 'AWS_S3_ENDPOINT_URL', 'http://localhost:9000')
+
+    # client of the local S3 stand-in, as used by stage_archive: registry clients are keyed by endpoint
+    s3 = client_registry.get_client('s3', region_name='eu-central-1', endpoint_url='http://localhost:9000')
+    key = 'awsflow/lambda/mod-0123.zip'
+    expected = {'S3Bucket': lambda_tool.AWS_S3_BUCKET, 'S3Key': key}
+
+    with Stubber(s3) as stubber:
+        # not staged yet: multipart upload of 3 parts
+        stubber.add_client_error('head_object', 'NotFound', http_status_code=404,
+                                 expected_params={'Bucket': lambda_tool.AWS_S3_BUCKET, 'Key': key})
+        stubber.add_response('create_multipart_upload', {'UploadId': 'u-1'})
+        for part in range(3):
+            stubber.add_response('upload_part', {'ETag': '"{}"'.format(part)})
+        stubber.add_response('complete_multipart_upload', {})
+        assert lambda_tool.stage_archive(archive_pathname, 'eu-central-1') == expected
+
+        # already staged with the same size: upload skipped
+        stubber.add_response('head_object', {'ContentLength': os.path.getsize(archive_pathname)},
+                             expected_params={'Bucket': lambda_tool.AWS_S3_BUCKET, 'Key': key})
+        assert lambda_tool.stage_archive(archive_pathname, 'eu-central-1') == expected
+
+        stubber.assert_no_pending_responses()
+
+
+def test_build_layer(tmpdir, monkeypatch):
+    monkeypatch.setattr(lambda_tool, 'CACHE_DIR', str(tmpdir))
+    deps_pathname = str(tmpdir.join('deps-0123456789abcdef.zip'))
+    with zipfile.ZipFile(deps_pathname, 'w') as zf:
+        zf.writestr('requests/__init__.py', '')
+        zf.writestr('slackclient/__init__.py', '')
+    monkeypatch.setattr(lambda_tool, 'build_dependencies', lambda basedir, cache_dir, cache: deps_pathname)
+
+    layer_pathname = lambda_tool.build_layer()
+    assert os.path.basename(layer_pathname) == 'layer-0123456789abcdef.zip'
+    with zipfile.ZipFile(layer_pathname) as zf:
+        assert sorted(zf.namelist()) == ['python/requests/__init__.py', 'python/slackclient/__init__.py']
+
+    # same dependencies hash: the layer archive is reused
+    monkeypatch.setattr(lambda_tool, 'prefix_archive', None)
+    assert lambda_tool.build_layer() == layer_pathname
+
+
+class StubLambdaLayers(StubLambda):
+    """
+    Lambda client stub listing layer versions in pages of two, newest first
+    """
+
+    def __init__(self, descriptions, layers=()):
+        super().__init__({'f': 'sha'}, latency=0)
+        self.versions = [{'LayerVersionArn': 'arn:aws:lambda:eu-central-1:1:layer:awsflow-deps:{}'.format(i + 1),
+                          'Description': description} for i, description in enumerate(descriptions)][::-1]
+        self.layers = list(layers)
+        self.list_calls = 0
+        self.published = []
+        self.updates = []
+
+    def list_layer_versions(self, LayerName, CompatibleRuntime, Marker=0):
+        self.list_calls += 1
+        res = {'LayerVersions': self.versions[Marker:Marker + 2]}
+        if Marker + 2 < len(self.versions):
+            res['NextMarker'] = Marker + 2
+        return res
+
+    def publish_layer_version(self, LayerName, Description, Content, CompatibleRuntimes):
+        self.published.append((Description, Content))
+        return {'LayerVersionArn': 'arn:aws:lambda:eu-central-1:1:layer:awsflow-deps:99'}
+
+    def get_function_configuration(self, FunctionName):
+        return {'CodeSha256': 'sha', 'Layers': [{'Arn': arn} for arn in self.layers]}
+
+    def update_function_configuration(self, FunctionName, Layers):
+        self.updates.append('configuration')
+        self.layers = Layers
+
+    def update_function_code(self, FunctionName, ZipFile):
+        self.updates.append('code')
+        return super().update_function_code(FunctionName, ZipFile)
+
+
+def test_publish_layer(tmpdir):
+    layer_pathname = str(tmpdir.join('layer-0123456789abcdef.zip'))
+    with zipfile.ZipFile(layer_pathname, 'w') as zf:
+        zf.writestr('python/requests/__init__.py', '')
+
+    # a version with the same dependencies hash exists, on the last page of the listing
+    stub = StubLambdaLayers(['awsflow dependencies 0123456789abcdef'] + ['awsflow dependencies old'] * 4)
+    assert lambda_tool.publish_layer(stub, layer_pathname) == 'arn:aws:lambda:eu-central-1:1:layer:awsflow-deps:1'
+    assert stub.list_calls == 3 and stub.published == []
+
+    stub = StubLambdaLayers(['awsflow dependencies old'] * 3)
+    assert lambda_tool.publish_layer(stub, layer_pathname) == 'arn:aws:lambda:eu-central-1:1:layer:awsflow-deps:99'
+    assert [description for description, content in stub.published] == ['awsflow dependencies 0123456789abcdef']
+    assert 'ZipFile' in stub.published[0][1]
+
+
+def test_update_layers(tmpdir):
+    archive_pathname = str(tmpdir.join('mod.zip'))
+    with zipfile.ZipFile(archive_pathname, 'w') as zf:
+        zf.writestr('mod.py', '')
+    other = 'arn:aws:lambda:eu-central-1:2:layer:numpy:3'
+    old, new = ['arn:aws:lambda:eu-central-1:1:layer:awsflow-deps:{}'.format(i) for i in [1, 2]]
+
+    # other layers attached by users are kept
+    stub = StubLambdaLayers([], layers=[other, old])
+    lambda_tool.update_code(stub, 'f', archive_pathname, layer_arn=new)
+    assert stub.layers == [other, new]
+    # the new layer is attached before the slim code is uploaded
+    assert stub.updates == ['configuration', 'code']
+
+    # without layer mode, the awsflow layer is detached: dependencies are in the archive, uploaded first
+    stub.updates = []
+    lambda_tool.update_code(stub, 'f', archive_pathname)
+    assert stub.layers == [other]
+    assert stub.updates == ['code', 'configuration']
@@ -0,0 +1,86 @@
+import gzip
+import io
+import itertools
+
+from awsflow.helpers.emrlogs import read_logs
+from awsflow.tools import emr
+
+
+class StubEMRStep:
+    """
+    EMR client stub of a cluster with a step, whose state is set by tests
+    """
+
+    def __init__(self):
+        self.state = 'RUNNING'
+
+    def describe_cluster(self, ClusterId):
+        return {'Cluster': {'Id': ClusterId, 'LogUri': 's3://logs/emr', 'Status': {'State': 'RUNNING'}}}
+
+    def describe_step(self, ClusterId, StepId):
+        return {'Step': {'Id': StepId, 'Status': {'State': self.state}}}
+
+
+def gz(*lines):
+    return gzip.compress(''.join(line + '\n' for line in lines).encode('utf-8'))
+
+
+def test_read_logs(s3_logs):
+    s3 = s3_logs({'a.gz': gz('INFO start', 'ERROR failed'), 'b': b'ERROR plain\nINFO end\n', 'c.gz': gz()})
+
+    assert [(key, list(lines)) for key, lines in read_logs(s3, 'logs', ['a.gz', 'b', 'c.gz'], pattern='ERROR',
+                                                           workers=2)] == [
+        ('a.gz', ['ERROR failed\n']), ('b', ['ERROR plain\n']), ('c.gz', [])]
+
+
+def test_read_logs_bounded(s3_logs):
+    s3 = s3_logs({'{:02d}.gz'.format(i): gz(*['line {} {}'.format(i, j) for j in range(100)]) for i in range(20)})
+    keys = sorted(s3.objects)
+
+    # readers ahead of the consumed object wait for it, each with a buffer of a single line
+    read = [(key, list(lines)) for key, lines in read_logs(s3, 'logs', keys, workers=4, buffer_lines=1)]
+    assert read == [(key, ['line {} {}\n'.format(i, j) for j in range(100)]) for i, key in enumerate(keys)]
+
+    # lines not consumed are dropped, and readers stop when the consumer does
+    logs = read_logs(s3, 'logs', keys, workers=4, buffer_lines=1)
+    assert [next(lines) for key, lines in itertools.islice(logs, 3)] == ['line 0 0\n', 'line 1 0\n', 'line 2 0\n']
+    logs.close()
+
+    # errors of readers are raised reading the lines of their object
+    try:
+        for key, lines in read_logs(s3, 'logs', keys + ['missing.gz']):
+            list(lines)
+        assert False
+    except KeyError:
+        pass
+
+
+def test_logs_follow(client_registry, s3_logs):
+    s3 = s3_logs({
+        'emr/j-1/steps/s-1/controller.gz': gz('starting step'),
+        'emr/j-1/steps/s-1/stderr.gz': gz('Traceback (most recent call last):'),
+        'emr/j-1/steps/s-2/stderr.gz': gz('other step'),
+        'emr/j-1/node/i-1/daemons/stderr.gz': gz('other node'),
+    })
+    client = StubEMRStep()
+    client_registry.set_client('emr', client, region_name='eu-west-1')
+
+    def sleep(seconds):
+        # step fails while waiting: its logs are replaced with longer versions
+        s3.objects['emr/j-1/steps/s-1/stderr.gz'] = gz('Traceback (most recent call last):', 'ValueError: boom')
+        s3.objects['emr/j-1/steps/s-1/stdout.gz'] = gz('partial output')
+        client.state = 'FAILED'
+
+    out = io.StringIO()
+    read = emr.task_logs('eu-west-1', 'j-1', step_id='s-1', stderr=True, follow=True, out=out, sleep=sleep)
+
+    assert read == 1
+    assert out.getvalue().splitlines() == ['steps/s-1/stderr.gz | Traceback (most recent call last):',
+                                           'steps/s-1/stderr.gz | ValueError: boom']
+
+    out = io.StringIO()
+    emr.task_logs('eu-west-1', 'j-1', pattern='other|partial', out=out)
+
+    assert out.getvalue().splitlines() == ['node/i-1/daemons/stderr.gz | other node',
+                                           'steps/s-1/stdout.gz | partial output',
+                                           'steps/s-2/stderr.gz | other step']
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import tempfile
+
+from botocore.stub import Stubber
+
+from awsflow.helpers import metrics
+from awsflow.helpers.log import log_duration
+
+
+def test_spans_nested():
+    m = metrics.Metrics()
+
+    with m.span('create', template='sushi'):
+        with m.span('render'):
+            pass
+        with m.span('wait') as attrs:
+            m.record_span('STARTING', 100.0, 160.0, cluster_id='j-1')
+            attrs['state'] = 'WAITING'
+
+    assert [span['path'] for span in m.spans] == ['create/render', 'create/wait/STARTING', 'create/wait', 'create']
+    assert m.spans[1]['duration'] == 60.0
+    assert m.spans[2]['attrs'] == {'state': 'WAITING'}
+    assert m.spans[3]['attrs'] == {'template': 'sushi'}
+
+
+def test_log_duration_span():
+    metrics.metrics.clear()
+
+    @log_duration
+    def task():
+        with metrics.span('inner'):
+            pass
+
+    task()
+    assert [span['path'] for span in metrics.metrics.spans] == ['task/inner', 'task']
+    metrics.metrics.clear()
+
+
+def test_api_calls_counted(client_registry):
+    metrics.metrics.clear()
+
+    client = client_registry.get_client('emr', region_name='eu-central-1')
+    with Stubber(client) as stubber:
+        for _ in range(3):
+            stubber.add_response('describe_cluster', {'Cluster': {'Id': 'j-1', 'Status': {'State': 'WAITING'}}},
+                                 {'ClusterId': 'j-1'})
+        for _ in range(3):
+            client.describe_cluster(ClusterId='j-1')
+
+    assert metrics.metrics.counters == {
+        ('aws_api_calls_total', (('operation', 'DescribeCluster'), ('service', 'emr'))): 3}
+
+    metrics.metrics.clear()
+
+
+def test_exporters():
+    m = metrics.Metrics()
+    for cluster_id in ['j-1', 'j-2']:
+        m.record_span('STARTING', 100.0, 160.0, cluster_id=cluster_id)
+    with m.span('create'):
+        pass
+    m.inc('aws_api_calls_total', 2, service='emr', operation='DescribeCluster')
+    m.observe('emr_poll_seconds', 0.2, operation='DescribeCluster')
+    m.observe('emr_poll_seconds', 20, operation='DescribeCluster')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pathname = os.path.join(tmpdir, 'awsflow.prom')
+        metrics.export_prometheus(m, pathname)
+        with open(pathname) as f:
+            lines = f.read().splitlines()
+
+        assert 'awsflow_aws_api_calls_total{operation="DescribeCluster",service="emr"} 2' in lines
+        assert 'awsflow_emr_poll_seconds_bucket{operation="DescribeCluster",le="0.25"} 1' in lines
+        assert 'awsflow_emr_poll_seconds_bucket{operation="DescribeCluster",le="+Inf"} 2' in lines
+        assert 'awsflow_emr_poll_seconds_count{operation="DescribeCluster"} 2' in lines
+        # spans with the same path aggregated in a single series
+        assert 'awsflow_span_seconds_count{path="STARTING"} 2' in lines
+        assert 'awsflow_span_seconds_sum{path="STARTING"} 120.0' in lines
+        assert 'awsflow_span_seconds_count{path="create"} 1' in lines
+        series = [line.split(' ')[0] for line in lines if not line.startswith('#')]
+        assert len(series) == len(set(series))
+
+        pathname = os.path.join(tmpdir, 'metrics.jsonl')
+        metrics.export_jsonl(m, pathname)
+        metrics.export_jsonl(m, pathname)
+        with open(pathname) as f:
+            records = [json.loads(line) for line in f]
+
+        assert [record['type'] for record in records] == ['span'] * 3 + ['counter'] + ['histogram'] * 3 + \
+            ['span'] * 3 + ['counter'] + ['histogram'] * 3
+        assert records[4]['buckets']['30'] == 1
+
+    out = io.StringIO()
+    metrics.export_emf(m, 'awsflow', out)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+
+    assert records[2]['Span'] == 'create'
+    assert records[0]['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'awsflow'
+    assert records[3]['aws_api_calls_total'] == 2
+    assert records[3]['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['operation', 'service']]
+
+
+def test_spans_capped():
+    m = metrics.Metrics(max_spans=10)
+    for i in range(100):
+        m.record_span('poll', i, i + 1.0)
+
+    assert len(m.spans) == 10 and m.spans[0]['start'] == 90
+    assert m.histograms[('span_seconds', (('path', 'poll'),))]['count'] == 100
@@ -0,0 +1,90 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from awsflow.helpers.slack import Notifier
+
+
+class SlackHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Slack Web API: the first request is rate limited, the following ones are recorded
+    """
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        if not self.server.limited:
+            self.server.limited = True
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.server.posted.append(body)
+        data = json.dumps({'ok': True}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SlackErrorHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for the Slack Web API rejecting all requests with status `server.status` and a non-JSON body
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests += 1
+        data = b'invalid_auth'
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_notifier():
+    server = HTTPServer(('127.0.0.1', 0), SlackHandler)
+    server.limited = False
+    server.posted = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    notifier = Notifier(api_url='http://127.0.0.1:{}/'.format(server.server_port), queue_size=8, coalesce_seconds=0.2)
+    for i in range(5):
+        assert notifier.post('message {}'.format(i), 'token', '#awsflow')
+    notifier.post('other channel', 'token', '#other')
+
+    assert notifier.flush(timeout=5)
+    server.shutdown()
+
+    # messages to the same channel coalesced, rate limited request retried
+    assert [body['channel'] for body in server.posted] == ['#awsflow', '#other']
+    assert server.posted[0]['text'] == '\n'.join('message {}'.format(i) for i in range(5))
+    assert server.posted[0]['username'] == 'awsflow' and 'as_user' not in server.posted[0]
+    assert notifier.requests == 3
+
+
+def test_notifier_queue_full():
+    notifier = Notifier(api_url='http://127.0.0.1:1/', queue_size=2, coalesce_seconds=1, max_retries=0)
+    results = [notifier.post('message {}'.format(i), 'token', '#awsflow') for i in range(3)]
+    assert results == [True, True, False]
+
+
+def test_notifier_rejected():
+    server = HTTPServer(('127.0.0.1', 0), SlackErrorHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    notifier = Notifier(api_url='http://127.0.0.1:{}/'.format(server.server_port))
+
+    # rejected requests are not retried, responses with non-JSON bodies are not posted messages
+    for status in [401, 403, 200]:
+        server.status, server.requests = status, 0
+        assert not notifier._send('token', '#awsflow', 'message')
+        assert server.requests == 1
+    server.shutdown()
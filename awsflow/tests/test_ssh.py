@@ -0,0 +1,116 @@
+import io
+import os
+import time
+
+from awsflow.helpers import cluster, ssh
+from awsflow.tools import emr
+
+# Stand-in for ssh: prints the host name twice, then fails on hosts named 'bad-*'
+FAKE_SSH = """#!/bin/sh
+for last; do true; done
+host=$(eval echo \\${$(($# - 1))})
+echo "$host"
+sleep 0.2
+echo "$last"
+case "$host" in *@bad-*) exit 3;; esac
+"""
+
+
+def test_run_many(tmpdir, monkeypatch):
+    tmpdir.join('bin', 'ssh').write(FAKE_SSH, ensure=True)
+    os.chmod(str(tmpdir.join('bin', 'ssh')), 0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir.join('bin'), os.environ['PATH']))
+    monkeypatch.setattr(ssh, 'CACHE_DIR', str(tmpdir))
+
+    hosts = ['node-{}'.format(i) for i in range(10)] + ['bad-1']
+    out = io.StringIO()
+    start = time.perf_counter()
+    codes = ssh.run_many(hosts, 'uptime', workers=len(hosts), out=out)
+    duration = time.perf_counter() - start
+
+    assert codes == dict([(host, 0) for host in hosts[:-1]] + [('bad-1', 3)])
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 2 * len(hosts)
+    assert 'node-3 | hadoop@node-3' in lines and 'bad-1  | uptime' in lines
+
+    # hosts run concurrently
+    assert duration < 0.2 * len(hosts)
+
+
+def test_ssh_options_proxy():
+    options = ssh.ssh_options(proxy_host='master')
+    proxy = [option for option in options if option.startswith('ProxyCommand=')][0]
+    assert 'ControlPath=' in proxy and '%%C' in proxy
+    assert proxy.endswith('-W %h:%p hadoop@master')
+
+
+# Stand-in for ssh: prints whether the host is reached through a proxy
+FAKE_SSH_PROXY = """#!/bin/sh
+case "$*" in *ProxyCommand*) echo proxy;; *) echo direct;; esac
+"""
+
+
+class StubEMRInstances:
+    """
+    EMR client stub of a cluster with one master and 120 core nodes, listed in pages of 50 instances
+    """
+
+    def __init__(self):
+        self.pages = 0
+
+    def describe_cluster(self, ClusterId):
+        return {'Cluster': {'Id': ClusterId, 'MasterPublicDnsName': 'ec2-master'}}
+
+    def get_paginator(self, name):
+        assert name == 'list_instances'
+        return self
+
+    def paginate(self, ClusterId, InstanceStates):
+        instances = [{'PublicDnsName': 'ec2-master', 'PrivateDnsName': 'ip-master'}] + \
+                    [{'PrivateDnsName': 'ip-{}'.format(i)} for i in range(120)]
+        for i in range(0, len(instances), 50):
+            self.pages += 1
+            yield {'Instances': instances[i:i + 50]}
+
+
+def test_exec(tmpdir, monkeypatch, capsys, client_registry):
+    tmpdir.join('bin', 'ssh').write(FAKE_SSH_PROXY, ensure=True)
+    os.chmod(str(tmpdir.join('bin', 'ssh')), 0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir.join('bin'), os.environ['PATH']))
+    monkeypatch.setattr(ssh, 'CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(cluster, 'CACHE_DIR', str(tmpdir))
+    stub = StubEMRInstances()
+    client_registry.set_client('emr', stub, region_name='eu-west-1')
+
+    codes = emr.task_exec('eu-west-1', 'j-TEST', 'uptime', workers=32)
+    cluster.invalidate('eu-west-1', 'j-TEST')
+
+    assert stub.pages == 3
+    assert len(codes) == 121 and set(codes.values()) == {0}
+    lines = capsys.readouterr().out.splitlines()
+    assert 'ec2-master | direct' in lines
+    assert 'ip-7       | proxy' in lines
+
+
+def test_ssh_invalidates_unreachable(tmpdir, monkeypatch, client_registry):
+    tmpdir.join('bin', 'ssh').write('#!/bin/sh\nexit 255\n', ensure=True)
+    os.chmod(str(tmpdir.join('bin', 'ssh')), 0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir.join('bin'), os.environ['PATH']))
+    monkeypatch.setattr(ssh, 'CACHE_DIR', str(tmpdir))
+    monkeypatch.setattr(cluster, 'CACHE_DIR', str(tmpdir))
+    client_registry.set_client('emr', StubEMRInstances(), region_name='eu-west-1')
+
+    assert cluster.get_public_master_dns_name('eu-west-1', 'j-TEST') == 'ec2-master'
+    assert ('eu-west-1', 'j-TEST') in cluster._cache
+
+    # e.g., cluster terminated outside awsflow: the cached master DNS name is dropped
+    assert emr.task_ssh('eu-west-1', 'j-TEST', ['uptime']) == ssh.SSH_ERROR
+    assert ('eu-west-1', 'j-TEST') not in cluster._cache
+
+
+def test_exit_code():
+    assert emr.exit_code({}) == 0
+    assert emr.exit_code({'a': 0, 'b': 0}) == 0
+    # killed by SIGKILL on a node, not masked by the success of the others
+    assert emr.exit_code({'a': 0, 'b': -9}) == 137
+    assert emr.exit_code({'a': 0, 'b': 2, 'c': 255}) == 2
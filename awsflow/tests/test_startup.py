@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+# Modules that entry points must not import before they are needed
+HEAVY_MODULES = ['boto3', 'botocore', 'fabric', 'paramiko']
+
+
+def imported_modules(module_name):
+    """
+    Import module in a fresh interpreter with -X importtime
+    :param module_name: name of module to import
+    :return: list of names of modules imported with it
+    """
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', '__import__("{}")'.format(module_name)],
+                         stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return [line.split('|')[-1].strip() for line in res.stderr.splitlines()
+            if line.startswith('import time:') and '|' in line and 'cumulative' not in line]
+
+
+def test_startup():
+    for module_name in ['awsflow.tools.emr', 'awsflow.tools.lambda', 'awsflow.lambdas.demo']:
+        names = imported_modules(module_name)
+
+        # wall-clock import times depend on the machine: check only what is imported
+        assert module_name in names
+        assert not [name for name in names if name.split('.')[0] in HEAVY_MODULES]
+        assert not [name for name in names if name.startswith('awsflow.templates.')]
@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+
+from awsflow.config import EMR_WAIT_MIN_SECONDS
+from awsflow.helpers.wait import watch_steps
+from awsflow.tools import emr
+
+
+class StubEMRSteps:
+    """
+    EMR client stub recording added steps, all of them completed as soon as they are listed
+    """
+
+    def __init__(self, page_size=50):
+        self.page_size = page_size
+        self.batches = []
+        self.steps = []
+        self.calls = 0
+
+    def add_job_flow_steps(self, JobFlowId, Steps):
+        self.batches.append(len(Steps))
+        step_ids = ['s-{}'.format(len(self.steps) + i) for i in range(len(Steps))]
+        self.steps += [{'Id': step_id, 'Name': step['Name'], 'Status': {'State': 'COMPLETED'}}
+                       for step_id, step in zip(step_ids, Steps)]
+        return {'StepIds': step_ids}
+
+    def list_steps(self):
+        return self.steps
+
+    def get_paginator(self, name):
+        assert name == 'list_steps'
+        return self
+
+    def paginate(self, ClusterId, StepStates=None):
+        # newest first, as returned by EMR
+        steps = [step for step in reversed(self.list_steps()) if
+                 StepStates is None or step['Status']['State'] in StepStates]
+        for i in range(0, max(1, len(steps)), self.page_size):
+            self.calls += 1
+            yield {'Steps': steps[i:i + self.page_size]}
+
+
+class StubEMRStepsLifecycle(StubEMRSteps):
+    """
+    EMR client stub with steps following scripted lifecycles: {step_id: list of (state, entered_at) pairs}.
+    Timelines of steps hold the times they entered RUNNING and a terminal state.
+    """
+
+    def __init__(self, clock, lifecycles):
+        super().__init__()
+        self.clock = clock
+        self.lifecycles = lifecycles
+
+    def status(self, lifecycle):
+        entered = [(s, t) for s, t in lifecycle if t <= self.clock.time()]
+        timeline = {}
+        for s, t in entered:
+            if s == 'RUNNING':
+                timeline['StartDateTime'] = datetime.fromtimestamp(t, timezone.utc)
+            elif s in ['COMPLETED', 'CANCELLED', 'FAILED', 'INTERRUPTED']:
+                timeline['EndDateTime'] = datetime.fromtimestamp(t, timezone.utc)
+        return {'State': entered[-1][0], 'Timeline': timeline}
+
+    def list_steps(self):
+        return [{'Id': step_id, 'Name': step_id, 'Status': self.status(lifecycle)}
+                for step_id, lifecycle in sorted(self.lifecycles.items())]
+
+
+def test_add_steps_batches(client_registry):
+    client = StubEMRSteps()
+    client_registry.set_client('emr', client, region_name='eu-west-1')
+
+    steps = [('install-jupyter-local', []), ('update-awsflow', ['version=0.1'])] * 300
+    step_ids = emr.task_add_steps('eu-west-1', steps, [], 'j-TEST', wait=True)
+
+    assert client.batches == [256, 256, 88]
+    assert step_ids == ['s-{}'.format(i) for i in range(600)]
+    # one empty listing of active steps, then the final states of all steps
+    assert client.calls == 1 + 12
+
+
+def test_add_steps_validation(client_registry):
+    client = StubEMRSteps()
+    client_registry.set_client('emr', client, region_name='eu-west-1')
+
+    try:
+        emr.task_add_steps('eu-west-1', [('install-jupyter-local', []), ('update-awsflow', [])], [], 'j-TEST')
+        assert False
+    except SystemExit:
+        pass
+
+    # no step submitted if any template is invalid
+    assert client.batches == []
+
+
+def test_watch_steps(clock):
+    # 30 steps running one after the other, 60 seconds each, after 200 completed steps
+    lifecycles = {'s-{:03d}'.format(i): [('COMPLETED', 0)] for i in range(200)}
+    lifecycles.update({'s-{:03d}'.format(200 + i): [('PENDING', 0), ('RUNNING', 60 * i), ('COMPLETED', 60 * (i + 1))]
+                       for i in range(30)})
+    client = StubEMRStepsLifecycle(clock, lifecycles)
+
+    events = list(watch_steps(client, 'j-TEST', clock=clock.time, sleep=clock.sleep))
+
+    completed = [(step['Id'], ts) for step, ts in events if step['Status']['State'] == 'COMPLETED']
+    assert [step_id for step_id, ts in completed] == sorted(lifecycles)[200:]
+    lags = [ts - lifecycles[step_id][-1][1] for step_id, ts in completed]
+
+    # one list_steps call per tick for the whole cluster, plus one when a step is done:
+    # polling describe_step for each pending step would take one call per step per tick
+    assert client.calls < 30 * 10
+    assert max(lags) <= EMR_WAIT_MIN_SECONDS
+
+
+def test_watch_steps_durations(clock):
+    clock.now = 1000.0
+    # s-1 running since before watching, s-2 pending and completed between two polls, s-3 running after them
+    lifecycles = {'s-1': [('RUNNING', 900), ('COMPLETED', 1020)],
+                  's-2': [('PENDING', 0), ('RUNNING', 1005), ('COMPLETED', 1025)],
+                  's-3': [('PENDING', 0), ('RUNNING', 1025), ('COMPLETED', 1200)]}
+    client = StubEMRStepsLifecycle(clock, lifecycles)
+    schedule = []
+
+    list(watch_steps(client, 'j-TEST', schedule=lambda expected, elapsed: schedule.append((expected, elapsed)) or 30,
+                     clock=clock.time, sleep=clock.sleep))
+
+    # durations and elapsed times from the timeline of steps, not from the times their states were observed
+    assert schedule[0] == (None, 100)
+    assert schedule[1] == ((120 + 20) / 2, 5)
+
+
+def test_wait_steps_cancelled(clock):
+    lifecycles = {'s-1': [('CANCELLED', 0)], 's-2': [('INTERRUPTED', 0)]}
+    for step_id in lifecycles:
+        try:
+            emr.emr_wait_steps(StubEMRStepsLifecycle(clock, lifecycles), 'j-TEST', [step_id])
+            assert False
+        except SystemExit:
+            pass
+
+
+def test_wait_steps_failure(clock):
+    lifecycles = {'s-1': [('FAILED', 0)], 's-2': [('RUNNING', 0)], 's-3': [('PENDING', 0)]}
+    client = StubEMRStepsLifecycle(clock, lifecycles)
+
+    try:
+        emr.emr_wait_steps(client, 'j-TEST', ['s-1', 's-2', 's-3'])
+        assert False
+    except SystemExit:
+        pass
@@ -0,0 +1,111 @@
+import copy
+import timeit
+import tracemalloc
+
+from awsflow.helpers.log import logger
+from awsflow.helpers.templates import Templates
+from awsflow.config import AWS_S3_WHEELHOUSE
+from awsflow.templates import clusterTemplates, bootstrapTemplates
+from awsflow.version import __version__
+
+logging = logger.setup()
+
+PARAMS = {'s3bucket': 'datascience', 's3prefix': 'homes/Michele'}
+
+
+def render_legacy(t, params):
+    """
+    Rendering before compiled plans: deep copy, then visit and format every string
+    """
+    t = copy.deepcopy(t)
+    Templates.assign_params(t, params)
+    return t
+
+
+def synthetic_template(n=100):
+    """
+    Template with n * n leaves, one every hundred holding a placeholder
+    """
+    return {'Name': 'synthetic',
+            'Groups': [{'Id': i, 'Values': ['value-{}-{}'.format(i, j) if j else 'value-{s3bucket}' for j in range(n)]}
+                       for i in range(n)]}
+
+
+def measure(f, number):
+    """
+    :return: mean run time in seconds, peak allocated bytes of a single run
+    """
+    tracemalloc.start()
+    f()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timeit.timeit(f, number=number) / number, allocated
+
+
+def test_templates_benchmark():
+    registry = Templates()
+    registry.register(synthetic_template())
+
+    for name, templates, number in [('sushi', clusterTemplates, 1000), ('synthetic', registry, 20)]:
+        t, plan = templates.templates[name], templates.plans[name]
+        time_legacy, mem_legacy = measure(lambda: render_legacy(t, PARAMS), number)
+        time_compiled, mem_compiled = measure(lambda: Templates.render(t, plan, PARAMS), number)
+        logging.info('{}: legacy {:.1f}us {}B, compiled {:.1f}us {}B'.format(
+            name, time_legacy * 1e6, mem_legacy, time_compiled * 1e6, mem_compiled))
+
+        # loose bounds: only strings with placeholders are formatted, leaves are never copied
+        assert time_compiled < time_legacy
+        assert mem_compiled <= mem_legacy
+
+
+def test_templates_render():
+    registry = Templates()
+    registry.register(synthetic_template())
+
+    for name, templates in [('sushi', clusterTemplates), ('synthetic', registry)]:
+        t, plan = templates.templates[name], templates.plans[name]
+        assert Templates.render(t, plan, PARAMS) == render_legacy(t, PARAMS)
+
+    # the plan lists only the paths to placeholders, one per group
+    plan = registry.plans['synthetic']
+    assert sorted(plan) == ['Groups'] and len(plan['Groups']) == 100
+    assert all(p == {'Values': {0: 'value-{s3bucket}'}} for p in plan['Groups'].values())
+
+
+def test_templates_copy():
+    t = synthetic_template(3)
+    t['Tags'] = [{'Key': 'team', 'Value': 'datascience'}]
+    registry = Templates()
+    registry.register(t)
+
+    r = registry.get('synthetic', ['s3bucket=b'])
+    assert r['Groups'][1]['Values'] == ['value-b', 'value-1-1', 'value-1-2']
+    assert t['Groups'][1]['Values'][0] == 'value-{s3bucket}'
+
+    # rendered templates can be modified, e.g. by --include scripts, without affecting later renders
+    r['Tags'].append({'Key': 'owner', 'Value': 'me'})
+    r['Tags'][0]['Value'] = 'changed'
+    r['Groups'][2]['Values'].append('added')
+    r = registry.get('synthetic', ['s3bucket=c'])
+    assert r['Tags'] == [{'Key': 'team', 'Value': 'datascience'}]
+    assert r['Groups'][2]['Values'] == ['value-c', 'value-2-1', 'value-2-2']
+
+
+def test_templates_params():
+    registry = Templates()
+    registry.register({'Name': 't', 'Args': ['{s3prefix}/{date.year}', '{{literal}}', '{items[0]}'],
+                       'Call': lambda **params: params.get('hidden')})
+
+    assert registry.get_params('t') == ['date', 'items', 's3prefix']
+    assert registry.validate('t', {'s3prefix': 'p', 'items': [1]}) == ['date']
+    assert registry.validate('t', Templates.parse_params(['s3prefix=p', 'items=1', 'date=2019'])) == []
+
+
+def test_bootstrap_wheelhouse():
+    t = bootstrapTemplates.get('install-pkg-awsflow-wheelhouse')
+    path, script = t['ScriptBootstrapAction']['Path'], t['ScriptBootstrapAction']['Args'][1]
+    assert path == 'file:///bin/bash'
+
+    # the wheelhouse of the running version is installed offline, pinning the awsflow package to that version
+    assert 'aws s3 cp {} /tmp'.format(AWS_S3_WHEELHOUSE.format(version=__version__)) in script
+    assert script.endswith('pip-3.6 install --no-index --find-links /tmp/wheelhouse awsflow=={}'.format(__version__))
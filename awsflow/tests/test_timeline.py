@@ -0,0 +1,95 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from awsflow.helpers.emrlogs import log_location
+from awsflow.tools import emr
+
+T0 = datetime(2019, 4, 2, 15, 0, 0, tzinfo=timezone.utc)
+
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+def stub_emr(paginated):
+    """
+    EMR client stub of a cluster with instance groups, bootstrap actions and steps
+    """
+    emr = paginated({
+        'list_instance_groups': ('InstanceGroups', [
+            {'Id': 'ig-1', 'Name': 'Master', 'Status': {'Timeline': {'CreationDateTime': at(0), 'ReadyDateTime': at(400)}}},
+            {'Id': 'ig-2', 'Name': 'Core', 'Status': {'Timeline': {'CreationDateTime': at(0)}}}]),
+        'list_bootstrap_actions': ('BootstrapActions', [{'Name': 'install-pkg-awsflow'}, {'Name': 'install-jupyter'}]),
+        'list_steps': ('Steps', [
+            {'Id': 's-2', 'Name': 'pending', 'Status': {'Timeline': {'CreationDateTime': at(400)}}},
+            {'Id': 's-1', 'Name': 'update-awsflow', 'Status': {'Timeline': {'StartDateTime': at(410), 'EndDateTime': at(440)}}}]),
+    })
+
+    def describe_cluster(ClusterId):
+        if ClusterId == 'j-MISSING':
+            raise ValueError('Cluster id {} is not valid'.format(ClusterId))
+        return {'Cluster': {'Id': ClusterId, 'LogUri': 's3n://logs/emr/', 'InstanceCollectionType': 'INSTANCE_GROUP',
+                            'Status': {'Timeline': {'CreationDateTime': at(0), 'ReadyDateTime': at(400)}}}}
+
+    emr.describe_cluster = describe_cluster
+    return emr
+
+
+def controller_log(start, end):
+    lines = ['{}Z INFO Fetching file'.format(at(start).strftime('%Y-%m-%dT%H:%M:%S.123')),
+             'no timestamp on this line',
+             '{}Z INFO Execution ended with ret val 0'.format(at(end).strftime('%Y-%m-%dT%H:%M:%S.456'))]
+    return gzip.compress('\n'.join(lines).encode('utf-8'))
+
+
+def test_log_location():
+    assert log_location('s3n://bucket/awsflow/logs/emr/', 'j-1') == ('bucket', 'awsflow/logs/emr/j-1/')
+    assert log_location('s3://bucket', 'j-1') == ('bucket', 'j-1/')
+
+
+def test_timeline(client_registry, paginated, s3_logs):
+    s3_logs({
+        'emr/j-1/node/i-1/bootstrap-actions/1/controller.gz': controller_log(200, 320),
+        'emr/j-1/node/i-1/bootstrap-actions/1/stdout.gz': gzip.compress(b'pip install'),
+        'emr/j-1/node/i-1/bootstrap-actions/2/controller.gz': controller_log(320, 380),
+        'emr/j-1/node/i-2/bootstrap-actions/1/controller.gz': controller_log(210, 300),
+        'emr/j-1/steps/s-1/stderr.gz': gzip.compress(b''),
+    })
+    client_registry.set_client('emr', stub_emr(paginated), region_name='eu-west-1')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pathname = os.path.join(tmpdir, 'timeline.csv')
+        rows = emr.task_timeline('eu-west-1', ['j-1', 'j-MISSING', 'j-2'], output=pathname)
+        with open(pathname, newline='') as f:
+            written = list(csv.DictReader(f))
+
+    phases = {(row['cluster_id'], row['phase'], row['name'], row['node']): row['seconds'] for row in rows}
+    assert phases[('j-1', 'cluster', 'startup', None)] == 400
+    assert phases[('j-1', 'cluster', 'STARTING', None)] == 200
+    assert phases[('j-1', 'cluster', 'BOOTSTRAPPING', None)] == 200
+    assert phases[('j-1', 'group', 'Master', None)] == 400
+    assert phases[('j-1', 'group', 'Core', None)] is None
+    assert phases[('j-1', 'bootstrap', 'install-pkg-awsflow', 'i-1')] == 120
+    assert phases[('j-1', 'bootstrap', 'install-jupyter', 'i-1')] == 60
+    assert phases[('j-1', 'bootstrap', 'install-pkg-awsflow', 'i-2')] == 90
+    assert phases[('j-1', 'step', 'update-awsflow', None)] == 30
+    assert phases[('j-1', 'step', 'pending', None)] is None
+    assert phases[('j-1', 'cluster', 'running', None)] is None
+
+    assert len(written) == len(rows)
+    assert written[0] == {'cluster_id': 'j-1', 'phase': 'cluster', 'name': 'startup', 'node': '',
+                          'start': at(0).isoformat(), 'end': at(400).isoformat(), 'seconds': '400.0'}
+    assert {row['cluster_id'] for row in written} == {'j-1', 'j-MISSING', 'j-2'}
+    # a failing cluster does not abort the timeline of the others
+    assert [(row['phase'], row['name']) for row in rows if row['cluster_id'] == 'j-MISSING'] == [
+        ('error', 'Cluster id j-MISSING is not valid')]
+    assert not [row for row in rows if row['cluster_id'] == 'j-2' and row['phase'] == 'bootstrap']
+
+    out = io.StringIO()
+    emr.write_timeline(rows[:1], out, 'json')
+    assert json.loads(out.getvalue())[0]['start'] == at(0).isoformat()
@@ -0,0 +1,201 @@
+import json
+import random
+
+from botocore.exceptions import ClientError
+
+from awsflow.config import EMR_WAIT_FIXED_SECONDS
+from awsflow.helpers import wait
+from awsflow.helpers.log import logger
+from awsflow.helpers.wait import wait_cluster_states, watch_clusters, WaitTimeoutError
+
+logging = logger.setup()
+
+
+class StubEMR:
+    """
+    EMR client stub following a scripted lifecycle: list of (state, entered_at) pairs
+    """
+
+    def __init__(self, clock, lifecycle):
+        self.clock = clock
+        self.lifecycle = lifecycle
+        self.calls = 0
+
+    def describe_cluster(self, ClusterId):
+        self.calls += 1
+        state = [s for s, t in self.lifecycle if t <= self.clock.time()][-1]
+        return {'Cluster': {'Id': ClusterId, 'Status': {'State': state}}}
+
+
+def run_lifecycle(clock, mode, lifecycle, expected_states):
+    # each lifecycle starts at time 0
+    clock.now = 0.0
+    client = StubEMR(clock, lifecycle)
+    res = wait_cluster_states(client, 'j-TEST', expected_states, mode=mode, clock=clock.time, sleep=clock.sleep)
+    entered = dict(lifecycle)
+    lags = [ts - entered[state] for state, ts in res.transitions]
+    return res, lags
+
+
+def benchmark(clock, mode, n=300, seed=1):
+    """
+    Detection lags and API calls of cluster startups with random state durations, off the polling grid
+    :return: mean lag, max lag, mean API calls per startup
+    """
+    rng = random.Random(seed)
+    lags, calls = [], 0
+    for _ in range(n):
+        starting, bootstrapping = rng.uniform(150, 600), rng.uniform(40, 300)
+        lifecycle = [('STARTING', 0), ('BOOTSTRAPPING', starting), ('WAITING', starting + bootstrapping)]
+        res, lifecycle_lags = run_lifecycle(clock, mode, lifecycle, ['WAITING', 'RUNNING'])
+        lags += lifecycle_lags[1:]
+        calls += res.api_calls
+    return sum(lags) / len(lags), max(lags), calls / n
+
+
+def test_wait_benchmark(clock):
+    lag_fixed, max_lag_fixed, calls_fixed = benchmark(clock, 'fixed')
+    lag_adaptive, max_lag_adaptive, calls_adaptive = benchmark(clock, 'adaptive')
+    logging.info('fixed: mean lag {:.1f}s, max lag {:.1f}s, {:.1f} API calls'.format(
+        lag_fixed, max_lag_fixed, calls_fixed))
+    logging.info('adaptive: mean lag {:.1f}s, max lag {:.1f}s, {:.1f} API calls'.format(
+        lag_adaptive, max_lag_adaptive, calls_adaptive))
+
+    # transitions detected sooner, never later than with fixed polling, for a bounded number of extra calls
+    assert lag_adaptive < lag_fixed
+    assert max_lag_adaptive <= EMR_WAIT_FIXED_SECONDS
+    assert calls_adaptive < 2 * calls_fixed
+
+
+def test_due_delay():
+    assert wait.due_delay(None, 0) == EMR_WAIT_FIXED_SECONDS
+    assert wait.due_delay(300, 0) == EMR_WAIT_FIXED_SECONDS
+    assert wait.due_delay(300, 298) == wait.EMR_WAIT_MIN_SECONDS
+    # overdue: frequent polls first, never less frequent than fixed polling
+    assert wait.due_delay(300, 310) == wait.EMR_WAIT_MIN_SECONDS
+    assert wait.due_delay(300, 3000) == EMR_WAIT_FIXED_SECONDS
+
+
+def test_wait_transitions(clock):
+    res, lags = run_lifecycle(clock, 'adaptive', [('STARTING', 0), ('TERMINATED_WITH_ERRORS', 100)], ['WAITING'])
+    assert res.state == 'TERMINATED_WITH_ERRORS'
+    assert [s for s, t in res.transitions] == ['STARTING', 'TERMINATED_WITH_ERRORS']
+
+
+def test_wait_deadline(clock):
+    client = StubEMR(clock, [('STARTING', 0)])
+    try:
+        wait_cluster_states(client, 'j-TEST', ['WAITING'], deadline=60, clock=clock.time, sleep=clock.sleep)
+        assert False
+    except WaitTimeoutError as e:
+        assert e.state == 'STARTING'
+        assert clock.time() == 60
+
+
+class StubEMRFleet:
+    """
+    EMR client stub for many clusters, each following its own scripted lifecycle
+    """
+
+    def __init__(self, clock, lifecycles, page_size=50):
+        self.clock = clock
+        self.lifecycles = lifecycles
+        self.page_size = page_size
+        self.calls = 0
+
+    def state(self, cluster_id):
+        return [s for s, t in self.lifecycles[cluster_id] if t <= self.clock.time()][-1]
+
+    def describe_cluster(self, ClusterId):
+        self.calls += 1
+        return {'Cluster': {'Id': ClusterId, 'Status': {'State': self.state(ClusterId)}}}
+
+    def get_paginator(self, name):
+        assert name == 'list_clusters'
+        return self
+
+    def paginate(self, ClusterStates):
+        clusters = [{'Id': cluster_id, 'Status': {'State': self.state(cluster_id)}} for cluster_id in
+                    sorted(self.lifecycles) if self.state(cluster_id) in ClusterStates]
+        for i in range(0, max(1, len(clusters)), self.page_size):
+            self.calls += 1
+            yield {'Clusters': clusters[i:i + self.page_size]}
+
+
+def test_watch_clusters_not_found(clock):
+    client = StubEMRFleet(clock, {'j-1': [('STARTING', 0)]})
+    describe_cluster = client.describe_cluster
+
+    def describe_unknown(ClusterId):
+        if ClusterId not in client.lifecycles:
+            raise ClientError({'Error': {'Code': 'InvalidRequestException', 'Message': 'Cluster id is not valid'}},
+                              'DescribeCluster')
+        return describe_cluster(ClusterId)
+
+    client.describe_cluster = describe_unknown
+    try:
+        list(watch_clusters(client, ['j-1', 'j-TYPO'], ['WAITING'], clock=clock.time, sleep=clock.sleep))
+        assert False
+    except SystemExit:
+        pass
+
+
+def test_watch_clusters(clock):
+    lifecycles = {'j-{}'.format(i): [('STARTING', 0), ('BOOTSTRAPPING', 280 + i), ('WAITING', 400 + 2 * i)]
+                  for i in range(20)}
+    lifecycles['j-FAIL'] = [('STARTING', 0), ('TERMINATED_WITH_ERRORS', 100)]
+    client = StubEMRFleet(clock, lifecycles)
+
+    events = list(watch_clusters(client, sorted(lifecycles), ['WAITING'], clock=clock.time, sleep=clock.sleep))
+
+    final = {cluster_id: state for cluster_id, state, ts in events}
+    assert final['j-FAIL'] == 'TERMINATED_WITH_ERRORS'
+    assert all(final['j-{}'.format(i)] == 'WAITING' for i in range(20))
+    assert len(events) == 20 * 3 + 2
+
+    # one list_clusters page per tick, plus a single describe_cluster for the terminated cluster
+    assert client.calls < 2 * 60
+
+
+class StubSQS:
+    """
+    SQS client stub delivering state change events of clusters, counting receives of each message
+    """
+
+    def __init__(self, events):
+        self.messages = [{'ReceiptHandle': str(i), 'receives': 0,
+                          'Body': json.dumps({'detail': {'clusterId': cluster_id, 'state': state}})}
+                         for i, (cluster_id, state) in enumerate(events)]
+
+    def receive_message(self, QueueUrl, WaitTimeSeconds, MaxNumberOfMessages, AttributeNames):
+        for msg in self.messages:
+            msg['receives'] += 1
+        return {'Messages': [dict(msg, Attributes={'ApproximateReceiveCount': str(msg['receives'])})
+                             for msg in self.messages[:MaxNumberOfMessages]]}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.messages = [msg for msg in self.messages if msg['ReceiptHandle'] != ReceiptHandle]
+
+
+def wait_events(registry, clock, sqs, expected_states):
+    client = StubEMR(clock, [('STARTING', 0)])
+    client.meta = type('meta', (), {'region_name': 'eu-west-1'})
+    registry.set_client('sqs', sqs, region_name='eu-west-1')
+    return wait_cluster_states(client, 'j-TEST', expected_states, mode='events', clock=clock.time, sleep=clock.sleep)
+
+
+def test_wait_events(monkeypatch, client_registry, clock):
+    monkeypatch.setattr(wait, 'EMR_EVENTS_QUEUE_URL', 'https://sqs/queue')
+    monkeypatch.setattr(wait, 'EMR_EVENTS_MAX_RECEIVES', 3)
+
+    sqs = StubSQS([('j-OTHER', 'BOOTSTRAPPING'), ('j-TEST', 'BOOTSTRAPPING'), ('j-TEST', 'WAITING')])
+    res = wait_events(client_registry, clock, sqs, ['WAITING'])
+    assert [s for s, t in res.transitions] == ['STARTING', 'BOOTSTRAPPING', 'WAITING']
+    # the event of the other cluster is left in the queue for its watcher
+    assert [msg['ReceiptHandle'] for msg in sqs.messages] == ['0']
+
+    # ... until received EMR_EVENTS_MAX_RECEIVES times
+    sqs.messages[0]['receives'] = 2
+    sqs.messages.append(dict(StubSQS([('j-TEST', 'WAITING')]).messages[0], ReceiptHandle='1'))
+    wait_events(client_registry, clock, sqs, ['WAITING'])
+    assert sqs.messages == []
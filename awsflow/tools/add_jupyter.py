@@ -1,33 +1,151 @@
 import argparse
 import os
+import sys
+import time
 
 from fabric.api import local
 
+from awsflow.config import AWS_S3_JUPYTER_ENV, JUPYTER_ENV_DIR, JUPYTER_PACKAGES, JUPYTER_PORT, \
+    JUPYTER_INSTALL_TIMEOUT, JUPYTER_START_TIMEOUT
 from awsflow.helpers.instance import is_master, get_public_master_dns_name
+from awsflow.helpers.log import fatal
 from awsflow.helpers.log import logger
+from awsflow.helpers.ssh import port_open
 
 logging = logger.setup()
 
+# Written once Jupyter is installed, e.g. in background during bootstrap. It contains the jupyter-lab pathname.
+INSTALLED_MARKER = '/home/hadoop/.jupyter-installed'
+
+
+def unpack_env(env_s3):
+    """
+    Unpack a prebuilt environment archive in JUPYTER_ENV_DIR. Virtual environments built by `fab jupyter_env` are
+    not relocatable: they are built in JUPYTER_ENV_DIR and run only with the Python version they were built with,
+    recorded in their python-version file. Archives built with conda-pack ship their own interpreter.
+    :param env_s3: S3 URI of tarball of environment
+    :return: pathname of jupyter-lab executable, None if the environment cannot run on this node
+    """
+
+    local("aws s3 cp {} /tmp/jupyter-env.tar.gz".format(env_s3))
+    local("rm -rf {env_dir} && mkdir -p {env_dir} && tar -xzf /tmp/jupyter-env.tar.gz -C {env_dir}".format(
+        env_dir=JUPYTER_ENV_DIR))
+
+    if os.path.exists(os.path.join(JUPYTER_ENV_DIR, 'bin', 'conda-unpack')):
+        # conda-pack archives fix their prefixes with conda-unpack
+        local("{}/bin/conda-unpack".format(JUPYTER_ENV_DIR))
+    else:
+        version_pathname = os.path.join(JUPYTER_ENV_DIR, 'python-version')
+        version = '{}.{}'.format(*sys.version_info[:2])
+        built_with = None
+        if os.path.exists(version_pathname):
+            with open(version_pathname, 'r') as f:
+                built_with = f.read().strip()
+        if built_with != version:
+            logging.warning('Jupyter environment built with Python {}, not {}: ignored'.format(built_with, version))
+            local("rm -rf {}".format(JUPYTER_ENV_DIR))
+            return None
+
+    return os.path.join(JUPYTER_ENV_DIR, 'bin', 'jupyter-lab')
+
+
+def install(env_s3=None):
+    """
+    Install Jupyter, either with pip or unpacking a prebuilt environment archive
+    :param env_s3: S3 URI of tarball of environment built by `fab jupyter_env`, None to install with pip.
+    If the environment cannot run on this node, Jupyter is installed with pip.
+    :return: pathname of jupyter-lab executable
+    """
+
+    start = time.time()
+
+    jupyter_lab = unpack_env(env_s3) if env_s3 else None
+    if not jupyter_lab:
+        # toolz and dask are reported as missing at startup of jupyterlab, so including them here.
+        local("sudo pip-3.6 install {}".format(' '.join(JUPYTER_PACKAGES)))
+        jupyter_lab = '/usr/local/bin/jupyter-lab'
+
+    with open(INSTALLED_MARKER, 'w') as f:
+        f.write(jupyter_lab)
+
+    logging.info('Jupyter installed in {:.1f}s'.format(time.time() - start))
+    return jupyter_lab
+
+
+def wait_installed(timeout=JUPYTER_INSTALL_TIMEOUT):
+    """
+    Wait for the installation started in background during bootstrap, if any
+    :param timeout: max seconds to wait
+    :return: pathname of jupyter-lab executable, None if not installed
+    """
+
+    deadline = time.time() + timeout
+    while not os.path.exists(INSTALLED_MARKER):
+        if not os.path.exists(INSTALLED_MARKER + '.pending') or time.time() > deadline:
+            return None
+        time.sleep(1)
+
+    with open(INSTALLED_MARKER, 'r') as f:
+        return f.read().strip()
+
+
+def wait_reachable(dns_name, start, timeout=JUPYTER_START_TIMEOUT):
+    """
+    Wait until Jupyter accepts connections, logging the time since `start`. Exits with an error if Jupyter
+    does not accept connections within `timeout` seconds, e.g. if it failed to start.
+    :param dns_name: host name Jupyter listens on
+    :param start: reference time
+    :param timeout: max seconds to wait
+    :return:
+    """
+    deadline = time.time() + timeout
+    while not port_open(JUPYTER_PORT, dns_name):
+        if time.time() > deadline:
+            logging.error('Jupyter not reachable at http://{}:{}/ after {}s, see /home/hadoop/jupyterlab.log'.format(
+                dns_name, JUPYTER_PORT, timeout))
+            fatal('Jupyter not started')
+        time.sleep(0.5)
+    logging.info('Jupyter reachable at http://{}:{}/ after {:.1f}s'.format(dns_name, JUPYTER_PORT,
+                                                                           time.time() - start))
+
 
 def main():
     parser = argparse.ArgumentParser(description="Install and start Jupyter Lab")
     parser.add_argument('--bucket')
     parser.add_argument('--prefix')
+    parser.add_argument('--env-s3', nargs='?', const=AWS_S3_JUPYTER_ENV,
+                        help="S3 URI of prebuilt environment archive (default: AWS_S3_JUPYTER_ENV), "
+                             "install with pip if missing")
+    parser.add_argument('--install-only', action='store_true',
+                        help="install without configuring and starting Jupyter, e.g. in background during bootstrap")
 
     args = parser.parse_args()
+    start = time.time()
 
     if not is_master():
         logging.info('Not master! nothing to do')
         return
+    elif args.install_only:
+        logging.info('Installing Jupyter notebook on master node')
+        open(INSTALLED_MARKER + '.pending', 'w').close()
+        try:
+            install(args.env_s3)
+        finally:
+            # on failure, the Jupyter step does not wait for an installation that will never complete
+            os.remove(INSTALLED_MARKER + '.pending')
+        return
     else:
         logging.info('Installing Jupyter notebook on master node')
 
     # change current directory, same that will be available in the shell from jupyter lab
     os.chdir("/home/hadoop/")
 
-    # install required packages.
-    # toolz and dask are reported as missing at startup of jupyterlab, so including them here.
-    local("sudo pip-3.6 install jupyterlab==0.35.4 s3contents==0.1.12 toolz==0.9.0 dask==1.1.1")
+    # install required packages, unless already installed during bootstrap
+    jupyter_lab = wait_installed()
+    if jupyter_lab:
+        logging.info('Jupyter already installed, {:.1f}s spent waiting'.format(time.time() - start))
+    else:
+        jupyter_lab = install(args.env_s3)
 
     # configure jupyter notebook
 
@@ -73,7 +191,9 @@ def main():
     local("kill $(pgrep jupyter-lab) 2>/dev/null || echo")
 
     # start jupyter notebook in background, as 'hadoop' user. console output to logfile.
-    local('nohup bash -c "/usr/local/bin/jupyter-lab 2>&1 | tee -ia /home/hadoop/jupyterlab.log" &')
+    local('nohup bash -c "{} 2>&1 | tee -ia /home/hadoop/jupyterlab.log" &'.format(jupyter_lab))
+
+    wait_reachable(get_public_master_dns_name(), start)
 
 
 if __name__ == "__main__":
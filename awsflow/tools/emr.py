@@ -1,16 +1,24 @@
 import argparse
 import json
-from time import sleep
-
-import boto3
-from fabric.api import local, settings
-
-from awsflow.config import AWS_DEFAULT_REGION, AWS_SSH_KEY_PATHNAME
-from awsflow.helpers.instance import get_public_master_dns_name
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from awsflow.config import AWS_DEFAULT_REGION, EMR_WAIT_MODE, EMR_REGIONS_WORKERS, EMR_WATCH_WORKERS, \
+    EMR_MAX_STEPS_PER_CALL, SSH_WORKERS, JUPYTER_PORT, AWS_S3_ENDPOINT_URL, EMR_LOGS_WORKERS, EMR_LOGS_FOLLOW_SECONDS, \
+    AWS_CLIENT_MAX_POOL_CONNECTIONS
+from awsflow.helpers import metrics, ssh
+from awsflow.helpers.clients import get_client, get_available_regions
+from awsflow.helpers.cluster import get_cluster, get_public_master_dns_name, get_instances, invalidate
+from awsflow.helpers.emrlogs import log_location, list_logs, read_logs, is_stderr
 from awsflow.helpers.log import fatal
 from awsflow.helpers.log import log_duration
 from awsflow.helpers.log import logger
-from awsflow.templates import clusterTemplates, stepTemplates, bootstrapTemplates
+from awsflow.helpers.templates import Templates
+from awsflow.helpers.timeline import cluster_timeline, write_timeline, error_row
+from awsflow.helpers.wait import wait_cluster_states, poll_states, watch_clusters, watch_steps, step_timeline, \
+    WAIT_MODES, WaitTimeoutError, ACTIVE_STATES, TERMINAL_STATES, STEP_TERMINAL_STATES
+from awsflow.templates import clusterTemplates, stepTemplates, bootstrapTemplates, templates_dirs
 from awsflow.version import __version__
 
 logging = logger.setup()
@@ -24,20 +32,63 @@ logging.getLogger('botocore').setLevel(logging.WARNING)
 # http://boto3.readthedocs.io/en/latest/reference/services/emr.html
 
 
-def task_list_active(region_name):
+def get_region_names(region_name):
     """
-    Given a region, list active EMR clusters.
+    Expand region specification into list of region names
+    :param region_name: region name, comma-separated list of region names, or 'all' for all EMR regions
+    :return: list of region names
+    """
+    if region_name == 'all':
+        return get_available_regions('emr')
+    return region_name.split(',')
+
+
+def list_active_clusters(region_name):
+    """
+    List active EMR clusters in region, filtering server side and following pagination
     :param region_name: name of the region. e.g., 'eu-central-1'
-    :return:
+    :return: list of cluster summaries, as returned by list_clusters
     """
+    emr = get_client('emr', region_name=region_name)
 
-    emr = boto3.client('emr', region_name=region_name)
+    clusters = []
+    for page in emr.get_paginator('list_clusters').paginate(ClusterStates=ACTIVE_STATES):
+        clusters += page['Clusters']
+    return clusters
 
-    logging.info('Listing active clusters in {} ...'.format(region_name))
-    for cluster in emr.list_clusters()['Clusters']:
-        if cluster['Status']['State'].startswith('TERMINATED'):
-            continue
-        logging.info('Cluster {} is active and in {} state'.format(cluster['Id'], cluster['Status']['State']))
+
+def task_list_active(region_name):
+    """
+    Given one or more regions, list active EMR clusters. Regions are queried concurrently.
+    :param region_name: region name, comma-separated list of region names, or 'all'. e.g., 'eu-central-1'
+    :return: list of (region name, cluster summary) tuples
+    """
+
+    region_names = get_region_names(region_name)
+
+    logging.info('Listing active clusters in {} ...'.format(', '.join(region_names)))
+    with ThreadPoolExecutor(max_workers=EMR_REGIONS_WORKERS) as pool:
+        futures = [(name, pool.submit(list_active_clusters, name)) for name in region_names]
+
+    rows = []
+    for name, future in futures:
+        try:
+            rows += [(name, cluster) for cluster in future.result()]
+        except Exception as e:
+            logging.warning('Cannot list clusters in {}: {}'.format(name, e))
+
+    def created(cluster):
+        return str(cluster['Status'].get('Timeline', {}).get('CreationDateTime', ''))
+
+    rows.sort(key=lambda row: (row[0], created(row[1])))
+
+    fmt = '{:<16} {:<16} {:<14} {:<26} {}'
+    logging.info(fmt.format('REGION', 'ID', 'STATE', 'CREATED', 'NAME'))
+    for name, cluster in rows:
+        logging.info(fmt.format(name, cluster['Id'], cluster['Status']['State'], created(cluster), cluster['Name']))
+    logging.info('{} active clusters in {} regions'.format(len(rows), len(region_names)))
+
+    return rows
 
 
 def task_add_step(region_name, template, params, cluster_id):
@@ -49,7 +100,7 @@ def task_add_step(region_name, template, params, cluster_id):
     :param cluster_id: EMR cluster id
     :return:
     """
-    client = boto3.client('emr', region_name=region_name)
+    client = get_client('emr', region_name=region_name)
 
     t = stepTemplates.get(template, params)
 
@@ -60,83 +111,429 @@ def task_add_step(region_name, template, params, cluster_id):
     logging.info('Added stepId {}'.format(response['StepIds'][0]))
 
 
-def get_public_master_dns_name(region_name, cluster_id):
+def read_steps(steps, steps_file):
+    """
+    Collect step templates to submit
+    :param steps: comma-separated list of step template names, or None
+    :param steps_file: pathname of JSON file listing step template names or {"template": ..., "params": [...]}
+    objects, or None
+    :return: list of (template name, list of 'name=value' parameters) tuples
+    """
+    templates = [(name, []) for name in steps.split(',')] if steps else []
+
+    if steps_file:
+        with open(steps_file, 'r') as f:
+            for step in json.load(f):
+                if isinstance(step, str):
+                    templates.append((step, []))
+                else:
+                    templates.append((step['template'], step.get('params', [])))
+
+    return templates
+
+
+def task_add_steps(region_name, steps, params, cluster_id, wait=False, timeout=None):
+    """
+    Add many steps to existing EMR cluster. All templates are validated before calling AWS, and steps are
+    submitted in chunks of EMR_MAX_STEPS_PER_CALL steps per add_job_flow_steps call.
+    :param region_name: region name
+    :param steps: list of (template name, list of 'name=value' parameters) tuples
+    :param params: step template parameters shared by all steps
+    :param cluster_id: EMR cluster id
+    :param wait: wait until all steps are done
+    :param timeout: give up waiting after `timeout` seconds, None to wait forever
+    :return: list of step ids
     """
-    Given region name and cluster id, returns the public dns name for the master node
-    :param region_name:
-    :param cluster_id:
+
+    errors = []
+    for template, step_params in steps:
+        if template not in stepTemplates.get_names():
+            errors.append("template '{}' not found".format(template))
+            continue
+        missing = stepTemplates.validate(template, Templates.parse_params((params or []) + step_params))
+        if missing:
+            errors.append("template '{}' missing {}".format(template, ', '.join(missing)))
+    if errors:
+        fatal("Invalid steps: {}".format('; '.join(errors)))
+
+    rendered = [stepTemplates.get(template, (params or []) + step_params) for template, step_params in steps]
+
+    client = get_client('emr', region_name=region_name)
+
+    # throttled calls are retried with exponential backoff by botocore, see awsflow.helpers.clients
+    step_ids = []
+    for i in range(0, len(rendered), EMR_MAX_STEPS_PER_CALL):
+        response = client.add_job_flow_steps(JobFlowId=cluster_id, Steps=rendered[i:i + EMR_MAX_STEPS_PER_CALL])
+        step_ids += response['StepIds']
+    logging.info('Added {} steps: {}'.format(len(step_ids), ', '.join(step_ids)))
+
+    if wait:
+        emr_wait_steps(client, cluster_id, step_ids, timeout=timeout)
+
+    return step_ids
+
+
+def emr_wait_steps(client, cluster_id, step_ids=None, timeout=None):
+    """
+    Wait until steps are done, logging state changes as they happen. Exits with the first step done without
+    completing, i.e. failed, cancelled or interrupted.
+    :param client: boto3 client handler
+    :param cluster_id: EMR cluster id
+    :param step_ids: list of step ids, None to wait for all steps not done yet
+    :param timeout: give up after `timeout` seconds, None to wait forever
+    :return: dict {step_id: (step name, final state, seconds spent running)}
+    """
+
+    deadline = time.time() + timeout if timeout else None
+    start = time.time()
+    stats = {}
+
+    try:
+        for step, ts in watch_steps(client, cluster_id, step_ids, deadline=deadline):
+            state = step['Status']['State']
+            logging.info("Step {} ({}) state: {} (+{:.1f}s)".format(step['Id'], step['Name'], state, ts - start))
+            if state in STEP_TERMINAL_STATES:
+                started, ended = step_timeline(step)
+                stats[step['Id']] = (step['Name'], state, (ended or ts) - started if started is not None else 0)
+                if state != 'COMPLETED':
+                    reason = step['Status'].get('FailureDetails', {}).get('Message')
+                    fatal("Step {} ({}) {}: {}".format(step['Id'], step['Name'], state.lower(), reason))
+    except WaitTimeoutError as e:
+        fatal(e)
+
+    return stats
+
+
+@log_duration
+def task_steps_wait(region_name, cluster_id, timeout=None):
+    """
+    Wait until all pending and running steps of a cluster are done, reporting their duration
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :param timeout: give up waiting after `timeout` seconds, None to wait forever
+    :return: dict {step_id: (step name, final state, seconds spent running)}
+    """
+    client = get_client('emr', region_name=region_name)
+
+    logging.info('Waiting for steps of EMR Cluster {} ...'.format(cluster_id))
+    stats = emr_wait_steps(client, cluster_id, timeout=timeout)
+
+    for step_id, (name, state, duration) in sorted(stats.items(), key=lambda item: item[1][2], reverse=True):
+        logging.info("Step {} ({}) {} in {:.1f}s".format(step_id, name, state, duration))
+    if stats:
+        durations = [duration for name, state, duration in stats.values()]
+        logging.info("{} steps done, running time: total {:.1f}s, mean {:.1f}s, max {:.1f}s".format(
+            len(durations), sum(durations), sum(durations) / len(durations), max(durations)))
+
+    return stats
+
+
+def emr_logs_done(client, cluster_id, step_id=None):
+    """
+    Whether logs of a step or cluster are complete: the step is done, or the cluster terminated
+    :param client: boto3 client handler
+    :param cluster_id: EMR cluster id
+    :param step_id: EMR step id, None for the whole cluster
     :return:
     """
-    client = boto3.client('emr', region_name=region_name)
-    desc = client.describe_cluster(ClusterId=cluster_id)
-    return (desc['Cluster']['MasterPublicDnsName'])
+    if step_id:
+        step = client.describe_step(ClusterId=cluster_id, StepId=step_id)['Step']
+        return step['Status']['State'] in STEP_TERMINAL_STATES
+    return client.describe_cluster(ClusterId=cluster_id)['Cluster']['Status']['State'] in TERMINAL_STATES
 
 
-def task_ssh(region_name, cluster_id, cmd):
+def task_logs(region_name, cluster_id, step_id=None, stderr=False, pattern=None, follow=False,
+              workers=EMR_LOGS_WORKERS, out=None, sleep=time.sleep):
     """
-    Given a region and a cluster id, open ssh shell
+    Print logs of cluster from its S3 LogUri, each line prefixed by the key of its log object relative to the
+    cluster prefix. Log objects are read concurrently and decompressed on the fly, without temporary files.
+    When following logs, objects replaced by EMR (i.e., with a different ETag) are downloaded again from the
+    start, and only their lines past those already printed are printed.
+    :param region_name: region name
+    :param cluster_id: EMR cluster id
+    :param step_id: EMR step id, None for all logs of the cluster
+    :param stderr: print only standard error logs
+    :param pattern: regular expression selecting lines, None for all lines
+    :param follow: keep printing new log lines until the step is done, or the cluster terminated
+    :param workers: max number of log objects read concurrently
+    :param out: file object receiving the output, None for stdout
+    :param sleep: function sleeping for the given seconds
+    :return: number of log objects read
+    """
+    out = out or sys.stdout
+
+    log_uri = get_cluster(region_name, cluster_id).get('LogUri')
+    if not log_uri:
+        fatal("EMR Cluster {} has no LogUri".format(cluster_id))
+
+    bucket, cluster_prefix = log_location(log_uri, cluster_id)
+    prefix = cluster_prefix + 'steps/{}/'.format(step_id) if step_id else cluster_prefix
+
+    emr = get_client('emr', region_name=region_name)
+    s3 = get_client('s3', region_name=region_name, endpoint_url=AWS_S3_ENDPOINT_URL)
+
+    # log objects read so far {key: ETag}, and number of their lines printed so far {key: lines}: EMR uploads
+    # logs periodically, replacing objects with longer versions
+    seen, printed = {}, {}
+
+    while True:
+        # checked before listing: the last listing includes logs uploaded when done
+        done = not follow or emr_logs_done(emr, cluster_id, step_id)
+
+        objects = [obj for obj in list_logs(s3, bucket, prefix) if not stderr or is_stderr(obj['Key'])]
+        objects = [obj for obj in objects if seen.get(obj['Key'], '') != obj.get('ETag')]
+        for key, lines in read_logs(s3, bucket, [obj['Key'] for obj in objects], pattern, workers):
+            count = 0
+            for count, line in enumerate(lines, 1):
+                if count > printed.get(key, 0):
+                    out.write('{} | {}'.format(key[len(cluster_prefix):], line if line.endswith('\n') else line + '\n'))
+            out.flush()
+            printed[key] = count
+        seen.update({obj['Key']: obj.get('ETag') for obj in objects})
+
+        if done:
+            return len(seen)
+        sleep(EMR_LOGS_FOLLOW_SECONDS)
+
+
+def task_ssh(region_name, cluster_id, cmds=None):
+    """
+    Given a region and a cluster id, open ssh shell or execute commands on the master node.
+    All commands share a single SSH connection.
     :param region_name: name of the region. e.g., 'eu-central-1'
     :param cluster_id: id of the cluster. e.g., 'j-1W1939CQFFXDU'
-    :param cmd: execute this remote command over SSH
-    :return:
+    :param cmds: list of remote commands to execute in sequence, None or empty to open a shell
+    :return: exit code of the last command
     """
 
-    cmd_ssh = 'ssh -F /dev/null -o ConnectTimeout=5 -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -i {} hadoop@{} {}'
-    local(cmd_ssh.format(AWS_SSH_KEY_PATHNAME, get_public_master_dns_name(region_name, cluster_id), cmd))
+    host = get_public_master_dns_name(region_name, cluster_id)
 
+    if not cmds:
+        code = ssh.run(host)
+    else:
+        code = 0
+        for cmd in cmds:
+            code = ssh.run(host, cmd)
+            if code != 0:
+                logging.error("Command '{}' failed with exit code {}".format(cmd, code))
+                break
 
-def task_tunnel(region_name, cluster_id):
+    if code == ssh.SSH_ERROR:
+        # e.g., cluster terminated outside awsflow: describe it again next time
+        invalidate(region_name, cluster_id)
+    return code
+
+
+@log_duration
+def task_exec(region_name, cluster_id, cmd, workers=SSH_WORKERS):
     """
-    Given a region and cluster id, create ssh tunnel for zeppelin...
+    Execute command on all running nodes of the cluster concurrently, streaming their output prefixed by host.
+    Nodes other than the master are reached jumping through the master node, on their private addresses.
     :param region_name: name of the region. e.g., 'eu-central-1'
     :param cluster_id: id of the cluster. e.g., 'j-1W1939CQFFXDU'
-    :return:
+    :param cmd: remote command
+    :param workers: max number of nodes executing the command at the same time
+    :return: dict {host: exit code}
     """
 
-    cmd = 'ssh -F /dev/null -o ConnectTimeout=5 -o UserKnownHostsFile=/dev/null -o StrictHostKeyChecking=no -i {} -ND 0.0.0.0:8157 hadoop@{}'
+    master = get_public_master_dns_name(region_name, cluster_id)
+    hosts = sorted(set(master if instance.get('PublicDnsName') == master else instance['PrivateDnsName']
+                       for instance in get_instances(region_name, cluster_id)))
 
-    while True:
-        with settings(warn_only=True):
-            local(cmd.format(AWS_SSH_KEY_PATHNAME, get_public_master_dns_name(region_name, cluster_id)))
-            sleep(1)
+    logging.info("Executing '{}' on {} nodes ...".format(cmd, len(hosts)))
+    codes = ssh.run_many(hosts, cmd, workers=workers, proxy_host=master)
 
+    failed = sorted(host for host, code in codes.items() if code != 0)
+    logging.info("{} nodes succeeded, {} failed".format(len(hosts) - len(failed), len(failed)))
+    for host in failed:
+        logging.error("{} failed with exit code {}".format(host, codes[host]))
 
-def emr_wait_states(client, cluster_id, expected_states, sleep_seconds):
+    if codes.get(master) == ssh.SSH_ERROR:
+        # the master node is not reachable, e.g. cluster terminated outside awsflow: describe it again next time
+        invalidate(region_name, cluster_id)
+
+    return codes
+
+
+def exit_code(codes):
+    """
+    Exit code summarizing the exit codes of a command executed on many nodes: the first non-zero one in hosts order.
+    Commands killed by a signal (negative codes) map to 128 + signal, as in shells.
+    :param codes: dict {host: exit code}, as returned by task_exec
+    :return: exit code, 0 if the command succeeded on all nodes
+    """
+    for host in sorted(codes):
+        if codes[host] != 0:
+            return codes[host] if codes[host] > 0 else 128 - codes[host]
+    return 0
+
+
+def task_tunnel(region_name, cluster_id):
+    """
+    Given a region and cluster id, create ssh tunnel for zeppelin..., reconnecting it when needed.
+    The master DNS name is cached: reconnections do not call describe_cluster.
+    :param region_name: name of the region. e.g., 'eu-central-1'
+    :param cluster_id: id of the cluster. e.g., 'j-1W1939CQFFXDU'
+    :return:
+    """
+    ssh.tunnel(lambda: get_public_master_dns_name(region_name, cluster_id))
+
+
+def emr_wait_states(client, cluster_id, expected_states, sleep_seconds=None, mode=EMR_WAIT_MODE, timeout=None):
     """
     Wait until EMR cluster reaches desired state of terminates
     :param client: boto3 client handler
     :param cluster_id: EMR cluster id
     :param expected_states: wait until one of the states is reached
-    :param sleep_seconds: check every `sleep_seconds` seconds
-    :return:
+    :param sleep_seconds: if set, check every `sleep_seconds` seconds ignoring `mode`
+    :param mode: wait mode, one of awsflow.helpers.wait.WAIT_MODES
+    :param timeout: give up after `timeout` seconds, None to wait forever
+    :return: reached state
     """
-    while True:
-        desc = client.describe_cluster(ClusterId=cluster_id)
-        state = desc['Cluster']['Status']['State']
-        logging.info("EMR Cluster {} state: {}".format(cluster_id, state))
-        if state in expected_states + ['TERMINATED', 'TERMINATED_WITH_ERRORS']:
-            return state
-        sleep(sleep_seconds)
+
+    deadline = time.time() + timeout if timeout else None
+
+    try:
+        if sleep_seconds is not None:
+            res = poll_states(client, cluster_id, expected_states, deadline, lambda state, elapsed: sleep_seconds)
+        else:
+            res = wait_cluster_states(client, cluster_id, expected_states, mode=mode, deadline=deadline)
+    except WaitTimeoutError as e:
+        fatal(e)
+
+    for (prev_state, prev_ts), (state, ts) in zip(res.transitions, res.transitions[1:]):
+        if prev_state is None:
+            # start of the wait, e.g. with waiters not reporting the initial state
+            continue
+        logging.info("EMR Cluster {} transition {} -> {} after {:.1f} seconds".format(
+            cluster_id, prev_state, state, ts - prev_ts))
+        metrics.record_span(prev_state, prev_ts, ts, cluster_id=cluster_id)
+        metrics.observe('emr_state_seconds', ts - prev_ts, state=prev_state)
+    logging.info("EMR Cluster {} reached {} state with {} API calls".format(cluster_id, res.state, res.api_calls))
+
+    return res.state
+
+
+def emr_watch_states(client, cluster_ids, expected_states, timeout=None):
+    """
+    Wait until all EMR clusters reach desired state or terminate, logging state changes as they happen
+    :param client: boto3 client handler
+    :param cluster_ids: list of EMR cluster ids
+    :param expected_states: wait until one of the states is reached
+    :param timeout: give up after `timeout` seconds, None to wait forever
+    :return: dict {cluster_id: reached state}
+    """
+
+    deadline = time.time() + timeout if timeout else None
+    start = time.time()
+    states = {}
+
+    try:
+        for cluster_id, state, ts in watch_clusters(client, cluster_ids, expected_states, deadline=deadline):
+            logging.info("EMR Cluster {} state: {} (+{:.1f}s)".format(cluster_id, state, ts - start))
+            states[cluster_id] = state
+    except WaitTimeoutError as e:
+        fatal(e)
+
+    return states
+
+
+@log_duration
+def task_watch(region_name, cluster_ids, expected_states, timeout=None):
+    """
+    Follow many clusters in a single process, until they all reach one of the expected states or terminate
+    :param region_name: region name
+    :param cluster_ids: list of EMR cluster ids
+    :param expected_states: list of states to wait for
+    :param timeout: give up waiting after `timeout` seconds, None to wait forever
+    :return: dict {cluster_id: reached state}
+    """
+    client = get_client('emr', region_name=region_name)
+
+    logging.info('Watching {} EMR Clusters until {} ...'.format(len(cluster_ids), ', '.join(expected_states)))
+    states = emr_watch_states(client, cluster_ids, expected_states, timeout=timeout)
+    for cluster_id in cluster_ids:
+        logging.info("EMR Cluster {} in {} state".format(cluster_id, states[cluster_id]))
+
+    return states
 
 
 @log_duration
-def task_terminate(region_name, cluster_id):
+def task_timeline(region_name, cluster_ids, output=None, output_format='csv'):
+    """
+    Reconstruct provisioning phases of clusters (startup, instance fleets or groups, bootstrap actions, steps),
+    logging the slowest ones and writing all of them as CSV or JSON. Clusters whose timeline cannot be
+    reconstructed (e.g., not found) are logged, and written as a single row with phase 'error'.
+    :param region_name: region name
+    :param cluster_ids: list of EMR cluster ids
+    :param output: pathname of output file, None for stdout
+    :param output_format: 'csv' or 'json'
+    :return: list of timeline rows
+    """
+    emr = get_client('emr', region_name=region_name)
+    s3 = get_client('s3', region_name=region_name, endpoint_url=AWS_S3_ENDPOINT_URL)
+
+    # logs of each cluster are read concurrently too: all requests share the connection pool of the S3 client
+    workers = min(EMR_WATCH_WORKERS, max(1, len(cluster_ids)))
+    logs_workers = max(1, min(EMR_LOGS_WORKERS, AWS_CLIENT_MAX_POOL_CONNECTIONS // workers))
+
+    def cluster_rows(cluster_id):
+        try:
+            return cluster_timeline(emr, s3, cluster_id, workers=logs_workers)
+        except Exception as e:
+            logging.error("Timeline of EMR Cluster {} not available: {}".format(cluster_id, e))
+            return [error_row(cluster_id, e)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        timelines = list(pool.map(cluster_rows, cluster_ids))
+
+    rows = []
+    for cluster_id, timeline in zip(cluster_ids, timelines):
+        phases = sorted([row for row in timeline if row['seconds'] is not None and row['name'] != 'running'],
+                        key=lambda row: row['seconds'], reverse=True)
+        for row in phases[:5]:
+            logging.info("EMR Cluster {} {} {}{} took {:.1f}s".format(
+                cluster_id, row['phase'], row['name'], ' on {}'.format(row['node']) if row['node'] else '',
+                row['seconds']))
+        rows += timeline
+
+    if output:
+        with open(output, 'w', newline='') as f:
+            write_timeline(rows, f, output_format)
+        logging.info("Timeline of {} EMR Clusters written to {}".format(len(cluster_ids), output))
+    else:
+        write_timeline(rows, sys.stdout, output_format)
+
+    return rows
+
+
+@log_duration
+def task_terminate(region_name, cluster_id, wait_mode=EMR_WAIT_MODE, timeout=None):
     """
     Terminate cluster
     :param region_name: region name
-    :param cluster_id: EMR cluster id
+    :param cluster_id: EMR cluster id, or comma-separated list of ids to terminate and watch together
+    :param wait_mode: how to wait for a single cluster to terminate, one of awsflow.helpers.wait.WAIT_MODES
+    :param timeout: give up waiting after `timeout` seconds, None to wait forever
     :return:
     """
-    client = boto3.client('emr', region_name=region_name)
-    client.terminate_job_flows(JobFlowIds=[cluster_id])
+    client = get_client('emr', region_name=region_name)
+    cluster_ids = cluster_id.split(',')
+    client.terminate_job_flows(JobFlowIds=cluster_ids)
+
+    for terminated_id in cluster_ids:
+        invalidate(region_name, terminated_id)
 
     logging.info('Terminating EMR Cluster {} ...'.format(cluster_id))
-    emr_wait_states(client, cluster_id, ['TERMINATED'], 10)
+    if len(cluster_ids) == 1:
+        emr_wait_states(client, cluster_id, ['TERMINATED'], mode=wait_mode, timeout=timeout)
+    else:
+        emr_watch_states(client, cluster_ids, ['TERMINATED'], timeout=timeout)
     logging.info("EMR Cluster {} terminated!".format(cluster_id))
 
 
 @log_duration
-def task_create(region_name, template, params=[], wait=True, cluster_id=None):
+def task_create(region_name, template, params=[], wait=True, cluster_id=None, wait_mode=EMR_WAIT_MODE, timeout=None):
     """
     Create EMR cluster
     :param region_name: region name
@@ -144,33 +541,39 @@ def task_create(region_name, template, params=[], wait=True, cluster_id=None):
     :param params: EMR cluster template parameters
     :param wait: wait until cluster created before returning
     :param cluster_id: keep monitoring this cluster id, skipp thele creation, until it becomes available
+    :param wait_mode: how to wait for the cluster to be ready, one of awsflow.helpers.wait.WAIT_MODES
+    :param timeout: give up waiting after `timeout` seconds, None to wait forever
     :return:
     """
 
-    client = boto3.client('emr', region_name=region_name)
+    client = get_client('emr', region_name=region_name)
 
     if cluster_id is None:
-        t = clusterTemplates.get(template, params)
+        with metrics.span('render', template=template):
+            t = clusterTemplates.get(template, params)
 
-        response = client.run_job_flow(**t)
+        with metrics.span('run_job_flow'):
+            response = client.run_job_flow(**t)
         logging.info("Using AWSFlow version {}".format(__version__))
         logging.info(
             'Creating EMR Cluster {} using template "{}" ...'.format(response['JobFlowId'], t['Name']))
         cluster_id = response['JobFlowId']
 
     if wait:
-        state = emr_wait_states(client, cluster_id, ['WAITING', 'RUNNING'], 10)
+        with metrics.span('wait', cluster_id=cluster_id):
+            state = emr_wait_states(client, cluster_id, ['WAITING', 'RUNNING'], mode=wait_mode, timeout=timeout)
 
         if state in ['WAITING', 'RUNNING']:
 
-            public_master_dns_name = get_public_master_dns_name(region_name, cluster_id)
+            with metrics.span('ready', cluster_id=cluster_id):
+                public_master_dns_name = get_public_master_dns_name(region_name, cluster_id)
 
             logging.info("EMR Cluster {} up and running!".format(cluster_id))
             logging.info(
                 'SSH into master..............: awsflow.emr ssh --region {} --id {}'.format(region_name, cluster_id))
             logging.info(
                 'Start SSH tunnel to master...: awsflow.emr tunnel --region {} --id {}'.format(region_name, cluster_id))
-            logging.info('URL Jupyter Lab..............: http://{}:8888/'.format(public_master_dns_name))
+            logging.info('URL Jupyter Lab..............: http://{}:{}/'.format(public_master_dns_name, JUPYTER_PORT))
             logging.info('URL Zeppelin.................: http://{}:8890/'.format(public_master_dns_name))
             logging.info('URL Spark History Server.....: http://{}:18080/'.format(public_master_dns_name))
             logging.info('URL Hadoop Resource Manager..: http://{}:8088/'.format(public_master_dns_name))
@@ -184,6 +587,16 @@ def task_create(region_name, template, params=[], wait=True, cluster_id=None):
     return cluster_id
 
 
+def describe_templates(templates):
+    """
+    Describe registered templates with their required parameters
+    :param templates: Templates registry
+    :return: string, e.g. "sushi (s3bucket, s3prefix), cheap"
+    """
+    return ', '.join('{} ({})'.format(name, ', '.join(templates.get_params(name))) if templates.get_params(name)
+                     else name for name in templates.get_names())
+
+
 def main():
     """
     Application entry point
@@ -192,19 +605,43 @@ def main():
 
     parser = argparse.ArgumentParser(description="AWS EMR admin tool v{}".format(__version__))
     parser.add_argument('task',
-                        choices=['active', 'create', 'terminate', 'ssh', 'tunnel', 'step', 'render', 'templates'])
-    parser.add_argument('--region', default=AWS_DEFAULT_REGION, help="region to consider")
+                        choices=['active', 'create', 'terminate', 'watch', 'timeline', 'logs', 'ssh', 'exec', 'tunnel',
+                                 'step', 'steps', 'steps-wait', 'render', 'templates'])
+    parser.add_argument('--region', default=AWS_DEFAULT_REGION,
+                        help="region to consider. The active task accepts also comma-separated lists and 'all'")
     parser.add_argument('--cluster', help="name of cluster template")
-    parser.add_argument('--step', help="add step to running cluster")
+    parser.add_argument('--step', help="add step to running cluster, comma-separated list of steps for steps")
+    parser.add_argument('--steps-file', help="JSON file listing steps to add with steps")
+    parser.add_argument('--wait', action='store_true', help="wait until added steps are done")
     parser.add_argument('--bootstrap', help="name of bootstrap template")
     parser.add_argument('--param', action='append', help="template parameter")
     parser.add_argument('--include', action='append', help="include Python script")
-    parser.add_argument('--id', help="ID of EMR cluster")
-    parser.add_argument('--cmd', default='', help="command to execute on master node")
+    parser.add_argument('--templates-dir', action='append',
+                        help="directory of templates, with emr, step and bootstrap subdirectories")
+    parser.add_argument('--id',
+                        help="ID of EMR cluster, comma-separated list of IDs for terminate, watch and timeline")
+    parser.add_argument('--cmd', action='append', help="command to execute on master node, can be repeated")
+    parser.add_argument('--workers', type=int,
+                        help="max number of nodes executing the command at the same time with exec, "
+                             "of log objects read at the same time with logs")
     parser.add_argument('--tunnel', action='store_true', help="start tunnel once cluster running")
+    parser.add_argument('--wait-mode', default=EMR_WAIT_MODE, choices=sorted(WAIT_MODES.keys()),
+                        help="how to wait for cluster state changes")
+    parser.add_argument('--timeout', type=int, help="give up waiting for cluster state changes after these seconds")
+    parser.add_argument('--until', default='WAITING,RUNNING', help="comma-separated list of states to watch for")
+    parser.add_argument('--output', help="output file of timeline, default: stdout")
+    parser.add_argument('--format', default='csv', choices=['csv', 'json'], help="output format of timeline")
+    parser.add_argument('--step-id', help="ID of EMR step whose logs are printed with logs")
+    parser.add_argument('--stderr', action='store_true', help="print only standard error logs with logs")
+    parser.add_argument('--grep', help="regular expression selecting log lines printed with logs")
+    parser.add_argument('--follow', action='store_true',
+                        help="keep printing new log lines until the step is done or the cluster terminated")
 
     args = parser.parse_args()
 
+    if args.templates_dir:
+        templates_dirs.extend(args.templates_dir)
+
     if args.include:
         for pathname in args.include:
             logging.info('Including {} ...'.format(pathname))
@@ -221,16 +658,42 @@ def main():
                 fatal("create task requires --cluster or --id")
 
             cluster_id = task_create(region_name=args.region, template=args.cluster, params=args.param,
-                                     cluster_id=args.id)
+                                     cluster_id=args.id, wait_mode=args.wait_mode, timeout=args.timeout)
             if args.tunnel:
                 # if --tunnel, start tunnel afterwards
                 task_tunnel(region_name=args.region, cluster_id=cluster_id)
 
         elif args.task == 'terminate':
-            task_terminate(region_name=args.region, cluster_id=args.id)
+            task_terminate(region_name=args.region, cluster_id=args.id, wait_mode=args.wait_mode,
+                           timeout=args.timeout)
+
+        elif args.task == 'watch':
+            if args.id is None:
+                fatal("watch task requires --id")
+            task_watch(region_name=args.region, cluster_ids=args.id.split(','), expected_states=args.until.split(','),
+                       timeout=args.timeout)
+
+        elif args.task == 'timeline':
+            if args.id is None:
+                fatal("timeline task requires --id")
+            task_timeline(region_name=args.region, cluster_ids=args.id.split(','), output=args.output,
+                          output_format=args.format)
+
+        elif args.task == 'logs':
+            if args.id is None:
+                fatal("logs task requires --id")
+            task_logs(region_name=args.region, cluster_id=args.id, step_id=args.step_id, stderr=args.stderr,
+                      pattern=args.grep, follow=args.follow, workers=args.workers or EMR_LOGS_WORKERS)
 
         elif args.task == 'ssh':
-            task_ssh(region_name=args.region, cluster_id=args.id, cmd=args.cmd)
+            sys.exit(task_ssh(region_name=args.region, cluster_id=args.id, cmds=args.cmd))
+
+        elif args.task == 'exec':
+            if args.id is None or not args.cmd:
+                fatal("exec task requires --id and --cmd")
+            codes = task_exec(region_name=args.region, cluster_id=args.id, cmd=' && '.join(args.cmd),
+                              workers=args.workers or SSH_WORKERS)
+            sys.exit(exit_code(codes))
 
         elif args.task == 'tunnel':
             task_tunnel(region_name=args.region, cluster_id=args.id)
@@ -238,21 +701,35 @@ def main():
         elif args.task == 'step':
             task_add_step(region_name=args.region, template=args.step, params=args.param, cluster_id=args.id)
 
+        elif args.task == 'steps':
+            steps = read_steps(args.step, args.steps_file)
+            if not steps or args.id is None:
+                fatal("steps task requires --id and either --step or --steps-file")
+            task_add_steps(region_name=args.region, steps=steps, params=args.param, cluster_id=args.id,
+                           wait=args.wait, timeout=args.timeout)
+
+        elif args.task == 'steps-wait':
+            if args.id is None:
+                fatal("steps-wait task requires --id")
+            task_steps_wait(region_name=args.region, cluster_id=args.id, timeout=args.timeout)
+
         elif args.task == 'render':
             if args.cluster:
-                t, n = clusterTemplates.get(args.cluster, args.param), "Cluster"
+                templates, name, n = clusterTemplates, args.cluster, "Cluster"
             elif args.bootstrap:
-                t, n = bootstrapTemplates.get(args.bootstrap, args.param), "Bootstrap"
+                templates, name, n = bootstrapTemplates, args.bootstrap, "Bootstrap"
             elif args.step:
-                t, n = stepTemplates.get(args.step, args.param), "Step"
+                templates, name, n = stepTemplates, args.step, "Step"
             else:
                 fatal("render task requires either --cluster, --bootstrap, or --step")
+            t = templates.get(name, args.param)
+            logging.info('{n} template parameters: {p}'.format(n=n, p=templates.get_params(name)))
             logging.info('{n} template:\n\n{s}\n\n'.format(n=n, s=json.dumps(t, indent=4, sort_keys=True)))
 
         elif args.task == 'templates':
-            logging.info('EMR cluster templates: {}'.format(clusterTemplates.get_names()))
-            logging.info('EMR step templates: {}'.format(stepTemplates.get_names()))
-            logging.info('EMR bootstrap templates: {}'.format(bootstrapTemplates.get_names()))
+            logging.info('EMR cluster templates: {}'.format(describe_templates(clusterTemplates)))
+            logging.info('EMR step templates: {}'.format(describe_templates(stepTemplates)))
+            logging.info('EMR bootstrap templates: {}'.format(describe_templates(bootstrapTemplates)))
 
         else:
             fatal("Task not recognized")
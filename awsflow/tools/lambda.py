@@ -1,13 +1,18 @@
 import argparse
+import ast
+import json
 import os
-from shutil import make_archive
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
 from tempfile import mkdtemp
 
-import boto3
-from fabric.api import local
-
-from awsflow.config import AWS_DEFAULT_REGION, AWS_ROLE, AWS_LAMBDA_MEMORYSIZE, AWS_LAMBDA_TIMEOUT, \
-    AWS_LAMBDA_RUNTIME
+from awsflow.config import AWS_DEFAULT_REGION, AWS_LAMBDA_ROLE, AWS_LAMBDA_MEMORYSIZE, AWS_LAMBDA_TIMEOUT, \
+    AWS_LAMBDA_RUNTIME, AWS_LAMBDA_PIP, CACHE_DIR, AWS_S3_BUCKET, AWS_S3_LAMBDA_PREFIX, AWS_S3_UPLOAD_PART_SIZE, \
+    AWS_S3_UPLOAD_CONCURRENCY, AWS_S3_ENDPOINT_URL, AWS_LAMBDA_LAYER_NAME, AWS_LAMBDA_DEPLOY_WORKERS
+from awsflow.helpers.archive import list_tree, hash_entries, write_archive, code_sha256, prefix_archive
+from awsflow.helpers.clients import get_client
 from awsflow.helpers.log import logger, fatal
 from awsflow.version import __version__
 
@@ -21,74 +26,208 @@ logging.getLogger('botocore').setLevel(logging.WARNING)
 # Lambda client
 # https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/lambda.html
 
+# directory containing setup.py of the awsflow package
+AWSFLOW_BASEDIR = os.path.abspath(os.path.dirname(__file__) + "/../../")
+
+
+def get_cache_dir():
+    """
+    Get directory caching dependencies and archives of lambda functions, creating it if needed
+    :return: pathname of directory
+    """
+    cache_dir = os.path.join(os.path.expanduser(CACHE_DIR), 'lambda')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def prune_archives(cache_dir, name, keep):
+    """
+    Remove archives superseded by a new one, named `name`-`hash`.zip as all archives of the cache
+    :param cache_dir: directory storing the archives
+    :param name: name of archives, e.g. 'deps' or the lambda module name
+    :param keep: pathname of the archive to keep
+    :return:
+    """
+    pattern = re.compile(re.escape(name) + r'-[0-9a-f]{16}\.zip')
+    for filename in os.listdir(cache_dir):
+        pathname = os.path.join(cache_dir, filename)
+        if pattern.fullmatch(filename) and pathname != keep:
+            os.remove(pathname)
+
 
-def task_list():
-    cli = boto3.client('lambda')
+def task_list(region_name=None):
+    """
+    List lambda functions
+    :param region_name: region name, None for default region
+    :return:
+    """
+    cli = get_client('lambda', region_name=region_name)
     funcs = cli.list_functions()
     logging.info("Lambda functions:")
     for func in funcs["Functions"]:
         logging.info("{CodeSize}\t{LastModified}\t{Runtime}\t{FunctionName}".format(**func))
 
 
-def build_archive(mod, cache):
+def build_dependencies(awsflow_basedir, cache_dir, cache=None):
     """
-    Build archive of lambda function
-    :param mod: filename containing the lambda function
-    :param cache: cache key, set it to None to disable cache
-    :return: contents of ZIP archive
+    Install dependencies of the awsflow package and archive them. Both steps are skipped if an archive exists
+    for the same requirements.txt, setup.py and runtime: its name contains the hash of these inputs.
+    :param awsflow_basedir: directory containing setup.py
+    :param cache_dir: directory storing the archives
+    :param cache: optional key included in the hash, change it to force a fresh install
+    :return: pathname of ZIP archive with dependencies
     """
 
-    mod_pathname = os.path.abspath(os.path.dirname(__file__) + "/../lambdas/{}.py".format(mod))
-    awsflow_basedir = os.path.abspath(os.path.dirname(__file__) + "/../../")
+    inputs = [(os.path.join(awsflow_basedir, name), name) for name in ['requirements.txt', 'setup.py']]
+    deps_hash = hash_entries(inputs, [AWS_LAMBDA_RUNTIME, AWS_LAMBDA_PIP, cache or ''])[:16]
+    deps_pathname = os.path.join(cache_dir, 'deps-{}.zip'.format(deps_hash))
 
-    pkg_dir_suffix = ".lambda"
+    if os.path.exists(deps_pathname):
+        logging.info("Using cached dependencies {}".format(deps_hash))
+        return deps_pathname
 
-    if cache:
-        # Instead of generating a new temporary directory, reuse the existing one if existing,
-        # so that we can avoid re-downloading all the dependencies again. this saves lots of time.
-        # The cache is valid for any lamda function defined internally in the awsflow package.
-        pkg_dir = "/tmp/awsflow{}-{}".format(pkg_dir_suffix, cache)
+    from fabric.api import local
 
-        # check if package directory is empty.
-        pkg_dir_empty = not os.path.exists(pkg_dir)
+    logging.info("Installing dependencies {} ...".format(deps_hash))
+    pkg_dir = mkdtemp('.lambda')
+    local('{pip} install {awsflow_basedir} --find-links {awsflow_basedir} --target {pkg_dir} --upgrade'.format(
+        pip=AWS_LAMBDA_PIP, awsflow_basedir=awsflow_basedir, pkg_dir=pkg_dir))
 
-        # make sure that the directory exists.
-        local("mkdir -p {}".format(pkg_dir))
-    else:
-        pkg_dir = mkdtemp(pkg_dir_suffix)
+    # the awsflow package is added later from sources, always up to date
+    write_archive(deps_pathname, list_tree(pkg_dir, exclude=['awsflow']))
+    local("rm -rf {pkg_dir}".format(pkg_dir=pkg_dir))
+    prune_archives(cache_dir, 'deps', deps_pathname)
+
+    return deps_pathname
+
+
+def build_archive(mod, cache=None, layer=False):
+    """
+    Build archive of lambda function, reusing cached dependencies and the previous archive if nothing changed.
+    Archives are reproducible: same dependencies and sources produce the same bytes.
+    :param mod: filename containing the lambda function
+    :param cache: optional key included in the dependencies hash, change it to force a fresh install
+    :param layer: if true, leave out dependencies, shipped separately as lambda layer
+    :return: pathname of ZIP archive
+    """
+
+    mod_pathname = os.path.abspath(os.path.dirname(__file__) + "/../lambdas/{}.py".format(mod))
+    cache_dir = get_cache_dir()
 
     logging.info("Assembling archive for lambda function ...")
 
-    local('cp {mod_pathname} {pkg_dir}'.format(mod_pathname=mod_pathname, pkg_dir=pkg_dir))
+    deps_pathname = None if layer else build_dependencies(AWSFLOW_BASEDIR, cache_dir, cache)
 
-    if not cache or pkg_dir_empty:
-        local('pip-3.6 install {awsflow_basedir} --find-links {awsflow_basedir} --target {pkg_dir} --upgrade'.format(
-            awsflow_basedir=awsflow_basedir, pkg_dir=pkg_dir))
-    else:
-        logging.info("Using cached package directory")
+    sources = list_tree(os.path.join(AWSFLOW_BASEDIR, 'awsflow'), prefix='awsflow', exclude=['tests'])
+    sources.append((mod_pathname, '{}.py'.format(mod)))
+
+    # archive name addresses its contents: dependencies (named by their hash) and sources
+    archive_pathname = os.path.join(cache_dir, '{}-{}.zip'.format(
+        mod, hash_entries(sources, [os.path.basename(deps_pathname or '')])[:16]))
+
+    if os.path.exists(archive_pathname):
+        logging.info("Archive unchanged.")
+        return archive_pathname
 
-    local('cp -r {awsflow_basedir}/awsflow {pkg_dir}'.format(awsflow_basedir=awsflow_basedir,
-                                                             pkg_dir=pkg_dir))
-    make_archive(base_name=pkg_dir, format='zip', root_dir=pkg_dir)
+    write_archive(archive_pathname, sources, base=deps_pathname)
+
+    # drop previous archives of the same lambda function
+    prune_archives(cache_dir, mod, archive_pathname)
 
     logging.info("Archive ready.")
 
-    archive_contents = open('{}.zip'.format(pkg_dir), "rb").read()
+    return archive_pathname
 
-    if not cache:
-        local("rm -rf {pkg_dir}.zip {pkg_dir}".format(pkg_dir=pkg_dir))
 
-    return archive_contents
+def build_layer(cache=None):
+    """
+    Build archive of lambda layer with the dependencies of the awsflow package, under the python/ directory
+    :param cache: optional key included in the dependencies hash, change it to force a fresh install
+    :return: pathname of ZIP archive, named after the dependencies hash
+    """
 
+    cache_dir = get_cache_dir()
+    deps_pathname = build_dependencies(AWSFLOW_BASEDIR, cache_dir, cache)
+    layer_pathname = os.path.join(cache_dir, 'layer-' + os.path.basename(deps_pathname)[len('deps-'):])
 
-def task_delete(name):
+    if not os.path.exists(layer_pathname):
+        prefix_archive(deps_pathname, layer_pathname, 'python/')
+        prune_archives(cache_dir, 'layer', layer_pathname)
+
+    return layer_pathname
+
+
+def publish_layer(cli, layer_pathname, s3=False):
+    """
+    Publish lambda layer version, unless a version with the same dependencies hash already exists
+    :param cli: boto3 lambda client
+    :param layer_pathname: pathname of ZIP archive, as returned by build_layer
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :return: ARN of layer version
+    """
+
+    deps_hash = os.path.basename(layer_pathname)[len('layer-'):-len('.zip')]
+    description = 'awsflow dependencies {}'.format(deps_hash)
+
+    kwargs = {'LayerName': AWS_LAMBDA_LAYER_NAME, 'CompatibleRuntime': AWS_LAMBDA_RUNTIME}
+    while True:
+        res = cli.list_layer_versions(**kwargs)
+        for version in res['LayerVersions']:
+            if version.get('Description') == description:
+                logging.info("Using layer {}".format(version['LayerVersionArn']))
+                return version['LayerVersionArn']
+        if not res.get('NextMarker'):
+            break
+        kwargs['Marker'] = res['NextMarker']
+
+    res = cli.publish_layer_version(LayerName=AWS_LAMBDA_LAYER_NAME,
+                                    Description=description,
+                                    Content=get_code(layer_pathname, s3, cli.meta.region_name),
+                                    CompatibleRuntimes=[AWS_LAMBDA_RUNTIME])
+    logging.info("Published layer {}".format(res['LayerVersionArn']))
+
+    return res['LayerVersionArn']
+
+
+def is_awsflow_layer(layer_arn):
+    """
+    Whether a layer version ARN (arn:aws:lambda:region:account:layer:name:version) is one of AWS_LAMBDA_LAYER_NAME
+    :param layer_arn: ARN of layer version
+    :return:
+    """
+    return layer_arn.split(':')[-2] == AWS_LAMBDA_LAYER_NAME
+
+
+def merge_layers(layer_arns, layer_arn=None):
+    """
+    Replace the awsflow layer in a list of layers, keeping other layers attached by users in place
+    :param layer_arns: ARNs of layer versions attached to a lambda function
+    :param layer_arn: ARN of the awsflow layer version to attach, None to detach the awsflow layer
+    :return: list of ARNs
+    """
+    return [arn for arn in layer_arns if not is_awsflow_layer(arn)] + ([layer_arn] if layer_arn else [])
+
+
+def wait_updated(cli, func):
+    """
+    Wait until a pending update of the lambda function completes, if supported by botocore
+    :param cli: boto3 lambda client
+    :param func: name of function
+    :return:
+    """
+    if 'function_updated' in cli.waiter_names:
+        cli.get_waiter('function_updated').wait(FunctionName=func)
+
+
+def task_delete(name, region_name=None):
     """
     Delete lambda function
     :param name: function name or ARN
+    :param region_name: region name, None for default region
     :return:
     """
 
-    cli = boto3.client('lambda')
+    cli = get_client('lambda', region_name=region_name)
 
     try:
         cli.delete_function(FunctionName=name)
@@ -98,55 +237,257 @@ def task_delete(name):
     logging.info("Operation completed.")
 
 
-def task_create(mod, func, cache):
+def stage_archive(archive_pathname, region_name=None):
+    """
+    Upload archive to AWS_S3_BUCKET with a concurrent multipart upload, streaming it from disk:
+    memory usage is bounded by part size and concurrency, not by archive size.
+    Archive names address their contents, existing objects are not uploaded again.
+    :param archive_pathname: pathname of ZIP archive
+    :param region_name: region of the bucket, must match the one of the lambda function
+    :return: dict with S3Bucket and S3Key of the staged archive
+    """
+
+    from boto3.s3.transfer import TransferConfig
+    from botocore.exceptions import ClientError
+
+    s3 = get_client('s3', region_name=region_name, endpoint_url=AWS_S3_ENDPOINT_URL)
+    key = '{}/{}'.format(AWS_S3_LAMBDA_PREFIX, os.path.basename(archive_pathname))
+
+    try:
+        if s3.head_object(Bucket=AWS_S3_BUCKET, Key=key)['ContentLength'] == os.path.getsize(archive_pathname):
+            logging.info("Archive already staged at s3://{}/{}".format(AWS_S3_BUCKET, key))
+            return {'S3Bucket': AWS_S3_BUCKET, 'S3Key': key}
+    except ClientError:
+        pass
+
+    config = TransferConfig(multipart_threshold=AWS_S3_UPLOAD_PART_SIZE, multipart_chunksize=AWS_S3_UPLOAD_PART_SIZE,
+                            max_concurrency=AWS_S3_UPLOAD_CONCURRENCY)
+    s3.upload_file(archive_pathname, AWS_S3_BUCKET, key, Config=config)
+    logging.info("Archive staged at s3://{}/{}".format(AWS_S3_BUCKET, key))
+
+    return {'S3Bucket': AWS_S3_BUCKET, 'S3Key': key}
+
+
+def get_code(archive_pathname, s3=False, region_name=None):
+    """
+    Get location of the code of a lambda function, as accepted by create_function and update_function_code
+    :param archive_pathname: pathname of ZIP archive
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param region_name: region of the lambda function
+    :return: dict with either ZipFile, or S3Bucket and S3Key
+    """
+
+    if s3:
+        return stage_archive(archive_pathname, region_name)
+
+    with open(archive_pathname, 'rb') as f:
+        return {'ZipFile': f.read()}
+
+
+def create_function(cli, mod, func, archive_pathname, s3=False, layer_arn=None):
+    """
+    Create lambda function from archive
+    :param cli: boto3 lambda client
+    :param mod: filename containing it
+    :param func: name of function
+    :param archive_pathname: pathname of ZIP archive
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param layer_arn: if set, layer version with the dependencies
+    :return: ARN of function
+    """
+
+    res = cli.create_function(Handler="{mod}.{func}".format(mod=mod, func=func),
+                              FunctionName=func,
+                              Runtime=AWS_LAMBDA_RUNTIME,
+                              Role=AWS_LAMBDA_ROLE,
+                              Code=get_code(archive_pathname, s3, cli.meta.region_name),
+                              Timeout=AWS_LAMBDA_TIMEOUT,
+                              MemorySize=AWS_LAMBDA_MEMORYSIZE,
+                              Layers=[layer_arn] if layer_arn else []
+                              )
+    return res["FunctionArn"]
+
+
+def task_create(mod, func, cache, region_name=None, s3=False, layer=False):
     """
     Build archive of lambda function, and deploy it
-    :param modname: filename containing it
-    :param funcname: name of function
-    :param region: region where it should be created and deployed
+    :param mod: filename containing it
+    :param func: name of function
+    :param cache: optional cache key, change it to force a fresh install of dependencies
+    :param region_name: region where it should be created and deployed, None for default region
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param layer: if true, ship dependencies as lambda layer
     :return:
     """
 
-    cli = boto3.client('lambda')
+    cli = get_client('lambda', region_name=region_name)
+
+    try:
+        layer_arn = publish_layer(cli, build_layer(cache), s3) if layer else None
+        arn = create_function(cli, mod, func, build_archive(mod, cache, layer), s3, layer_arn)
+    except Exception as e:
+        fatal("Operation failed: {}".format(e))
+
+    logging.info("Operation completed: {}".format(arn))
+
+
+def update_code(cli, func, archive_pathname, s3=False, layer_arn=None):
+    """
+    Upload archive as code of existing lambda function, unless it is already deployed.
+    Compares the local SHA-256 of the archive with the CodeSha256 of the deployed code.
+    :param cli: boto3 lambda client
+    :param func: name of function
+    :param archive_pathname: pathname of ZIP archive
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param layer_arn: if set, attach this layer version with the dependencies before updating the code, otherwise
+    detach the awsflow layer, if any, after updating the code: dependencies are then shipped in the archive.
+    Either way, the function never runs code without its dependencies. Other layers are kept.
+    :return: number of bytes uploaded, 0 if the upload was skipped
+    """
+
+    conf = cli.get_function_configuration(FunctionName=func)
+
+    layer_arns = [layer['Arn'] for layer in conf.get('Layers', [])]
+    layers = merge_layers(layer_arns, layer_arn)
+
+    if layer_arn and layers != layer_arns:
+        cli.update_function_configuration(FunctionName=func, Layers=layers)
+        logging.info("Function {} now using layer {}".format(func, layer_arn))
+        wait_updated(cli, func)
+
+    if conf['CodeSha256'] == code_sha256(archive_pathname):
+        logging.info("Function {} unchanged, upload skipped".format(func))
+        uploaded = 0
+    else:
+        res = cli.update_function_code(FunctionName=func, **get_code(archive_pathname, s3, cli.meta.region_name))
+        logging.info("Function {} updated: {}".format(func, res["FunctionArn"]))
+        uploaded = os.path.getsize(archive_pathname)
+
+    if not layer_arn and layers != layer_arns:
+        # the uploaded archive ships the dependencies: the layer can go
+        wait_updated(cli, func)
+        cli.update_function_configuration(FunctionName=func, Layers=layers)
+        logging.info("Function {} no longer using layer {}".format(func, AWS_LAMBDA_LAYER_NAME))
+
+    return uploaded
+
+
+def task_update(mod, func, cache, region_name=None, s3=False, layer=False):
+    """
+    Update existing lambda functions, skipping those whose deployed code is unchanged
+    :param mod: filename containing it
+    :param func: name of function, or comma-separated list of functions sharing the same module
+    :param cache: optional cache key, change it to force a fresh install of dependencies
+    :param region_name: region where it is deployed, None for default region
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param layer: if true, ship dependencies as lambda layer
+    :return: number of bytes not uploaded thanks to unchanged code
+    """
+
+    cli = get_client('lambda', region_name=region_name)
 
-    archive_contents = build_archive(mod, cache)
+    archive_pathname = build_archive(mod, cache, layer)
+    funcs = func.split(',')
 
     try:
-        res = cli.create_function(Handler="{mod}.{func}".format(mod=mod, func=func),
-                                  FunctionName=func,
-                                  Runtime=AWS_LAMBDA_RUNTIME,
-                                  Role=AWS_LAMBDA_ROLE,
-                                  Code={"ZipFile": archive_contents},
-                                  Timeout=AWS_LAMBDA_TIMEOUT,
-                                  MemorySize=AWS_LAMBDA_MEMORYSIZE
-                                  )
+        layer_arn = publish_layer(cli, build_layer(cache), s3) if layer else None
+        uploaded = sum(update_code(cli, name, archive_pathname, s3, layer_arn) for name in funcs)
     except Exception as e:
         fatal("Operation failed: {}".format(e))
 
-    logging.info("Operation completed: {}".format(res["FunctionArn"]))
+    saved = len(funcs) * os.path.getsize(archive_pathname) - uploaded
+    logging.info("Operation completed: {} bytes uploaded, {} bytes saved".format(uploaded, saved))
+
+    return saved
 
 
-def task_update(mod, func, cache):
+def find_handlers():
     """
-    Update existing lambda function
-    :param modname: filename containing it
-    :param funcname: name of function
-    :param region: region where it should be created and deployed
-    :param fast: if true, download all dependencies again from scratch
-    :return:
+    Find lambda functions in the awsflow.lambdas subpackage: module-level functions with (event, context) arguments.
+    Sources are parsed, not imported.
+    :return: list of (module name, function name) tuples
+    """
+
+    handlers = []
+    for pathname in sorted(glob(os.path.join(AWSFLOW_BASEDIR, 'awsflow', 'lambdas', '*.py'))):
+        mod = os.path.splitext(os.path.basename(pathname))[0]
+        with open(pathname, 'r') as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and [arg.arg for arg in node.args.args] == ['event', 'context']:
+                handlers.append((mod, node.name))
+    return handlers
+
+
+def deploy_function(cli, mod, func, archive_pathname, s3=False, layer_arn=None):
+    """
+    Create lambda function, or update it if it already exists
+    :param cli: boto3 lambda client
+    :param mod: filename containing it
+    :param func: name of function
+    :param archive_pathname: pathname of ZIP archive
+    :param s3: if true, stage archive on AWS S3 instead of sending it inline
+    :param layer_arn: if set, layer version with the dependencies
+    :return: status, i.e. one of 'created', 'updated', 'unchanged'
+    """
+
+    try:
+        cli.get_function_configuration(FunctionName=func)
+    except cli.exceptions.ResourceNotFoundException:
+        create_function(cli, mod, func, archive_pathname, s3, layer_arn)
+        return 'created'
+
+    return 'updated' if update_code(cli, func, archive_pathname, s3, layer_arn) else 'unchanged'
+
+
+def task_deploy_all(cache, region_name=None, s3=False, layer=False, manifest=None):
+    """
+    Deploy all lambda functions concurrently. Dependencies are built once and archives once per module.
+    :param cache: optional cache key, change it to force a fresh install of dependencies
+    :param region_name: region where they are deployed, None for default region
+    :param s3: if true, stage archives on AWS S3 instead of sending them inline
+    :param layer: if true, ship dependencies as lambda layer
+    :param manifest: pathname of JSON file listing {"mod": ..., "func": ...} objects, None to find all handlers
+    :return: list of (function name, status, seconds) tuples
     """
 
-    cli = boto3.client('lambda')
+    cli = get_client('lambda', region_name=region_name)
+
+    if manifest:
+        with open(manifest, 'r') as f:
+            handlers = [(handler['mod'], handler['func']) for handler in json.load(f)]
+    else:
+        handlers = find_handlers()
 
-    archive_contents = build_archive(mod, cache)
+    logging.info("Deploying {} lambda functions ...".format(len(handlers)))
 
     try:
-        res = cli.update_function_code(FunctionName=func,
-                                       ZipFile=archive_contents)
+        layer_arn = publish_layer(cli, build_layer(cache), s3) if layer else None
+        archives = {mod: build_archive(mod, cache, layer) for mod in sorted(set(mod for mod, func in handlers))}
     except Exception as e:
         fatal("Operation failed: {}".format(e))
 
-    logging.info("Operation completed: {}".format(res["FunctionArn"]))
+    def deploy(handler):
+        mod, func = handler
+        start = time.perf_counter()
+        try:
+            status = deploy_function(cli, mod, func, archives[mod], s3, layer_arn)
+        except Exception as e:
+            status = 'failed: {}'.format(e)
+        return func, status, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=AWS_LAMBDA_DEPLOY_WORKERS) as pool:
+        summary = list(pool.map(deploy, handlers))
+
+    for func, status, duration in summary:
+        logging.info("{:<32} {:>8.2f}s  {}".format(func, duration, status))
+
+    if any(status.startswith('failed') for func, status, duration in summary):
+        fatal("Deployment of some lambda functions failed")
+
+    logging.info("Operation completed.")
+
+    return summary
 
 
 def main():
@@ -156,13 +497,16 @@ def main():
     """
 
     parser = argparse.ArgumentParser(description="AWS Lambda admin tool v{}".format(__version__))
-    parser.add_argument('task', choices=['list', 'create', 'update', 'delete'])
+    parser.add_argument('task', choices=['list', 'create', 'update', 'delete', 'deploy-all'])
     parser.add_argument('--region', default=AWS_DEFAULT_REGION, help="region to consider")
     parser.add_argument('--include', action='append', help="include Python script")
     parser.add_argument('--mod', help="module name")
-    parser.add_argument('--func', help="function name")
+    parser.add_argument('--func', help="function name, comma-separated list of names for update")
     parser.add_argument('--name', help="function to delete")
-    parser.add_argument('--cache', help="cache key")
+    parser.add_argument('--s3', action='store_true', help="stage archive on AWS S3, required for large archives")
+    parser.add_argument('--layer', action='store_true', help="ship dependencies as lambda layer")
+    parser.add_argument('--manifest', help="JSON file listing functions to deploy with deploy-all")
+    parser.add_argument('--cache', help="optional cache key, change it to force a fresh install of dependencies")
 
     args = parser.parse_args()
 
@@ -171,29 +515,32 @@ def main():
             logging.info('Including {} ...'.format(pathname))
             exec(open(pathname).read(), globals())
 
-    elif args.task == 'list':
-        task_list()
+    if args.task == 'list':
+        task_list(args.region)
 
     elif args.task == 'create':
 
         if args.mod is None or args.func is None:
             fatal("create task requires --mod or --func")
 
-        task_create(args.mod, args.func, args.cache)
+        task_create(args.mod, args.func, args.cache, args.region, args.s3, args.layer)
 
     elif args.task == 'update':
 
         if args.mod is None or args.func is None:
             fatal("update task requires --mod or --func")
 
-        task_update(args.mod, args.func, args.cache)
+        task_update(args.mod, args.func, args.cache, args.region, args.s3, args.layer)
 
     elif args.task == 'delete':
 
         if args.name is None:
             fatal("delete task requires --name")
 
-        task_delete(args.name)
+        task_delete(args.name, args.region)
+
+    elif args.task == 'deploy-all':
+        task_deploy_all(args.cache, args.region, args.s3, args.layer, args.manifest)
 
     else:
         fatal("Task not recognized")
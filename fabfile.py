@@ -9,7 +9,8 @@ from fabric.decorators import task
 
 # make sure that we import the awsflow package from this directory
 sys.path = ["."] + sys.path
-from awsflow.config import AWS_S3_BASE, PKG_WHEEL_FNAME
+from awsflow.config import AWS_S3_BASE, PKG_WHEEL_FNAME, PKG_WHEELHOUSE_FNAME, JUPYTER_ENV_DIR, JUPYTER_PACKAGES, \
+    AWS_S3_JUPYTER_ENV
 from config import TCP_PORT_PROXY
 
 # disable "Done." output
@@ -191,6 +192,57 @@ def pkg_deploy(host=None):
                                                                            version=get_version()))
 
 
+@task
+def pkg_wheelhouse():
+    """
+    Build wheelhouse tarball in dist/ directory, with the package built by pkg_build and the wheels of all
+    its dependencies. Execute it from the container shell: wheels must match the Python of EMR nodes.
+    :return:
+    """
+
+    local('rm -rf build/wheelhouse')
+    local('pip-3.6 wheel dist/{pkg_wheel_fname} --wheel-dir build/wheelhouse'.format(
+        pkg_wheel_fname=PKG_WHEEL_FNAME.format(version=get_version())))
+    local('tar -czf dist/{pkg_wheelhouse_fname} -C build wheelhouse'.format(
+        pkg_wheelhouse_fname=PKG_WHEELHOUSE_FNAME.format(version=get_version())))
+
+
+@task
+def pkg_deploy_wheelhouse(host=None):
+    """
+    Deploy package and its wheelhouse to AWS S3
+    :return:
+    """
+
+    pkg_deploy(host)
+    pkg_wheelhouse()
+    local('aws s3 cp dist/{pkg_wheelhouse_fname} {aws_s3base}/'.format(
+        pkg_wheelhouse_fname=PKG_WHEELHOUSE_FNAME, aws_s3base=AWS_S3_BASE).format(version=get_version()))
+
+    print("Operation completed: {project_name} {version} wheelhouse deployed!".format(project_name=project_name,
+                                                                                      version=get_version()))
+
+
+@task
+def jupyter_env():
+    """
+    Build Jupyter environment archive and deploy it to AWS S3. Execute it from the container shell: virtual
+    environments are not relocatable, so the environment is built in JUPYTER_ENV_DIR, the same directory where it is
+    unpacked on the master node, with a copy of the interpreter. It runs only with the same Python version on the
+    master node, recorded in its python-version file: otherwise, Jupyter is installed with pip.
+    :return:
+    """
+
+    local('rm -rf {env_dir} && python3 -m venv --copies {env_dir}'.format(env_dir=JUPYTER_ENV_DIR))
+    local('{env_dir}/bin/pip install {packages}'.format(env_dir=JUPYTER_ENV_DIR, packages=' '.join(JUPYTER_PACKAGES)))
+    local("{env_dir}/bin/python -c 'import sys; print(\"{{}}.{{}}\".format(*sys.version_info[:2]))' "
+          "> {env_dir}/python-version".format(env_dir=JUPYTER_ENV_DIR))
+    local('mkdir -p dist && tar -czf dist/jupyter-env.tar.gz -C {env_dir} .'.format(env_dir=JUPYTER_ENV_DIR))
+    local('aws s3 cp dist/jupyter-env.tar.gz {}'.format(AWS_S3_JUPYTER_ENV))
+
+    print("Operation completed: Jupyter environment deployed to {}".format(AWS_S3_JUPYTER_ENV))
+
+
 @task
 def clean():
     """